@@ -0,0 +1,243 @@
+# bbline/analysis/allin_ev.py
+"""
+All-in EV: заполняет hands.hero_ev_diff = (EV выигрыша Hero) − hero_collected.
+Запуск:
+    python -m bbline.analysis.allin_ev                 # руки с пустым hero_ev_diff
+    python -m bbline.analysis.allin_ev --full          # всё заново
+    python -m bbline.analysis.allin_ev --workers 4     # эквити в пуле процессов
+
+Рука считается, если ставки закончились до ривера, кто-то из оставшихся
+в олл-ине, Hero дошёл до вскрытия и карты всех оставшихся есть в showdowns.
+Олл-ин видно и без флага actions.allin (руки, импортированные до него):
+вложено за руку ≥ стека из seats.chips.
+
+По вложениям игроков (минус несколлированная ставка) собираются банки:
+основной и побочные, у каждого — свои претенденты. EV Hero = Σ банк ×
+доля Hero в нём по всем доскам (equity.py, полный перебор) × доля банка,
+которая дошла до победителей (рейк и джекпот — как в самой руке).
+Остальные руки получают 0: без олл-ина EV равен результату.
+
+EV bb/100 = SUM(net_bb + hero_ev_diff / limit_bb) * 100 / COUNT(*).
+
+Одинаковые ситуации (с точностью до мастей) считаются один раз на запуск,
+разные — параллельно в пуле процессов.
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from bbline.analysis import equity
+from bbline.database import registry
+from bbline.database.connection import connect
+from bbline.database.meta import bump_generation
+from bbline.parse.hand_parser import side_pots
+
+INVESTED = {"POST_SMALL_BLIND", "POST_BIG_BLIND", "POST_ANTE", "BET", "CALL", "RAISE"}
+KNOWN_BOARD = {"PREFLOP": 0, "FLOP": 3, "TURN": 4}  # улица, где закончились ставки → карт доски
+EPS = 0.005  # полцента: суммы в базе округлены до центов
+CHUNK = 64  # ситуаций на задачу пула
+
+# кандидаты: Hero на вскрытии и карты показал ещё кто-то
+_SQL_CANDIDATES = """
+    SELECT h.hand_id, h.hero_seat, h.board, h.hero_collected
+    FROM   hands h
+    WHERE  {where} AND h.hero_showdown = 1
+      AND  (SELECT COUNT(*) FROM showdowns s WHERE s.hand_id = h.hand_id) >= 2;
+"""
+
+_SCOPE = "temp._ev_scope"
+
+
+class Spot(NamedTuple):
+    """Олл-ин: карты оставшихся игроков, известная доска и банки."""
+
+    hands: Tuple[str, ...]  # карты игроков; Hero — hands[hero]
+    board: str  # карты доски на момент олл-ина
+    pots: Tuple[Tuple[float, Tuple[int, ...]], ...]  # (сумма, номера претендентов)
+    hero: int
+    paid_out: float  # доля банка, дошедшая до победителей (за вычетом рейка)
+
+
+def allin_spot(
+    hero_seat: int,
+    board: str,
+    chips: Dict[int, float],
+    actions: Sequence[Tuple[str, int, str, Optional[float]]],
+    shown: Dict[int, str],
+    collected: float,
+) -> Optional[Spot]:
+    """
+    Олл-ин руки или None. actions — (street, seat_no, act, amount) по order_no,
+    shown — карты с вскрытия, collected — сумма всех выигрышей руки.
+    """
+    if not actions or actions[-1][0] not in KNOWN_BOARD:
+        return None  # ставки дошли до ривера — досдавать нечего
+    cards = equity.parse_cards(board or "")
+    if len(cards) != 5:
+        return None
+
+    invested: Dict[int, float] = defaultdict(float)
+    folded = set()
+    for _, seat, act, amount in actions:
+        if act == "FOLD":
+            folded.add(seat)
+        elif act in INVESTED and amount:
+            invested[seat] += amount
+    live = [s for s in sorted(invested) if s not in folded]
+    if hero_seat not in live or len(live) < 2 or any(s not in shown for s in live):
+        return None
+    if not any(invested[s] >= chips.get(s, float("inf")) - EPS for s in live):
+        return None
+
+    # несколлированная ставка возвращается — в банке её нет
+    top, second = sorted(invested.values(), reverse=True)[:2]
+    if top - second > EPS:
+        seat = max(invested, key=invested.get)
+        invested[seat] = second
+
+    pots = side_pots(invested, live)
+    total = sum(amount for amount, _ in pots)
+    if not total or not collected:
+        return None
+    idx = {s: i for i, s in enumerate(live)}
+    known = KNOWN_BOARD[actions[-1][0]]
+    return Spot(
+        hands=tuple(shown[s] for s in live),
+        board=board_cards(cards[:known]),
+        pots=tuple((amount, tuple(idx[s] for s in eligible)) for amount, eligible in pots),
+        hero=idx[hero_seat],
+        paid_out=min(1.0, collected / total),
+    )
+
+
+def board_cards(cards: Sequence[int]) -> str:
+    return "".join(equity.RANKS[c >> 2] + equity.SUITS[c & 3] for c in cards)
+
+
+def spot_ev(spot: Spot, shares: Optional[Sequence[Sequence[float]]] = None) -> float:
+    """
+    Ожидаемый выигрыш Hero (сколько в среднем собрал бы из банков), $.
+    shares — готовые доли из pot_equities (иначе считаются здесь).
+    """
+    if shares is None:
+        shares = equity.pot_equities(spot.hands, spot.board, [e for _, e in spot.pots])
+    won = sum(amount * share[spot.hero] for (amount, _), share in zip(spot.pots, shares))
+    return won * spot.paid_out
+
+
+def _shares(keys: List[tuple]) -> List[tuple]:
+    """Воркер пула: доли по банкам для пачки канонических ситуаций."""
+    return [equity.pot_equities(*key) for key in keys]
+
+
+# ---------------------------------------------------------------------------
+# база
+# ---------------------------------------------------------------------------
+def _fill_scope(cur: sqlite3.Cursor, hand_ids: Sequence[str]) -> None:
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS _ev_scope (hand_id TEXT PRIMARY KEY);")
+    cur.execute(f"DELETE FROM {_SCOPE};")
+    cur.executemany(f"INSERT OR IGNORE INTO {_SCOPE} VALUES (?);", ((h,) for h in hand_ids))
+
+
+def _grouped(cur: sqlite3.Cursor, sql: str) -> Dict[str, list]:
+    """Строки (hand_id, …) по рукам."""
+    out: Dict[str, list] = defaultdict(list)
+    for hand_id, *rest in cur.execute(sql):
+        out[hand_id].append(rest)
+    return out
+
+
+def load_spots(cur: sqlite3.Cursor, full: bool = False) -> List[Tuple[str, float, Optional[Spot]]]:
+    """
+    Кандидаты: (hand_id, hero_collected, олл-ин или None).
+    full=False — только руки с пустым hero_ev_diff.
+    """
+    where = "1=1" if full else "h.hero_ev_diff IS NULL"
+    hands = cur.execute(_SQL_CANDIDATES.format(where=where)).fetchall()
+    _fill_scope(cur, [h[0] for h in hands])
+    scope = f"hand_id IN (SELECT hand_id FROM {_SCOPE})"
+    chips = _grouped(cur, f"SELECT hand_id, seat_no, chips FROM seats WHERE {scope};")
+    actions = _grouped(
+        cur,
+        f"SELECT hand_id, street, seat_no, act, amount FROM actions WHERE {scope} "
+        "ORDER BY hand_id, order_no;",
+    )
+    shown = _grouped(cur, f"SELECT hand_id, seat_no, cards FROM showdowns WHERE {scope};")
+    won = _grouped(cur, f"SELECT hand_id, amount FROM collected WHERE {scope};")
+    return [
+        (
+            hand_id,
+            hero_collected or 0.0,
+            allin_spot(
+                hero_seat,
+                board,
+                dict(chips[hand_id]),
+                actions[hand_id],
+                dict(shown[hand_id]),
+                sum(a for (a,) in won[hand_id]),
+            ),
+        )
+        for hand_id, hero_seat, board, hero_collected in hands
+    ]
+
+
+def _evaluate(spots: List[Spot], workers: int) -> List[float]:
+    """
+    EV по ситуациям. Одинаковые с точностью до мастей считаются один раз,
+    разные — пачками в пуле процессов; суммы банков у каждой руки свои.
+    """
+    keys = [equity.canonical_key(s.hands, s.board, [e for _, e in s.pots]) for s in spots]
+    todo = list(dict.fromkeys(keys))
+    if workers > 1 and len(todo) > CHUNK:
+        chunks = [todo[i : i + CHUNK] for i in range(0, len(todo), CHUNK)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = [sh for part in pool.map(_shares, chunks) for sh in part]
+    else:
+        results = _shares(todo)
+    shares = dict(zip(todo, results))
+    return [spot_ev(s, shares[key]) for s, key in zip(spots, keys)]
+
+
+def rebuild_ev(full: bool = False, workers: int = 1, db_path=None) -> Dict[str, int]:
+    """Пересчитывает hero_ev_diff. Возвращает счётчики: рук с олл-ином, всего обновлено."""
+    with connect(db_path) as cx:
+        cur = cx.cursor()
+        if full:
+            cur.execute("UPDATE hands SET hero_ev_diff = NULL;")
+        allins = [(h, got, s) for h, got, s in load_spots(cur, full=full) if s is not None]
+        evs = _evaluate([s for _, _, s in allins], workers)
+        cur.executemany(
+            "UPDATE hands SET hero_ev_diff = ? WHERE hand_id = ?;",
+            ((round(ev - got, 2), h) for (h, got, _), ev in zip(allins, evs)),
+        )
+        # без олл-ина EV = результат
+        cur.execute("UPDATE hands SET hero_ev_diff = 0 WHERE hero_ev_diff IS NULL;")
+        updated = cur.rowcount + len(allins)
+        if updated:
+            bump_generation(cx)
+        cx.commit()
+    return {"allin": len(allins), "updated": updated}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="All-in EV → hands.hero_ev_diff")
+    parser.add_argument("--full", action="store_true", help="пересчитать все руки")
+    parser.add_argument(
+        "--workers", type=int, default=1, help="процессов для эквити (0 — по числу ядер)"
+    )
+    registry.add_db_argument(parser)
+    args = parser.parse_args()
+    registry.configure(args.db)
+    workers = args.workers or os.cpu_count() or 1
+    for path in registry.read_paths():
+        t0 = time.perf_counter()
+        res = rebuild_ev(full=args.full, workers=workers, db_path=path)
+        print(
+            f"✅  {path.name}: hero_ev_diff для {res['updated']} рук, "
+            f"олл-инов с эквити {res['allin']} ({time.perf_counter() - t0:.1f} с)"
+        )
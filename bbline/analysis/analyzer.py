@@ -20,10 +20,9 @@
 from __future__ import annotations
 
 import sqlite3
-from pathlib import Path
 from typing import Any, Dict, Tuple
 
-DB = Path(__file__).resolve().parents[1] / "database" / "bbline.sqlite"
+from bbline.database.connection import get_connection
 
 
 def _fetch_one(cur: sqlite3.Cursor, sql: str, params: Tuple[Any, ...] = ()) -> Any:
@@ -36,9 +35,9 @@ def get_basic_stats() -> Dict[str, float]:
     """
     Возвращает все ключевые метрики одним dict’ом.
     """
-    with sqlite3.connect(DB) as cx:
-        cx.row_factory = sqlite3.Row
+    with get_connection(readonly=True) as cx:  # все базы реестра
         cur = cx.cursor()
+        cur.row_factory = sqlite3.Row
 
         # ---------------- базовые числа ----------------
         hands_cnt = _fetch_one(cur, "SELECT COUNT(*) FROM hands WHERE hero_seat IS NOT NULL;") or 0
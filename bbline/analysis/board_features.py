@@ -0,0 +1,280 @@
+# bbline/analysis/board_features.py
+"""
+board_features — текстура флопа и готовая рука Hero по улицам, строка на
+каждую руку с флопом. «Профит по текстуре» — GROUP BY по этой таблице,
+а не разбор строк hands.board в Python.
+
+Колонки:
+    paired      1 — на флопе пара (или сет)
+    suits       monotone / two-tone / rainbow
+    connected   2 — разные ранги флопа идут подряд (789, A23), 1 — влезают
+                в окно стрита из пяти рангов, 0 — не влезают
+    high_card   ace / broadway (K–T) / middle (9–7) / low (6–2)
+    wetness     dry / medium / wet: очки за масти (монотонный +2, две
+                масти +1) + connected − paired; 0 — dry, 3+ — wet
+    hero_flop, hero_turn, hero_river — категория руки Hero на улице
+                (equity.CATEGORIES); NULL — улицы не было или карт Hero нет
+
+Считается пачкой в NumPy тем же оценщиком, что all-in EV (equity.py).
+Как поддерживается (как daily_rollup):
+    ▪ HandWriter после записи пачки вызывает add_hands();
+    ▪ таблицы ещё не было — строит create_schema / migrate_add_derived_tables.py.
+
+Запуск:
+    python -m bbline.analysis.board_features          # руки без строки в таблице
+    python -m bbline.analysis.board_features --full   # всё заново
+"""
+
+import argparse
+import sqlite3
+from contextlib import closing
+from typing import Any, List, Sequence, Tuple
+
+import numpy as np
+
+from bbline.analysis import equity
+from bbline.database import registry
+from bbline.database.connection import connect
+from bbline.database.meta import bump_generation
+
+BATCH_ROWS = 50_000  # рук за проход при заполнении всей базы
+
+# колонки, по которым можно группировать (profit_by_texture)
+TEXTURE_COLUMNS = (
+    "paired",
+    "suits",
+    "connected",
+    "high_card",
+    "wetness",
+    "hero_flop",
+    "hero_turn",
+    "hero_river",
+)
+
+_SQL_CREATE = """
+    CREATE TABLE IF NOT EXISTS board_features (
+        hand_id    TEXT    PRIMARY KEY REFERENCES hands(hand_id) ON DELETE CASCADE,
+        paired     INTEGER NOT NULL,        -- 1/0
+        suits      TEXT    NOT NULL,        -- monotone / two-tone / rainbow
+        connected  INTEGER NOT NULL,        -- 0..2
+        high_card  TEXT    NOT NULL,        -- ace / broadway / middle / low
+        wetness    TEXT    NOT NULL,        -- dry / medium / wet
+        hero_flop  TEXT,                    -- equity.CATEGORIES
+        hero_turn  TEXT,
+        hero_river TEXT
+    );
+"""
+# по одному execute: executescript закоммитил бы открытую транзакцию HandWriter
+_SQL_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_board_features_texture "
+    "ON board_features(wetness, suits, paired, connected, high_card);",
+    "CREATE INDEX IF NOT EXISTS idx_board_features_hero "
+    "ON board_features(hero_flop, hero_turn, hero_river);",
+)
+
+_SQL_SOURCE = """
+    SELECT h.hand_id, h.hero_cards, h.board
+    FROM   hands h
+    WHERE  {where} AND h.board IS NOT NULL AND h.board != ''
+"""
+
+_SQL_INSERT = "INSERT OR REPLACE INTO board_features VALUES (?,?,?,?,?,?,?,?,?);"
+
+_SQL_PROFIT = """
+    SELECT f.{column}                  AS texture,
+           COUNT(*)                    AS hands,
+           ROUND(TOTAL(h.hero_net), 2) AS profit,
+           ROUND(TOTAL(h.net_bb), 2)   AS net_bb
+    FROM   board_features f
+    JOIN   hands h ON h.hand_id = f.hand_id
+    WHERE  {where}
+    GROUP  BY texture
+    ORDER  BY texture;
+"""
+
+_SCOPE = "temp._bf_scope"
+
+
+# ---------------------------------------------------------------------------
+# классификация
+# ---------------------------------------------------------------------------
+def _connectedness(mask: int) -> int:
+    """connected по маске рангов флопа (туз — и старший, и младший)."""
+    ranks = [r for r in range(13) if mask >> r & 1]
+    if len(ranks) < 2:
+        return 0
+    span = ranks[-1] - ranks[0]
+    if ranks[-1] == 12:  # A23: туз как младшая карта
+        low = sorted(-1 if r == 12 else r for r in ranks)
+        span = min(span, low[-1] - low[0])
+    if span == len(ranks) - 1:
+        return 2
+    return 1 if span <= 4 else 0
+
+
+_CONNECTED = np.array([_connectedness(m) for m in range(1 << 13)], dtype=np.int64)
+_SUITS = np.array(["monotone", "two-tone", "rainbow"], dtype=object)
+_SUIT_POINTS = np.array([2, 1, 0])
+_HIGH = np.array(["low"] * 5 + ["middle"] * 3 + ["broadway"] * 4 + ["ace"], dtype=object)
+_WETNESS = np.array(["dry", "medium", "medium", "wet"], dtype=object)
+_CATEGORY = np.array(equity.CATEGORIES, dtype=object)
+# 'Ah' → индекс карты: строки из базы уже нормализованы парсером, словарь быстрее card_index
+_CARD = {r + s: equity.card_index(r + s) for r in equity.RANKS for s in equity.SUITS}
+
+
+def _cards(text: str) -> List[int]:
+    """'6hQc8h|8c|3d' → индексы карт."""
+    text = text.replace("|", "").replace(" ", "")
+    return [_CARD[text[i : i + 2]] for i in range(0, len(text), 2)]
+
+
+def flop_texture(flops: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """(paired, suits, connected, high_card, wetness) пачки флопов: flops — (n, 3) индексы карт."""
+    r, s = flops >> 2, flops & 3
+    paired = ((r[:, 0] == r[:, 1]) | (r[:, 1] == r[:, 2]) | (r[:, 0] == r[:, 2])).astype(np.int64)
+    n_suits = 1 + (s[:, 1] != s[:, 0]) + ((s[:, 2] != s[:, 0]) & (s[:, 2] != s[:, 1]))
+    connected = _CONNECTED[np.bitwise_or.reduce(np.left_shift(1, r), axis=1)]
+    points = _SUIT_POINTS[n_suits - 1] + connected - paired
+    return (
+        paired,
+        _SUITS[n_suits - 1],
+        connected,
+        _HIGH[r.max(axis=1)],
+        _WETNESS[np.clip(points, 0, 3)],
+    )
+
+
+def feature_rows(rows: Sequence[Tuple[str, Any, str]]) -> List[tuple]:
+    """Строки board_features для (hand_id, hero_cards, board); руки без флопа пропускаются."""
+    n = len(rows)
+    hero = np.full((n, 2), -1, dtype=np.int64)
+    board = np.full((n, 5), -1, dtype=np.int64)
+    n_board = np.zeros(n, dtype=np.int64)
+    for i, (_, hero_cards, board_str) in enumerate(rows):
+        cards = _cards(board_str)[:5]
+        board[i, : len(cards)] = cards
+        n_board[i] = len(cards)
+        if hero_cards:
+            hole = _cards(hero_cards)
+            if len(hole) == 2:
+                hero[i] = hole
+
+    keep = np.flatnonzero(n_board >= 3)
+    hero, board, n_board = hero[keep], board[keep], n_board[keep]
+    texture = flop_texture(board[:, :3])
+
+    made = np.full((len(keep), 3), None, dtype=object)
+    has_hero = (hero >= 0).all(axis=1)
+    for col, k in enumerate((3, 4, 5)):  # флоп, тёрн, ривер
+        idx = np.flatnonzero(has_hero & (n_board >= k))
+        if len(idx):
+            made[idx, col] = _CATEGORY[equity.categories(np.hstack([hero[idx], board[idx, :k]]))]
+
+    return [
+        (rows[i][0], *(int(t[j]) if t.dtype != object else t[j] for t in texture), *made[j])
+        for j, i in enumerate(keep)
+    ]
+
+
+# ---------------------------------------------------------------------------
+# таблица
+# ---------------------------------------------------------------------------
+def _fill(cx: sqlite3.Connection, where: str = "1=1") -> int:
+    """Считает и пишет строки для рук из {where} (алиас h). Не коммитит."""
+    src = cx.execute(_SQL_SOURCE.format(where=where))
+    done = 0
+    while True:
+        rows = src.fetchmany(BATCH_ROWS)
+        if not rows:
+            return done
+        out = feature_rows(rows)
+        cx.executemany(_SQL_INSERT, out)
+        done += len(out)
+
+
+def _ensure_features_table(cur: sqlite3.Cursor) -> bool:
+    """
+    Создаёт board_features; если таблицы не было — сразу заполняет по всей базе.
+    True — таблица только что построена (и уже учитывает все руки в базе).
+    """
+    exists = cur.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'board_features';"
+    ).fetchone()
+    if exists:
+        return False
+    try:
+        cur.execute(_SQL_CREATE)
+    except sqlite3.OperationalError:
+        # соединение readonly (UI) — строим таблицу отдельным пишущим соединением
+        path = cur.execute("PRAGMA database_list;").fetchone()[2]
+        with closing(connect(path)) as wx:
+            _ensure_features_table(wx.cursor())
+            wx.commit()
+        return True
+    for sql in _SQL_INDEXES:
+        cur.execute(sql)
+    _fill(cur.connection)
+    return True
+
+
+def add_hands(cx: sqlite3.Connection, hand_ids: Sequence[str]) -> None:
+    """Считает board_features для только что вставленных рук. Не коммитит."""
+    if not hand_ids:
+        return
+    cur = cx.cursor()
+    if _ensure_features_table(cur):
+        return  # свежая таблица уже посчитана вместе с этими руками
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS _bf_scope (hand_id TEXT PRIMARY KEY);")
+    cur.execute(f"DELETE FROM {_SCOPE};")
+    cur.executemany(f"INSERT OR IGNORE INTO {_SCOPE} VALUES (?);", ((h,) for h in hand_ids))
+    _fill(cx, f"h.hand_id IN (SELECT hand_id FROM {_SCOPE})")
+
+
+def rebuild_all(cx: sqlite3.Connection) -> None:
+    """Пересчитывает board_features по всей базе. Не коммитит."""
+    cur = cx.cursor()
+    if _ensure_features_table(cur):
+        return  # свежая таблица уже посчитана по всем рукам
+    cur.execute("DELETE FROM board_features;")
+    _fill(cx)
+
+
+def profit_by_texture(
+    cur: sqlite3.Cursor, column: str, where: str = "1=1", params: Sequence[Any] = ()
+) -> List[sqlite3.Row]:
+    """
+    Руки и профит по значению колонки board_features (texture, hands, profit, net_bb).
+    where / params — из hand_filter_sql (алиас h).
+    """
+    if column not in TEXTURE_COLUMNS:
+        raise ValueError(f"Неизвестная колонка: {column}. Используй: {', '.join(TEXTURE_COLUMNS)}")
+    _ensure_features_table(cur)
+    return cur.execute(_SQL_PROFIT.format(column=column, where=where), params).fetchall()
+
+
+def rebuild(full: bool = False, db_path=None) -> int:
+    """Досчитывает руки без строки в board_features (full — все заново). Возвращает число рук."""
+    with connect(db_path) as cx:
+        cur = cx.cursor()
+        if _ensure_features_table(cur):
+            n_hands = cur.execute("SELECT COUNT(*) FROM board_features;").fetchone()[0]
+        elif full:
+            cur.execute("DELETE FROM board_features;")
+            n_hands = _fill(cx)
+        else:
+            n_hands = _fill(cx, "h.hand_id NOT IN (SELECT hand_id FROM board_features)")
+        if n_hands:
+            bump_generation(cx)
+        cx.commit()
+    return n_hands
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Текстура борда и рука Hero → board_features")
+    parser.add_argument("--full", action="store_true", help="пересчитать все руки")
+    registry.add_db_argument(parser)
+    args = parser.parse_args()
+    registry.configure(args.db)
+    for path in registry.read_paths():
+        n = rebuild(full=args.full, db_path=path)
+        print(f"✅  board_features ({path.name}): {n} рук")
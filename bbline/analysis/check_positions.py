@@ -6,24 +6,17 @@
 import sqlite3
 
 # import random # Удаляем неиспользуемый импорт
-from pathlib import Path
 from typing import List, Dict, Any
 
-DB = Path(__file__).resolve().parents[1] / "database" / "bbline.sqlite"
-
-
-def _pos_from_seats(hero_seat: int, button_seat: int) -> str:
-    """Возвращает позицию героя по номерам мест (6-max)."""
-    positions = ["BTN", "SB", "BB", "UTG", "MP", "CO"]
-    offset = (hero_seat - button_seat) % 6
-    return positions[offset]
+from bbline.database.connection import get_connection
+from bbline.parse.hand_parser import position_from_seats
 
 
 def get_hands_by_ids(hand_ids: List[str]) -> List[Dict[str, Any]]:
     """Получает конкретные раздачи из базы данных."""
-    with sqlite3.connect(DB) as cx:
-        cx.row_factory = sqlite3.Row
+    with get_connection(readonly=True) as cx:
         cur = cx.cursor()
+        cur.row_factory = sqlite3.Row
 
         # Получаем детальную информацию
         hands = []
@@ -31,7 +24,7 @@ def get_hands_by_ids(hand_ids: List[str]) -> List[Dict[str, Any]]:
             hand = cur.execute(
                 """
                 SELECT h.hand_id, h.hero_seat, h.button_seat, h.hero_cards, h.board,
-                       h.datetime_utc, h.limit_bb
+                       h.datetime_utc, h.limit_bb, h.hero_position
                 FROM hands h
                 WHERE h.hand_id = ?
             """,
@@ -39,14 +32,21 @@ def get_hands_by_ids(hand_ids: List[str]) -> List[Dict[str, Any]]:
             ).fetchone()
 
             if hand:
-                hands.append(dict(hand))
+                hand = dict(hand)
+                hand["seat_nos"] = [
+                    r[0]
+                    for r in cur.execute(
+                        "SELECT seat_no FROM seats WHERE hand_id = ? ORDER BY seat_no", (hand_id,)
+                    )
+                ]
+                hands.append(hand)
 
         return hands
 
 
 def count_invalid_seat_hands() -> int:
     """Подсчитывает количество рук, где hero_seat или button_seat равны -1."""
-    with sqlite3.connect(DB) as cx:
+    with get_connection(readonly=True) as cx:
         cur = cx.cursor()
         row = cur.execute(
             "SELECT COUNT(*) FROM hands WHERE hero_seat = -1 OR button_seat = -1;"
@@ -65,22 +65,26 @@ def print_hand_info(hand: Dict[str, Any]) -> None:
     print(f"Место героя: {hand['hero_seat']}")
     print(f"Место баттона: {hand['button_seat']}")
 
-    # Вычисляем позицию
-    position = _pos_from_seats(hand["hero_seat"], hand["button_seat"])
+    # Позиция: сохранённая при импорте vs пересчитанная по seats
+    position = position_from_seats(hand["hero_seat"], hand["button_seat"], hand["seat_nos"])
+    print(f"Позиция в базе: {hand['hero_position']}")
     print(f"Вычисленная позиция: {position}")
 
-    # Выводим схему стола
+    # Выводим схему стола (реальные места, без допущения 6-max)
     print("\nСхема стола:")
-    seats = ["BTN", "SB", "BB", "UTG", "MP", "CO"]
-    offset = (hand["hero_seat"] - hand["button_seat"]) % 6
-    for i in range(6):
-        pos = seats[(i - offset) % 6]
-        if i == hand["hero_seat"]:
-            print(f"Seat {i}: {pos} (HERO)")
-        elif i == hand["button_seat"]:
-            print(f"Seat {i}: {pos} (BTN)")
+    for seat in hand["seat_nos"]:
+        pos = position_from_seats(seat, hand["button_seat"], hand["seat_nos"])
+        if seat == hand["hero_seat"]:
+            print(f"Seat {seat}: {pos} (HERO)")
         else:
-            print(f"Seat {i}: {pos}")
+            print(f"Seat {seat}: {pos}")
+
+
+def count_missing_position_hands() -> int:
+    """Подсчитывает руки без hero_position (нужен migrate_add_hero_position.py)."""
+    with get_connection(readonly=True) as cx:
+        row = cx.execute("SELECT COUNT(*) FROM hands WHERE hero_position IS NULL;").fetchone()
+        return row[0] if row else 0
 
 
 def main():
@@ -91,6 +95,7 @@ def main():
     # Подсчитываем руки с некорректными местами
     invalid_hands_count = count_invalid_seat_hands()
     print(f"Количество рук с некорректными hero_seat или button_seat: {invalid_hands_count}")
+    print(f"Количество рук без hero_position: {count_missing_position_hands()}")
 
     # Проверяем конкретную раздачу (или случайные, если нужно)
     # hand_ids = ["HD2249992322"]
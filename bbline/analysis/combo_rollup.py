@@ -0,0 +1,211 @@
+# bbline/analysis/combo_rollup.py
+"""
+combo_rollup — суммы по (hero_combo, hero_position, limit_bb) для сетки
+13×13 на дашборде: 169 клеток × позиции × лимиты — несколько тысяч строк
+вместо разбора hero_cards по каждой руке на каждый запрос.
+
+Как поддерживается (как daily_rollup, см. analysis/rollup.py):
+    ▪ HandWriter после записи пачки вызывает add_hands() — UPSERT по ключу;
+    ▪ rebuild_computed после пересчёта вызывает refresh_hands() — ключи
+      затронутых рук пересобираются целиком;
+    ▪ rebuild_computed --full и таблица, которой ещё не было, — rebuild_all().
+Руки без hero_combo (карт Hero нет) в сетку не попадают.
+
+Запуск (пересобрать с нуля):
+    python -m bbline.analysis.combo_rollup
+"""
+
+import sqlite3
+from contextlib import closing
+from typing import Any, Dict, List, Sequence
+
+from bbline.database import registry
+from bbline.database.connection import connect
+from bbline.parse.hand_parser import COMBO_RANKS
+
+# hero_position NULL храним как '' — иначе NULL ломает PRIMARY KEY / UPSERT
+_SQL_CREATE = """
+    CREATE TABLE IF NOT EXISTS combo_rollup (
+        hero_combo    TEXT    NOT NULL,        -- '95s', 'AKo', 'TT'
+        hero_position TEXT    NOT NULL,        -- '' если позиция неизвестна
+        limit_bb      REAL    NOT NULL,
+        hands         INTEGER NOT NULL,
+        hero_net      REAL    NOT NULL,
+        net_bb        REAL    NOT NULL,
+        stats_hands   INTEGER NOT NULL,        -- рук с computed_stats (знаменатель VPIP/PFR)
+        vpip          INTEGER NOT NULL,
+        pfr           INTEGER NOT NULL,
+        PRIMARY KEY (hero_combo, hero_position, limit_bb)
+    );
+"""
+
+_COUNTERS = ["hands", "hero_net", "net_bb", "stats_hands", "vpip", "pfr"]
+
+# суммы по рукам, отобранным {where} (алиасы h / c)
+_SQL_SELECT_DELTA = """
+    SELECT h.hero_combo,
+           COALESCE(h.hero_position, ''),
+           h.limit_bb,
+           COUNT(*),
+           TOTAL(h.hero_net),
+           TOTAL(h.net_bb),
+           COUNT(c.hand_id),
+           COALESCE(SUM(c.vpip), 0),
+           COALESCE(SUM(c.pfr), 0)
+    FROM   hands h
+    LEFT   JOIN computed_stats c ON c.hand_id = h.hand_id
+    WHERE  h.hero_combo IS NOT NULL AND {where}
+    GROUP  BY 1, 2, 3
+"""
+
+_SQL_UPSERT = (
+    f"INSERT INTO combo_rollup (hero_combo, hero_position, limit_bb, {', '.join(_COUNTERS)}) "
+    + _SQL_SELECT_DELTA
+    + " ON CONFLICT (hero_combo, hero_position, limit_bb) DO UPDATE SET "
+    + ", ".join(f"{c} = {c} + excluded.{c}" for c in _COUNTERS)
+    + ";"
+)
+
+# ключи рук из _cr_scope — их строки пересобираются целиком
+_SQL_SCOPE_KEYS = """
+    INSERT INTO temp._cr_keys
+    SELECT DISTINCT hero_combo, COALESCE(hero_position, ''), limit_bb
+    FROM   hands
+    WHERE  hero_combo IS NOT NULL AND hand_id IN (SELECT hand_id FROM temp._cr_scope);
+"""
+_KEY = "(hero_combo, hero_position, limit_bb)"
+
+_SCOPE = "temp._cr_scope"
+
+
+def _ensure_combo_table(cur: sqlite3.Cursor) -> bool:
+    """
+    Создаёт combo_rollup; если таблицы не было — сразу заполняет по всей базе.
+    True — таблица только что построена (и уже учитывает все руки в базе).
+    """
+    exists = cur.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'combo_rollup';"
+    ).fetchone()
+    if exists:
+        return False
+    try:
+        cur.execute(_SQL_CREATE)
+    except sqlite3.OperationalError:
+        # соединение readonly (UI) — строим таблицу отдельным пишущим соединением
+        path = cur.execute("PRAGMA database_list;").fetchone()[2]
+        with closing(connect(path)) as wx:
+            _ensure_combo_table(wx.cursor())
+            wx.commit()
+        return True
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(hands);")}
+    if "hero_combo" in columns:  # иначе база до migrate_add_hero_combo — пока пусто
+        cur.execute(_SQL_UPSERT.format(where="1=1"))
+    return True
+
+
+def _fill_scope(cur: sqlite3.Cursor, hand_ids: Sequence[str]) -> None:
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS _cr_scope (hand_id TEXT PRIMARY KEY);")
+    cur.execute(f"DELETE FROM {_SCOPE};")
+    cur.executemany(f"INSERT OR IGNORE INTO {_SCOPE} VALUES (?);", ((h,) for h in hand_ids))
+
+
+def add_hands(cx: sqlite3.Connection, hand_ids: Sequence[str]) -> None:
+    """
+    Прибавляет к combo_rollup только что вставленные руки. Не коммитит.
+    Вызывать ровно один раз на руку — повторный вызов посчитает её дважды.
+    """
+    if not hand_ids:
+        return
+    cur = cx.cursor()
+    if _ensure_combo_table(cur):
+        return  # свежая таблица уже посчитана вместе с этими руками
+    _fill_scope(cur, hand_ids)
+    cur.execute(_SQL_UPSERT.format(where=f"h.hand_id IN (SELECT hand_id FROM {_SCOPE})"))
+
+
+def refresh_hands(cx: sqlite3.Connection, hand_ids: Sequence[str]) -> None:
+    """Пересобирает строки, в которые попали hand_ids (после пересчёта computed_stats)."""
+    if not hand_ids:
+        return
+    cur = cx.cursor()
+    if _ensure_combo_table(cur):
+        return
+    _fill_scope(cur, hand_ids)
+    # ключ (combo, позиция, лимит) целиком: удалить и посчитать заново по всем его рукам
+    cur.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS _cr_keys "
+        "(hero_combo TEXT, hero_position TEXT, limit_bb REAL);"
+    )
+    cur.execute("DELETE FROM temp._cr_keys;")
+    cur.execute(_SQL_SCOPE_KEYS)
+    cur.execute(f"DELETE FROM combo_rollup WHERE {_KEY} IN (SELECT * FROM temp._cr_keys);")
+    cur.execute(
+        _SQL_UPSERT.format(
+            where="(h.hero_combo, COALESCE(h.hero_position, ''), h.limit_bb) "
+            "IN (SELECT * FROM temp._cr_keys)"
+        )
+    )
+
+
+def rebuild_all(cx: sqlite3.Connection) -> None:
+    """Пересобирает combo_rollup по всей базе. Не коммитит."""
+    cur = cx.cursor()
+    if _ensure_combo_table(cur):
+        return  # свежая таблица уже посчитана по всем рукам
+    cur.execute("DELETE FROM combo_rollup;")
+    cur.execute(_SQL_UPSERT.format(where="1=1"))
+
+
+def combo_counters(
+    cur: sqlite3.Cursor, where: str = "1=1", params: Sequence[Any] = ()
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Счётчики по клеткам сетки: {'AKo': {hands, hero_net, net_bb, stats_hands, vpip, pfr}}.
+    where — из hand_filter_sql(limits=…, positions=…, alias="r") (без дат).
+    """
+    _ensure_combo_table(cur)
+    rows = cur.execute(
+        f"""
+        SELECT hero_combo,
+               SUM(hands)       AS hands,
+               SUM(hero_net)    AS hero_net,
+               SUM(net_bb)      AS net_bb,
+               SUM(stats_hands) AS stats_hands,
+               SUM(vpip)        AS vpip,
+               SUM(pfr)         AS pfr
+        FROM   combo_rollup r
+        WHERE  {where}
+        GROUP  BY hero_combo;
+        """,
+        params,
+    ).fetchall()
+    names = [d[0] for d in cur.description][1:]
+    return {row[0]: dict(zip(names, row[1:])) for row in rows}
+
+
+def grid_labels() -> List[List[str]]:
+    """
+    Клетки 13×13 в классическом порядке: пары по диагонали, одномастные —
+    выше неё (AKs в первой строке), разномастные — ниже (AKo в первом столбце).
+    """
+    return [
+        [
+            a + b if i == j else (a + b + "s" if i < j else b + a + "o")
+            for j, b in enumerate(COMBO_RANKS)
+        ]
+        for i, a in enumerate(COMBO_RANKS)
+    ]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Пересборка combo_rollup")
+    registry.add_db_argument(parser)
+    registry.configure(parser.parse_args().db)
+    for path in registry.read_paths():
+        with closing(connect(path)) as cx:
+            rebuild_all(cx)
+            cx.commit()
+            n = cx.execute("SELECT COUNT(*), SUM(hands) FROM combo_rollup;").fetchone()
+        print(f"✅  combo_rollup пересобран ({path.name}): {n[0]} строк, {n[1] or 0} рук")
@@ -0,0 +1,207 @@
+# bbline/analysis/duckdb_backend.py
+"""
+Аналитика дашборда поверх Parquet-выгрузки (export/parquet_export.py) в DuckDB.
+
+Включается переменной окружения BBLINE_PARQUET=<папка выгрузки>:
+    python -m bbline.export.parquet_export D:/poker/parquet
+    set BBLINE_PARQUET=D:/poker/parquet && streamlit run bbline/main.py
+
+Функции — те же имена и сигнатуры, что в dashboard_data / periodic /
+leakfinder, и те же формулы: SQL-шаблоны и разбор строк общие, меняется
+только движок. DuckDB читает колонки, а не строки, и раскладывает скан по
+ядрам; каталоги month=…/limit_bb=… отсекаются по фильтрам ещё до чтения.
+
+Данные — на момент последней выгрузки: свежие руки видит SQLite-дашборд,
+сюда они попадают после следующего запуска parquet_export. Теги лик-файндера
+по-прежнему пишутся в SQLite.
+
+Нужен duckdb (pip install duckdb); без него модуль импортируется, а запрос
+падает с понятной ошибкой.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from bbline.analysis.leakfinder import _aggregate_stats, check_rules, save_leak_tags
+from bbline.analysis.periodic import SQL_TOP_LOSING, Period, group_losing, period_stats
+from bbline.dashboard_data import _validate_filters, dashboard_counters, stats_from_counters
+from bbline.export.parquet_export import MANIFEST, TABLES
+from bbline.utils import hand_filter_sql
+
+ENV_VAR = "BBLINE_PARQUET"
+
+# без hive_types DuckDB угадывает limit_bb=0.02 как строку
+_SQL_VIEW = """
+    CREATE OR REPLACE VIEW {table} AS
+    SELECT * FROM read_parquet(
+        '{files}',
+        hive_partitioning = true,
+        hive_types = {{'month': VARCHAR, 'limit_bb': DOUBLE}},
+        union_by_name = true
+    );
+"""
+
+# datetime_utc — ISO-строка, период режем подстрокой; неделя — как strftime('%Y-%W') в SQLite
+_PERIOD_EXPR = {
+    "day": "SUBSTR({column}, 1, 10)",
+    "week": "strftime(CAST(SUBSTR({column}, 1, 10) AS DATE), '%Y-%W')",
+    "month": "SUBSTR({column}, 1, 7)",
+}
+
+# как profit_by_day из daily_rollup, только по рукам
+_SQL_PROFIT = """
+    SELECT SUBSTR(h.datetime_utc, 1, 10) AS day,
+           ROUND(SUM(h.hero_net), 2)     AS profit
+    FROM   hands h
+    WHERE  {where}
+    GROUP  BY day
+    ORDER  BY day;
+"""
+
+# как rollup.rows_by_period: (period, fold_to_3b, threebet, cbet_flop, total), новые сверху
+_SQL_BY_PERIOD = """
+    SELECT {expr}            AS period,
+           SUM(c.fold_to_3b) AS fold_to_3b,
+           SUM(c.threebet)   AS threebet,
+           SUM(c.cbet_flop)  AS cbet_flop,
+           COUNT(*)          AS total
+    FROM   computed_stats c
+    JOIN   hands h ON h.hand_id = c.hand_id
+    GROUP  BY period
+    ORDER  BY period DESC;
+"""
+
+_local = threading.local()
+
+
+def parquet_root() -> Optional[Path]:
+    value = os.environ.get(ENV_VAR)
+    return Path(value).expanduser().resolve() if value else None
+
+
+def enabled() -> bool:
+    """BBLINE_PARQUET задан и выгрузка в нём уже есть."""
+    root = parquet_root()
+    return root is not None and (root / MANIFEST).exists()
+
+
+def _require_duckdb():
+    try:
+        import duckdb
+    except ImportError as e:
+        raise RuntimeError("Для аналитики по Parquet нужен duckdb: pip install duckdb") from e
+    return duckdb
+
+
+def connect(root=None):
+    """
+    Соединение DuckDB текущего потока с view на каждую выгруженную таблицу.
+    root=None — папка из BBLINE_PARQUET.
+    """
+    root = Path(root).resolve() if root else parquet_root()
+    if root is None:
+        raise RuntimeError(f"Не задана папка Parquet-выгрузки (${ENV_VAR})")
+    pool: Dict[str, Any] = _local.__dict__.setdefault("pool", {})
+    cx = pool.get(str(root))
+    if cx is None:
+        cx = _require_duckdb().connect()
+        for table in TABLES:
+            if next((root / table).rglob("*.parquet"), None) is None:
+                continue
+            files = (root / table).as_posix().replace("'", "''") + "/**/*.parquet"
+            cx.execute(_SQL_VIEW.format(table=table, files=files))
+        pool[str(root)] = cx
+    return cx
+
+
+def close_all() -> None:
+    """Закрывает соединения текущего потока (новая выгрузка в другую папку, бенчмарки)."""
+    pool = _local.__dict__.pop("pool", {})
+    for cx in pool.values():
+        cx.close()
+
+
+def data_version(root=None) -> Tuple[str, int]:
+    """(время последней выгрузки, число запусков) — для ключа кеша дашборда."""
+    root = Path(root).resolve() if root else parquet_root()
+    manifest = json.loads((root / MANIFEST).read_text(encoding="utf-8"))
+    return manifest.get("updated", ""), manifest["runs"]
+
+
+def _filter_sql(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    limits: Optional[List[float]] = None,
+    positions: Optional[List[str]] = None,
+) -> Tuple[str, List[Any]]:
+    """
+    hand_filter_sql по hands h + то же условие на колонку партиции month:
+    по ней DuckDB пропускает каталоги чужих месяцев, не открывая файлы.
+    """
+    where, params = hand_filter_sql(date_from, date_to, limits, positions)
+    if date_from:
+        where += " AND h.month >= ?"
+        params.append(date_from[:7])
+    if date_to:
+        where += " AND h.month <= ?"
+        params.append(date_to[:7])
+    return where, params
+
+
+def get_dashboard_stats(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    limits: Optional[List[float]] = None,
+    positions: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """dashboard_data.get_dashboard_stats по Parquet (прямой скан вместо daily_rollup)."""
+    _validate_filters(date_from, date_to, limits, positions)
+    where, params = _filter_sql(date_from, date_to, limits, positions)
+    return stats_from_counters(dashboard_counters(connect().cursor(), where, params))
+
+
+def get_profit_by_date(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    limits: Optional[List[float]] = None,
+    positions: Optional[List[str]] = None,
+) -> Tuple[List[str], List[float]]:
+    """dashboard_data.get_profit_by_date по Parquet."""
+    _validate_filters(date_from, date_to, limits, positions)
+    where, params = _filter_sql(date_from, date_to, limits, positions)
+    rows = connect().execute(_SQL_PROFIT.format(where=where), params).fetchall()
+    return [row[0] for row in rows], [row[1] for row in rows]
+
+
+def agg_stats_by_period(period: Period = "week") -> List[Dict[str, Any]]:
+    """periodic.agg_stats_by_period по Parquet."""
+    expr = _PERIOD_EXPR[period].format(column="h.datetime_utc")
+    rows = connect().execute(_SQL_BY_PERIOD.format(expr=expr)).fetchall()
+    return period_stats(rows)
+
+
+def top_losing_hands(period: Period = "week", n: int = 5) -> List[Dict[str, Any]]:
+    """periodic.top_losing_hands по Parquet."""
+    expr = _PERIOD_EXPR[period].format(column="datetime_utc")
+    rows = connect().execute(SQL_TOP_LOSING.format(expr=expr), (n,)).fetchall()
+    return group_losing(rows)
+
+
+def run_leakfinder(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    limits: Optional[List[float]] = None,
+    positions: Optional[List[str]] = None,
+    save_tags: bool = False,
+) -> List[Dict[str, Any]]:
+    """leakfinder.run_leakfinder: агрегаты по Parquet, теги — в SQLite."""
+    where, params = _filter_sql(date_from, date_to, limits, positions)
+    leaks = check_rules(_aggregate_stats(connect().cursor(), where, params))
+    if save_tags and leaks:
+        save_leak_tags(leaks, date_from, date_to, limits, positions)
+    return leaks
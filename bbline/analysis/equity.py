@@ -0,0 +1,329 @@
+# bbline/analysis/equity.py
+"""
+Эквити холдема полным перебором досок — для all-in EV (analysis/allin_ev.py).
+
+    equity(["AhKh", "QsQd"])                 → [0.46, 0.54] (префлоп, хедз-ап)
+    equity(["AhKh", "QsQd", "7c7d"], "Kd8h2c")
+    pot_equities(hands, board, pots)         → доли каждого игрока в каждом банке
+
+Досок не выбираем случайно: перебираются все доски, совместимые с
+известными картами, — префлоп хедз-ап это 1 712 304 доски. Поэтому:
+
+▪ оценка руки векторная (NumPy) — вся пачка досок за один проход;
+▪ рука описывается 13-битными масками рангов: L1 — ранги, что есть
+  хотя бы раз, L2 — хотя бы дважды, … L4 — каре; плюс маска рангов по
+  каждой масти. Карта добавляется парой OR, без сортировок;
+▪ всё остальное — таблицы на 8192 маски: число бит, старшая карта
+  стрита (с колесом), старшие n рангов для кикеров;
+▪ признаки всех C(52,5) досок считаются один раз на процесс, префлоп
+  — это выборка из них по маске мёртвых карт;
+▪ результат pot_equities кешируется с точностью до перестановки мастей:
+  AhKh vs QsQd и AsKs vs QdQc — одна запись.
+
+Сила руки — целое: категория << 26 | главные ранги << 13 | кикеры
+(маски, а маски рангов сравниваются как числа — старший бит решает).
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+from itertools import combinations
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+RANKS = "23456789TJQKA"
+SUITS = "cdhs"
+MEMO_SIZE = 200_000  # записей в кеше pot_equities на процесс
+
+# ---------------------------------------------------------------------------
+# таблицы по 13-битной маске рангов
+# ---------------------------------------------------------------------------
+_POP = np.array([bin(m).count("1") for m in range(1 << 13)], dtype=np.int32)
+
+
+def _top_bits(mask: int, n: int) -> int:
+    out = 0
+    for r in range(12, -1, -1):
+        if n and mask >> r & 1:
+            out |= 1 << r
+            n -= 1
+    return out
+
+
+# _TOP[n][mask] — маска из n старших рангов (кикеры)
+_TOP = [np.array([_top_bits(m, n) for m in range(1 << 13)], dtype=np.int32) for n in range(6)]
+
+
+def _straight_high(mask: int) -> int:
+    """Старшая карта стрита + 1 (колесо A-5 → 4), 0 — стрита нет."""
+    for top in range(12, 3, -1):
+        need = 0b11111 << (top - 4)
+        if mask & need == need:
+            return top + 1
+    wheel = 0b1000000001111  # A, 2, 3, 4, 5
+    return 4 if mask & wheel == wheel else 0
+
+
+_STRAIGHT = np.array([_straight_high(m) for m in range(1 << 13)], dtype=np.int32)
+
+# категории (чем больше, тем сильнее)
+HIGH, PAIR, TWO_PAIR, TRIPS, STRAIGHT, FLUSH, FULL_HOUSE, QUADS, STRAIGHT_FLUSH = range(9)
+CATEGORIES = (
+    "high",
+    "pair",
+    "two_pair",
+    "trips",
+    "straight",
+    "flush",
+    "full_house",
+    "quads",
+    "straight_flush",
+)  # имена категорий по номеру — для таблиц и отчётов
+
+
+# ---------------------------------------------------------------------------
+# карты и признаки набора карт
+# ---------------------------------------------------------------------------
+def card_index(card: str) -> int:
+    """'Ah' → 0..51 (ранг * 4 + масть)."""
+    return RANKS.index(card[0].upper()) * 4 + SUITS.index(card[1].lower())
+
+
+def parse_cards(cards: str) -> List[int]:
+    """'AhKd' / 'Ah Kd' / '6hQc8h|8c|3d' → индексы карт."""
+    s = "".join(ch for ch in cards if ch.isalnum())
+    return [card_index(s[i : i + 2]) for i in range(0, len(s), 2)]
+
+
+# признаки: [L1, L2, L3, L4, масть c, d, h, s] — массивы масок одинаковой длины
+Features = List[np.ndarray]
+
+
+def _empty(n: int) -> Features:
+    return [np.zeros(n, dtype=np.int32) for _ in range(8)]
+
+
+def _add(f: Features, card) -> Features:
+    """
+    Добавляет карту (int или массив по доскам) — новый список, f не меняется.
+    Ранг r повышает уровень: L4 |= L3&bit, L3 |= L2&bit, … L1 |= bit.
+    """
+    card = np.asarray(card)
+    bit = np.left_shift(1, card >> 2).astype(np.int32)
+    suit = card & 3
+    out = [f[0] | bit, f[1] | (f[0] & bit), f[2] | (f[1] & bit), f[3] | (f[2] & bit)]
+    for s in range(4):
+        out.append(f[4 + s] | np.where(suit == s, bit, 0).astype(np.int32))
+    return out
+
+
+def _features(boards: np.ndarray) -> Features:
+    """Признаки пачки досок: boards — (n, k) индексы карт."""
+    f = _empty(len(boards))
+    for col in boards.T:
+        f = _add(f, col)
+    return f
+
+
+def _strength(f: Features) -> np.ndarray:
+    """Сила 7-карточной руки по признакам (больше — сильнее)."""
+    l1, l2, l3, l4 = f[:4]
+    m3 = l3 & ~l4  # ранги ровно трижды
+    m2 = l2 & ~l3  # ровно дважды
+
+    flush = np.zeros_like(l1)
+    for s in range(4):  # в 7 картах флеш возможен максимум в одной масти
+        flush = np.where(_POP[f[4 + s]] >= 5, f[4 + s], flush)
+
+    def score(cat: int, a, b=0):
+        return (cat << 26) | (np.asarray(a, dtype=np.int32) << 13) | b
+
+    # от слабых категорий к сильным: каждая следующая перекрывает предыдущую
+    out = score(HIGH, _TOP[5][l1])
+    pair_kick = _TOP[3][l1 & ~m2]
+    out = np.where(m2 != 0, score(PAIR, m2, pair_kick), out)
+    two = _TOP[2][m2]  # из трёх пар играют две старшие
+    out = np.where(_POP[m2] >= 2, score(TWO_PAIR, two, _TOP[1][l1 & ~two]), out)
+    out = np.where(m3 != 0, score(TRIPS, _TOP[1][m3], _TOP[2][l1 & ~m3]), out)
+    out = np.where(_STRAIGHT[l1] > 0, score(STRAIGHT, _STRAIGHT[l1]), out)
+    out = np.where(flush != 0, score(FLUSH, _TOP[5][flush]), out)
+    trips = _TOP[1][m3]
+    full = (m3 != 0) & ((_POP[m3] >= 2) | (m2 != 0))  # две тройки — тоже фулл
+    out = np.where(full, score(FULL_HOUSE, trips, _TOP[1][(m3 | m2) & ~trips]), out)
+    out = np.where(l4 != 0, score(QUADS, l4, _TOP[1][l1 & ~l4]), out)
+    sf = _STRAIGHT[flush]
+    out = np.where(sf > 0, score(STRAIGHT_FLUSH, sf), out)
+    return out
+
+
+def categories(cards: np.ndarray) -> np.ndarray:
+    """Категории рук пачкой (HIGH … STRAIGHT_FLUSH): cards — (n, 5..7) индексы карт."""
+    return _strength(_features(cards)) >> 26
+
+
+def evaluate(cards: str) -> int:
+    """Сила одной руки из 5–7 карт ('AhKdQcJsTh2c3d') — для проверок и отладки."""
+    f = _empty(1)
+    for c in parse_cards(cards):
+        f = _add(f, c)
+    return int(_strength(f)[0])
+
+
+# ---------------------------------------------------------------------------
+# все доски (префлоп)
+# ---------------------------------------------------------------------------
+class _Boards(NamedTuple):
+    bits: np.ndarray  # 52-битная маска карт доски
+    rank_id: np.ndarray  # номер набора рангов доски в ranks
+    flush_suit: np.ndarray  # масть, которой на доске ≥3 карт (-1 — флеша не собрать)
+    flush_mask: np.ndarray  # ранги этой масти на доске
+    ranks: Features  # признаки наборов рангов без флешей (их ~6 тыс. на 2.6 млн досок)
+
+
+_ALL: Optional[_Boards] = None
+
+
+def _all_boards() -> _Boards:
+    """
+    Все C(52,5) досок (считаются раз на процесс).
+    Сила без флеша зависит только от набора рангов доски, а таких наборов
+    около 6 тыс., — их и оцениваем, а по доскам раскладываем одним gather.
+    """
+    global _ALL
+    if _ALL is None:
+        boards = np.fromiter(
+            combinations(range(52), 5), dtype=np.dtype((np.int8, 5)), count=2_598_960
+        ).astype(np.int64)
+        bits = np.bitwise_or.reduce(np.left_shift(1, boards), axis=1)
+        ranks, suits = boards >> 2, boards & 3
+        # ранги уже по возрастанию (карты в комбинации отсортированы)
+        key = (ranks * 13 ** np.arange(5)).sum(axis=1)
+        uniq, first, rank_id = np.unique(key, return_index=True, return_inverse=True)
+        counts = np.stack([(suits == s).sum(axis=1) for s in range(4)], axis=1)
+        flush_suit = np.where(counts.max(axis=1) >= 3, counts.argmax(axis=1), -1)
+        on_suit = suits == flush_suit[:, None]
+        flush_mask = (np.left_shift(1, ranks) * on_suit).sum(axis=1)
+        _ALL = _Boards(
+            bits,
+            rank_id.astype(np.int32),
+            flush_suit.astype(np.int8),
+            flush_mask.astype(np.int16),
+            _features(_offsuit(ranks[first])),
+        )
+    return _ALL
+
+
+def _offsuit(ranks: np.ndarray) -> np.ndarray:
+    """Карты с теми же рангами, масти по кругу: в 7 картах не больше двух одной масти."""
+    return ranks * 4 + np.arange(ranks.shape[1]) % 4
+
+
+def _preflop_scores(holes: Sequence[Sequence[int]]) -> np.ndarray:
+    """
+    Префлоп: сила рук на всех досках без мёртвых карт.
+    Без флеша — таблица по набору рангов; флеш — только на досках,
+    где есть три карты одной масти.
+    """
+    b = _all_boards()
+    banned = sum(1 << c for h in holes for c in h)
+    keep = np.flatnonzero((b.bits & banned) == 0)
+    rank_id = b.rank_id[keep]
+    suited = np.flatnonzero(b.flush_suit[keep] >= 0)
+    fs = b.flush_suit[keep[suited]]
+    board_fm = b.flush_mask[keep[suited]].astype(np.int32)
+
+    out = np.empty((len(holes), len(keep)), dtype=np.int32)
+    for i, (c1, c2) in enumerate(holes):
+        # карманным картам — масти 1 и 2 по кругу после пяти карт доски
+        rank_only = _strength(_add(_add(b.ranks, (c1 >> 2) * 4 + 1), (c2 >> 2) * 4 + 2))
+        out[i] = rank_only[rank_id]
+        fm = board_fm | np.where(fs == c1 & 3, 1 << (c1 >> 2), 0)
+        fm |= np.where(fs == c2 & 3, 1 << (c2 >> 2), 0)
+        sf = _STRAIGHT[fm]
+        flush = np.where(
+            sf > 0, (STRAIGHT_FLUSH << 26) | (sf << 13), (FLUSH << 26) | (_TOP[5][fm] << 13)
+        )
+        # флеш сильнее всего, кроме фулл-хауса и каре, — а их и так даёт rank_only
+        row = out[i, suited]
+        out[i, suited] = np.where(_POP[fm] >= 5, np.maximum(row, flush), row)
+    return out
+
+
+def _scores(board: Sequence[int], holes: Sequence[Sequence[int]]) -> np.ndarray:
+    """Сила рук игроков на всех досках, продолжающих board: (игроки, доски)."""
+    if not board:
+        return _preflop_scores(holes)
+    dead = [c for h in holes for c in h]
+    # флоп / тёрн: досдать 1–2 карты — доски строим прямо здесь
+    used = set(board) | set(dead)
+    rest = [c for c in range(52) if c not in used]
+    extra = np.array(list(combinations(rest, 5 - len(board))), dtype=np.int64)
+    f = _features(np.hstack([np.tile(np.array(board), (len(extra), 1)), extra]))
+    return np.vstack([_strength(_add(_add(f, a), b)) for a, b in holes])
+
+
+# ---------------------------------------------------------------------------
+# эквити
+# ---------------------------------------------------------------------------
+def _canonical(hands: Sequence[str], board: str) -> Tuple[Tuple[str, ...], str]:
+    """Перекраска мастей по порядку появления: изоморфные ситуации — один ключ кеша."""
+
+    def norm(cards: str) -> List[str]:
+        s = "".join(ch for ch in cards if ch.isalnum())
+        cs = [s[i].upper() + s[i + 1].lower() for i in range(0, len(s), 2)]
+        return sorted(cs, key=lambda c: (-RANKS.index(c[0]), c[1]))
+
+    order: dict = {}
+
+    def recolor(cards: List[str]) -> str:
+        out = ""
+        for c in cards:
+            if c[1] not in order:
+                order[c[1]] = SUITS[len(order)]
+            out += c[0] + order[c[1]]
+        return out
+
+    b = recolor(norm(board))
+    return tuple(recolor(norm(h)) for h in hands), b
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def _pot_equities(
+    hands: Tuple[str, ...], board: str, pots: Tuple[Tuple[int, ...], ...]
+) -> Tuple[Tuple[float, ...], ...]:
+    scores = _scores(parse_cards(board), [parse_cards(h) for h in hands])
+    out = []
+    for eligible in pots:
+        sub = scores[list(eligible)]
+        best = sub == sub.max(axis=0)
+        share = best / best.sum(axis=0)  # делёж банка поровну между равными
+        eq = [0.0] * len(hands)
+        for i, p in enumerate(eligible):
+            eq[p] = float(share[i].mean())
+        out.append(tuple(eq))
+    return tuple(out)
+
+
+def canonical_key(
+    hands: Sequence[str], board: str, pots: Sequence[Sequence[int]]
+) -> Tuple[Tuple[str, ...], str, Tuple[Tuple[int, ...], ...]]:
+    """Аргументы pot_equities в каноническом виде — ключ для дедупликации ситуаций."""
+    canon_hands, canon_board = _canonical(hands, board)
+    return canon_hands, canon_board, tuple(tuple(p) for p in pots)
+
+
+def pot_equities(
+    hands: Sequence[str], board: str, pots: Sequence[Sequence[int]]
+) -> Tuple[Tuple[float, ...], ...]:
+    """
+    Доли игроков в каждом банке по всем доскам.
+    hands — карты игроков ('AhKd'), board — известная часть доски (0/3/4 карты),
+    pots — номера игроков (индексы hands), претендующих на каждый банк.
+    """
+    return _pot_equities(*canonical_key(hands, board, pots))
+
+
+def equity(hands: Sequence[str], board: str = "") -> List[float]:
+    """Эквити игроков в одном общем банке."""
+    return list(pot_equities(hands, board, [range(len(hands))])[0])
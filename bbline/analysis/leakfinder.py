@@ -28,7 +28,8 @@ import random
 import sqlite3
 from typing import Any, Dict, List
 
-from bbline.utils import get_hand_ids, DB_PATH
+from bbline.database.connection import get_connection
+from bbline.utils import hand_filter_sql, DB_PATH
 
 # ---------------------------------------------------------------------------
 # rule definitions
@@ -84,22 +85,20 @@ def _pct(num: int, den: int) -> float:
     return round((num / den) * 100, 1) if den else 0.0
 
 
-def _aggregate_stats(cur: sqlite3.Cursor, hand_ids: List[str]) -> Dict[str, float]:
-    """Возвращает процентные метрики по выбранным hand_id."""
-    if not hand_ids:
-        return {r["metric"]: 0.0 for r in RULES}
-    ph = ",".join(["?"] * len(hand_ids))
+def _aggregate_stats(cur: sqlite3.Cursor, where: str, params: List[Any]) -> Dict[str, float]:
+    """Возвращает процентные метрики по рукам под фильтр (см. hand_filter_sql)."""
     row = cur.execute(
         f"""
         SELECT
-            SUM(fold_to_3b),
-            SUM(threebet),
-            SUM(cbet_flop),
+            SUM(c.fold_to_3b),
+            SUM(c.threebet),
+            SUM(c.cbet_flop),
             COUNT(*)
-        FROM computed_stats
-        WHERE hand_id IN ({ph});
+        FROM computed_stats c
+        JOIN hands h ON h.hand_id = c.hand_id
+        WHERE {where};
         """,
-        hand_ids,
+        params,
     ).fetchone()
     fold_to_3b, threebet, cbet_flop, total = (int(x or 0) for x in row)
     return {
@@ -109,26 +108,64 @@ def _aggregate_stats(cur: sqlite3.Cursor, hand_ids: List[str]) -> Dict[str, floa
     }
 
 
-def _tag_leaks(cur: sqlite3.Cursor, rule: Rule, hand_ids: List[str]):
+def _tag_leaks(cur: sqlite3.Cursor, rule: Rule, where: str, params: List[Any]):
     """Помечает руки в таблице tags под имя лика (INSERT OR IGNORE)."""
-    if not hand_ids:
-        return
-    ph = ",".join(["?"] * len(hand_ids))
-    # Отобрать руки по condition_sql
-    rows = cur.execute(
-        f"SELECT hand_id FROM computed_stats WHERE hand_id IN ({ph}) AND {rule['condition_sql']};",
-        hand_ids,
-    ).fetchall()
-    leak_hand_ids = [r[0] for r in rows]
-    cur.executemany(
-        "INSERT OR IGNORE INTO tags (hand_id, tag, note) VALUES (?, ?, NULL);",
-        [(hid, rule["name"]) for hid in leak_hand_ids],
+    # Отобрать руки по condition_sql прямо в INSERT ... SELECT.
+    # main.tags — в шардовом соединении tags это view; теги всех шардов живут в базе записи
+    cur.execute(
+        f"""
+        INSERT OR IGNORE INTO main.tags (hand_id, tag, note)
+        SELECT c.hand_id, ?, NULL
+        FROM   computed_stats c
+        JOIN   hands h ON h.hand_id = c.hand_id
+        WHERE  {where} AND ({rule['condition_sql']});
+        """,
+        [rule["name"], *params],
     )
 
 
 # ---------------------------------------------------------------------------
 # public API
 # ---------------------------------------------------------------------------
+def check_rules(stats: Dict[str, float]) -> List[Dict[str, Any]]:
+    """Нарушенные правила по процентам из _aggregate_stats (SQLite или DuckDB)."""
+    leaks: List[Dict[str, Any]] = []
+    for rule in RULES:
+        val = stats[rule["metric"]]
+        violated = (rule["cmp"] == "ge" and val >= rule["threshold"]) or (
+            rule["cmp"] == "le" and val <= rule["threshold"]
+        )
+        if violated:
+            leaks.append(
+                {
+                    "name": rule["name"],
+                    "value": val,
+                    "threshold": rule["threshold"],
+                    "explain": rule["explain"],
+                }
+            )
+    return leaks
+
+
+def save_leak_tags(
+    leaks: List[Dict[str, Any]],
+    date_from: str | None = None,
+    date_to: str | None = None,
+    limits: List[float] | None = None,
+    positions: List[str] | None = None,
+) -> None:
+    """Помечает в tags руки под фильтр для каждого лика из leaks."""
+    names = {leak["name"] for leak in leaks}
+    where, params = hand_filter_sql(date_from, date_to, limits, positions)
+    with get_connection(DB_PATH) as cx:
+        cur = cx.cursor()
+        _ensure_tags_table(cur)
+        for rule in RULES:
+            if rule["name"] in names:
+                _tag_leaks(cur, rule, where, params)
+        cx.commit()
+
+
 def run_leakfinder(
     date_from: str | None = None,
     date_to: str | None = None,
@@ -137,31 +174,12 @@ def run_leakfinder(
     save_tags: bool = False,
 ) -> List[Dict[str, Any]]:
     """Возвращает список нарушенных правил и (опц.) сохраняет теги в БД."""
-    with sqlite3.connect(DB_PATH) as cx:
-        cur = cx.cursor()
-        if save_tags:
-            _ensure_tags_table(cur)
-        hand_ids = get_hand_ids(cur, date_from, date_to, limits, positions)
-        stats = _aggregate_stats(cur, hand_ids)
-        leaks: List[Dict[str, Any]] = []
-        for rule in RULES:
-            val = stats[rule["metric"]]
-            violated = (rule["cmp"] == "ge" and val >= rule["threshold"]) or (
-                rule["cmp"] == "le" and val <= rule["threshold"]
-            )
-            if violated:
-                leaks.append(
-                    {
-                        "name": rule["name"],
-                        "value": val,
-                        "threshold": rule["threshold"],
-                        "explain": rule["explain"],
-                    }
-                )
-                if save_tags:
-                    _tag_leaks(cur, rule, hand_ids)
-        if save_tags:
-            cx.commit()
+    # агрегаты — только чтение: UI не держит блокировку записи
+    with get_connection(DB_PATH, readonly=True) as cx:
+        where, params = hand_filter_sql(date_from, date_to, limits, positions)
+        leaks = check_rules(_aggregate_stats(cx.cursor(), where, params))
+    if save_tags and leaks:
+        save_leak_tags(leaks, date_from, date_to, limits, positions)
     return leaks
 
 
@@ -171,18 +189,20 @@ def get_example_hands(
     order: str = "loss",  # 'loss' → самые минусовые; 'rand' → случайные; 'win' → плюсовые
 ) -> List[Dict[str, Any]]:
     """Возвращает n hand_id (+ net$) для выбранного лика из таблицы tags."""
-    with sqlite3.connect(DB_PATH) as cx:
+    with get_connection(DB_PATH, readonly=True) as cx:
         cur = cx.cursor()
-        _ensure_tags_table(cur)
-        cur.execute(
-            """
-            SELECT h.hand_id, h.hero_net
-            FROM   hands h
-            JOIN   tags  t ON t.hand_id = h.hand_id
-            WHERE  t.tag = ?
-            """,
-            (leak_name,),
-        )
+        try:
+            cur.execute(
+                """
+                SELECT h.hand_id, h.hero_net
+                FROM   hands h
+                JOIN   tags  t ON t.hand_id = h.hand_id
+                WHERE  t.tag = ?
+                """,
+                (leak_name,),
+            )
+        except sqlite3.OperationalError:  # теги ещё ни разу не сохраняли
+            return []
         rows = cur.fetchall()
     if not rows:
         return []
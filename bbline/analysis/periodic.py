@@ -2,22 +2,44 @@
 Модуль для анализа статистики и утечек по временным периодам (день/неделя/месяц).
 """
 
-from typing import Literal, List, Dict, Any
-import sqlite3
+from typing import Any, Dict, Iterable, List, Literal, Sequence
+
+from bbline.analysis.rollup import rows_by_period
+from bbline.database.connection import get_connection
 from bbline.utils import DB_PATH
 
 Period = Literal["day", "week", "month"]
 
 
-def _period_expr(period: Period) -> str:
+def _period_expr(period: Period, column: str = "datetime_utc") -> str:
     """Возвращает SQL-выражение для группировки по периоду."""
     return {
-        "day": "strftime('%Y-%m-%d', datetime_utc)",
-        "week": "strftime('%Y-%W', datetime_utc)",  # ISO-week
-        "month": "strftime('%Y-%m', datetime_utc)",
+        "day": f"strftime('%Y-%m-%d', {column})",
+        "week": f"strftime('%Y-%W', {column})",  # ISO-week
+        "month": f"strftime('%Y-%m', {column})",
     }[period]
 
 
+# топ-N худших рук в каждом периоде; SQL без функций SQLite — его же гоняет DuckDB
+SQL_TOP_LOSING = """
+    SELECT  period,
+            hand_id,
+            hero_net
+    FROM (
+        SELECT {expr} AS period,
+               hand_id,
+               hero_net,
+               ROW_NUMBER() OVER (
+                   PARTITION BY {expr}
+                   ORDER BY hero_net  -- минусы идут первыми
+               ) AS rn
+        FROM hands
+    )
+    WHERE rn <= ?
+    ORDER BY period DESC, hero_net;
+"""
+
+
 def agg_stats_by_period(period: Period = "week") -> List[Dict[str, Any]]:
     """
     Возвращает агрегированную статистику по периодам.
@@ -28,31 +50,23 @@ def agg_stats_by_period(period: Period = "week") -> List[Dict[str, Any]]:
     Returns:
         Список словарей с метриками по каждому периоду
     """
-    expr = _period_expr(period)
-    with sqlite3.connect(DB_PATH) as cx:
-        cx.row_factory = sqlite3.Row
-        rows = cx.execute(
-            f"""
-            SELECT {expr} AS period,
-                   SUM(fold_to_3b)  AS fold_to_3b,
-                   SUM(threebet)    AS threebet,
-                   SUM(cbet_flop)   AS cbet_flop,
-                   COUNT(*)         AS total
-            FROM   computed_stats cs
-            JOIN   hands h USING(hand_id)
-            GROUP  BY period
-            ORDER  BY period DESC;
-        """
-        ).fetchall()
+    # суточные суммы из daily_rollup, неделя/месяц считаются от колонки day
+    expr = _period_expr(period, column="day")
+    with get_connection(DB_PATH, readonly=True) as cx:
+        return period_stats(rows_by_period(cx.cursor(), expr))
+
+
+def period_stats(rows: Iterable[Sequence[Any]]) -> List[Dict[str, Any]]:
+    """Проценты из строк (period, fold_to_3b, threebet, cbet_flop, total) — SQLite или DuckDB."""
     return [
         {
-            "period": r["period"],
-            "fold_to_3b_pct": round(r["fold_to_3b"] * 100 / r["total"], 1),
-            "threebet_pct": round(r["threebet"] * 100 / r["total"], 1),
-            "cbet_flop_pct": round(r["cbet_flop"] * 100 / r["total"], 1),
-            "hands": r["total"],
+            "period": period,
+            "fold_to_3b_pct": round(fold_to_3b * 100 / total, 1),
+            "threebet_pct": round(threebet * 100 / total, 1),
+            "cbet_flop_pct": round(cbet_flop * 100 / total, 1),
+            "hands": total,
         }
-        for r in rows
+        for period, fold_to_3b, threebet, cbet_flop, total in rows
     ]
 
 
@@ -68,32 +82,16 @@ def top_losing_hands(period: Period = "week", n: int = 5) -> List[Dict[str, Any]
         Список словарей с периодами и их худшими руками
     """
     expr = _period_expr(period)
-    with sqlite3.connect(DB_PATH) as cx:
-        cx.row_factory = sqlite3.Row
-        rows = cx.execute(
-            f"""
-            SELECT  period,
-                    hand_id,
-                    hero_net
-            FROM (
-                SELECT {expr} AS period,
-                       hand_id,
-                       hero_net,
-                       ROW_NUMBER() OVER (
-                           PARTITION BY {expr}
-                           ORDER BY hero_net  -- минусы идут первыми
-                       ) AS rn
-                FROM hands
-            )
-            WHERE rn <= ?
-            ORDER BY period DESC, hero_net;
-        """,
-            (n,),
-        ).fetchall()
-    # группируем в Python для удобства
+    with get_connection(DB_PATH, readonly=True) as cx:
+        rows = cx.execute(SQL_TOP_LOSING.format(expr=expr), (n,)).fetchall()
+    return group_losing(rows)
+
+
+def group_losing(rows: Iterable[Sequence[Any]]) -> List[Dict[str, Any]]:
+    """Строки (period, hand_id, hero_net) → [{period, hands: [...]}] (группируем в Python)."""
     out: Dict[str, List[Dict[str, Any]]] = {}
-    for r in rows:
-        out.setdefault(r["period"], []).append({"hand_id": r["hand_id"], "hero_net": r["hero_net"]})
+    for period, hand_id, hero_net in rows:
+        out.setdefault(period, []).append({"hand_id": hand_id, "hero_net": hero_net})
     return [{"period": p, "hands": lst} for p, lst in out.items()]
 
 
@@ -0,0 +1,379 @@
+# bbline/analysis/player_stats.py
+"""
+player_stats — счётчики по каждому игроку (player_id из seats), и оппам, и Hero.
+Реплеер и HUD берут профиль оппа одной выборкой по PRIMARY KEY, без прохода
+по его рукам.
+
+Счётчики — пары «сделал / была возможность», проценты считает hud_stats():
+    hands                   рук, где игрок сделал хоть одно действие
+    vpip, pfr               вложился добровольно / рейзил префлоп (на hands)
+    threebet_opp, threebet  был ход после ровно одного рейза (не своего) / 3-бет
+    faced_3b, fold_to_3b    опенрейзер, ходил после 3-бета / сбросил
+    cbet_opp, cbet          опенрейзер, на флопе до него не ставили / поставил
+    faced_cbet, fold_to_cbet ходил на флопе после конт-бета / сбросил
+    saw_flop, wtsd, wsd     видел флоп / показал карты / показал и собрал банк
+Опенрейзер — первый рейз префлопа, как у Hero в computed_stats.
+
+Флаги считаются в NumPy по actions пачки рук — тот же приём, что векторный
+движок rebuild_computed (действие упаковано в одно число, «сколько рейзов
+было до этой строки» — cumsum внутри руки).
+
+Как поддерживается (как daily_rollup, см. analysis/rollup.py):
+    ▪ HandWriter после записи пачки вызывает add_hands() — UPSERT по player_id;
+    ▪ rebuild_computed после пересчёта вызывает refresh_hands() — игроки
+      затронутых рук пересобираются целиком по всем своим рукам;
+    ▪ rebuild_computed --full и таблица, которой ещё не было, — rebuild_all().
+
+Запуск (пересобрать с нуля):
+    python -m bbline.analysis.player_stats
+"""
+
+import sqlite3
+from contextlib import closing
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from bbline.database import registry
+from bbline.database.connection import connect
+
+BATCH_HANDS = 50_000  # рук за проход при пересборке
+
+# WITHOUT ROWID: строка лежит прямо в B-дереве ключа — профиль за один поиск
+_SQL_CREATE = """
+    CREATE TABLE IF NOT EXISTS player_stats (
+        player_id    TEXT    PRIMARY KEY,   -- «dd9638b4», 'Hero'
+        hands        INTEGER NOT NULL,
+        vpip         INTEGER NOT NULL,
+        pfr          INTEGER NOT NULL,
+        threebet_opp INTEGER NOT NULL,
+        threebet     INTEGER NOT NULL,
+        faced_3b     INTEGER NOT NULL,
+        fold_to_3b   INTEGER NOT NULL,
+        cbet_opp     INTEGER NOT NULL,
+        cbet         INTEGER NOT NULL,
+        faced_cbet   INTEGER NOT NULL,
+        fold_to_cbet INTEGER NOT NULL,
+        saw_flop     INTEGER NOT NULL,
+        wtsd         INTEGER NOT NULL,
+        wsd          INTEGER NOT NULL
+    ) WITHOUT ROWID;
+"""
+# руки игрока — для refresh_hands (пересборка игроков целиком)
+_SQL_SEATS_INDEX = "CREATE INDEX IF NOT EXISTS idx_seats_player ON seats(player_id);"
+
+_COUNTERS = [
+    "hands",
+    "vpip",
+    "pfr",
+    "threebet_opp",
+    "threebet",
+    "faced_3b",
+    "fold_to_3b",
+    "cbet_opp",
+    "cbet",
+    "faced_cbet",
+    "fold_to_cbet",
+    "saw_flop",
+    "wtsd",
+    "wsd",
+]
+
+_SQL_UPSERT = (
+    f"INSERT INTO player_stats (player_id, {', '.join(_COUNTERS)}) "
+    f"VALUES ({', '.join('?' * (len(_COUNTERS) + 1))}) "
+    "ON CONFLICT (player_id) DO UPDATE SET "
+    + ", ".join(f"{c} = {c} + excluded.{c}" for c in _COUNTERS)
+    + ";"
+)
+
+_SCOPE = "temp._ps_scope"
+_IN_SCOPE = f"hand_id IN (SELECT hand_id FROM {_SCOPE})"
+
+# рука — rowid в temp._ps_scope (номер руки в пачке), сид — ключ rowid << 5 | seat_no:
+# запросы отдают только целые числа, без hand_id строками
+# CROSS JOIN — скоуп всегда внешний цикл: у temp-таблицы нет статистики, и без него
+# планировщик сканирует actions целиком
+_FROM_SCOPE = f"FROM {_SCOPE} sc CROSS JOIN {{table}} t ON t.hand_id = sc.hand_id"
+_SEAT_KEY = "(sc.rowid << 5) | t.seat_no"
+
+# действие упаковано в одно число (сортировка по нему = по руке, внутри — по order_no):
+#   rowid << 32 | order_no << 10 | (seat_no + 1) << 5 | street << 3 | act,
+#   street: 0 PREFLOP, 1 FLOP, 2 дальше; act: 1 CALL, 2 BET, 3 RAISE, 4 FOLD, 0 — остальное
+_SQL_ACTIONS = f"""
+    SELECT (sc.rowid << 32) | (t.order_no << 10) | ((t.seat_no + 1) << 5)
+           | (CASE t.street WHEN 'PREFLOP' THEN 0 WHEN 'FLOP' THEN 1 ELSE 2 END << 3)
+           | CASE t.act WHEN 'CALL' THEN 1 WHEN 'BET' THEN 2
+                        WHEN 'RAISE' THEN 3 WHEN 'FOLD' THEN 4 ELSE 0 END
+    {_FROM_SCOPE.format(table="actions")};
+"""
+_SQL_SEATS = f"SELECT {_SEAT_KEY}, t.player_id {_FROM_SCOPE.format(table='seats')};"
+_SQL_FLOP_HANDS = (
+    f"SELECT sc.rowid {_FROM_SCOPE.format(table='hands')} "
+    "WHERE t.board IS NOT NULL AND t.board != '';"
+)
+_SQL_SHOWN = f"SELECT {_SEAT_KEY} {_FROM_SCOPE.format(table='showdowns')};"
+_SQL_WON = (
+    f"SELECT DISTINCT {_SEAT_KEY} {_FROM_SCOPE.format(table='collected')} WHERE t.amount > 0;"
+)
+
+
+# ---------------------------------------------------------------------------
+# флаги по сидам
+# ---------------------------------------------------------------------------
+def _fill_scope(cur: sqlite3.Cursor, hand_ids: Sequence[str]) -> None:
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS _ps_scope (hand_id TEXT PRIMARY KEY);")
+    cur.execute(f"DELETE FROM {_SCOPE};")
+    cur.executemany(f"INSERT OR IGNORE INTO {_SCOPE} VALUES (?);", ((h,) for h in hand_ids))
+
+
+def _before(mask: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Сколько True было в руке до текущей строки (её саму не считая)."""
+    total = np.cumsum(mask)
+    lengths = np.diff(np.append(starts, len(mask)))
+    first = np.where(starts > 0, total[starts - 1], 0)
+    return total - np.repeat(first, lengths) - mask
+
+
+def _seat_flags(cur: sqlite3.Cursor) -> Tuple[List[str], np.ndarray]:
+    """
+    Флаги каждого сида рук из temp._ps_scope: (player_id по сидам,
+    матрица 0/1 сиды × _COUNTERS).
+    """
+    seats = cur.execute(_SQL_SEATS).fetchall()
+    n_seats = len(seats)
+    if not n_seats:
+        return [], np.zeros((0, len(_COUNTERS)), dtype=np.int64)
+
+    def ints(sql: str) -> np.ndarray:
+        return np.fromiter((r[0] for r in cur.execute(sql)), dtype=np.int64)
+
+    keys = np.fromiter((k for k, _ in seats), dtype=np.int64, count=n_seats)
+    by_key = np.argsort(keys)
+    sorted_keys = keys[by_key]
+
+    def seat_of(k: np.ndarray) -> np.ndarray:
+        """Индекс строки seats по ключу сида (−1 — такого сида нет)."""
+        i = np.clip(np.searchsorted(sorted_keys, k), 0, n_seats - 1)
+        return np.where(sorted_keys[i] == k, by_key[i], -1)
+
+    def per_seat(idx: np.ndarray) -> np.ndarray:
+        out = np.zeros(n_seats, dtype=bool)
+        out[idx[idx >= 0]] = True
+        return out
+
+    codes = np.sort(ints(_SQL_ACTIONS))
+    hand_pos = codes >> 32
+    seat_no = ((codes >> 5) & 31) - 1
+    street = (codes >> 3) & 3
+    act = codes & 7
+    seat = seat_of((hand_pos << 5) | seat_no)
+    pre, flop = street == 0, street == 1
+    acted = (act >= 1) & (act <= 4)
+    fold = act == 4
+
+    starts = np.flatnonzero(np.diff(hand_pos, prepend=-1))
+    pf_raise = pre & (act == 3)
+    raises_before = _before(pf_raise, starts)
+    flop_bet = flop & (act == 2)
+    bets_before = _before(flop_bet, starts)
+
+    # опенрейзер руки; конт-бет — первая ставка флопа, и сделал её он
+    n_hands = int(max(sorted_keys[-1] >> 5, hand_pos.max(initial=0))) + 1
+    opener = np.full(n_hands, -1, dtype=np.int64)
+    first_raise = pf_raise & (raises_before == 0)
+    opener[hand_pos[first_raise]] = seat_no[first_raise]
+    is_opener = seat_no == opener[hand_pos]
+    cbet_row = flop_bet & (bets_before == 0) & is_opener
+    cbet_hand = np.zeros(n_hands, dtype=bool)
+    cbet_hand[hand_pos[cbet_row]] = True
+
+    faced_3b = pre & is_opener & acted & (raises_before >= 2)
+    faced_cbet = flop & ~is_opener & acted & (bets_before >= 1) & cbet_hand[hand_pos]
+    hands = per_seat(seat)
+    saw_flop = hands & ~per_seat(seat[pre & fold])
+    flop_hands = np.zeros(n_hands, dtype=bool)
+    flop_hands[ints(_SQL_FLOP_HANDS)] = True
+    saw_flop &= flop_hands[keys >> 5]
+    wtsd = per_seat(seat_of(ints(_SQL_SHOWN)))
+    won = per_seat(seat_of(ints(_SQL_WON)))
+
+    flags = np.column_stack(
+        [
+            hands,
+            per_seat(seat[pre & (act >= 1) & (act <= 3)]),
+            per_seat(seat[pf_raise]),
+            per_seat(seat[pre & acted & (raises_before == 1) & ~is_opener]),
+            per_seat(seat[pf_raise & (raises_before == 1)]),
+            per_seat(seat[faced_3b]),
+            per_seat(seat[faced_3b & fold]),
+            per_seat(seat[flop & is_opener & (bets_before == 0)]),
+            per_seat(seat[cbet_row]),
+            per_seat(seat[faced_cbet]),
+            per_seat(seat[faced_cbet & fold]),
+            saw_flop,
+            wtsd & hands,
+            wtsd & won & hands,
+        ]
+    )
+    return [p for _, p in seats], flags.astype(np.int64)
+
+
+def _player_sums(cur: sqlite3.Cursor, only: Optional[set] = None) -> List[tuple]:
+    """Строки для _SQL_UPSERT по рукам скоупа; only — учитывать только этих игроков."""
+    players, flags = _seat_flags(cur)
+    if only is not None:
+        keep = np.fromiter((p in only for p in players), dtype=bool, count=len(players))
+        players, flags = [p for p, k in zip(players, keep) if k], flags[keep]
+    if not players:
+        return []
+    ids, inverse = np.unique(np.array(players, dtype=object), return_inverse=True)
+    sums = np.zeros((len(ids), len(_COUNTERS)), dtype=np.int64)
+    np.add.at(sums, inverse, flags)
+    return [(pid, *row) for pid, row in zip(ids.tolist(), sums.tolist()) if row[0]]
+
+
+def _add_all(cur: sqlite3.Cursor) -> None:
+    """Прибавляет все руки базы пачками по BATCH_HANDS."""
+    hand_ids = [h for (h,) in cur.execute("SELECT hand_id FROM hands;")]
+    for i in range(0, len(hand_ids), BATCH_HANDS):
+        _fill_scope(cur, hand_ids[i : i + BATCH_HANDS])
+        cur.executemany(_SQL_UPSERT, _player_sums(cur))
+
+
+# ---------------------------------------------------------------------------
+# таблица
+# ---------------------------------------------------------------------------
+def _ensure_players_table(cur: sqlite3.Cursor) -> bool:
+    """
+    Создаёт player_stats; если таблицы не было — сразу заполняет по всей базе.
+    True — таблица только что построена (и уже учитывает все руки в базе).
+    """
+    exists = cur.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'player_stats';"
+    ).fetchone()
+    if exists:
+        return False
+    try:
+        cur.execute(_SQL_CREATE)
+    except sqlite3.OperationalError:
+        # соединение readonly (UI) — строим таблицу отдельным пишущим соединением
+        path = cur.execute("PRAGMA database_list;").fetchone()[2]
+        with closing(connect(path)) as wx:
+            _ensure_players_table(wx.cursor())
+            wx.commit()
+        return True
+    cur.execute(_SQL_SEATS_INDEX)
+    _add_all(cur)
+    return True
+
+
+def add_hands(cx: sqlite3.Connection, hand_ids: Sequence[str]) -> None:
+    """
+    Прибавляет к player_stats только что вставленные руки. Не коммитит.
+    Вызывать ровно один раз на руку — повторный вызов посчитает её дважды.
+    """
+    if not hand_ids:
+        return
+    cur = cx.cursor()
+    if _ensure_players_table(cur):
+        return  # свежая таблица уже посчитана вместе с этими руками
+    _fill_scope(cur, hand_ids)
+    cur.executemany(_SQL_UPSERT, _player_sums(cur))
+
+
+def refresh_hands(cx: sqlite3.Connection, hand_ids: Sequence[str]) -> None:
+    """
+    Пересобирает игроков, сидевших в hand_ids, по всем их рукам.
+    Hero сидит в каждой руке — так что это почти полный проход по базе.
+    """
+    if not hand_ids:
+        return
+    cur = cx.cursor()
+    if _ensure_players_table(cur):
+        return
+    _fill_scope(cur, hand_ids)
+    players = {
+        p for (p,) in cur.execute(f"SELECT DISTINCT player_id FROM seats WHERE {_IN_SCOPE};")
+    }
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS _ps_players (player_id TEXT PRIMARY KEY);")
+    cur.execute("DELETE FROM temp._ps_players;")
+    cur.executemany("INSERT INTO temp._ps_players VALUES (?);", ((p,) for p in players))
+    cur.execute(
+        "DELETE FROM player_stats WHERE player_id IN (SELECT player_id FROM temp._ps_players);"
+    )
+    hands = [
+        h
+        for (h,) in cur.execute(
+            "SELECT DISTINCT hand_id FROM seats "
+            "WHERE player_id IN (SELECT player_id FROM temp._ps_players);"
+        )
+    ]
+    for i in range(0, len(hands), BATCH_HANDS):
+        _fill_scope(cur, hands[i : i + BATCH_HANDS])
+        cur.executemany(_SQL_UPSERT, _player_sums(cur, only=players))
+
+
+def rebuild_all(cx: sqlite3.Connection) -> None:
+    """Пересобирает player_stats по всей базе. Не коммитит."""
+    cur = cx.cursor()
+    if _ensure_players_table(cur):
+        return
+    cur.execute("DELETE FROM player_stats;")
+    _add_all(cur)
+
+
+# ---------------------------------------------------------------------------
+# чтение
+# ---------------------------------------------------------------------------
+def player_counters(cur: sqlite3.Cursor, player_ids: Sequence[str]) -> Dict[str, Dict[str, int]]:
+    """
+    Счётчики игроков по PRIMARY KEY: {player_id: {hands, vpip, …}}.
+    В шардовом соединении строки игрока из разных баз складываются.
+    Игроков без рук в ответе нет.
+    """
+    _ensure_players_table(cur)
+    ids = list(dict.fromkeys(player_ids))
+    out: Dict[str, Dict[str, int]] = {}
+    for i in range(0, len(ids), 900):  # лимит переменных SQLite
+        part = ids[i : i + 900]
+        rows = cur.execute(
+            f"SELECT player_id, {', '.join(f'SUM({c})' for c in _COUNTERS)} FROM player_stats "
+            f"WHERE player_id IN ({','.join('?' * len(part))}) GROUP BY player_id;",
+            part,
+        ).fetchall()
+        out.update({row[0]: dict(zip(_COUNTERS, row[1:])) for row in rows})
+    return out
+
+
+def _pct(made: int, chances: int) -> Optional[int]:
+    return round(100.0 * made / chances) if chances else None
+
+
+def hud_stats(c: Dict[str, int]) -> Dict[str, Any]:
+    """Проценты для HUD из счётчиков player_counters (None — возможностей не было)."""
+    return {
+        "Hands": c["hands"],
+        "VPIP": _pct(c["vpip"], c["hands"]),
+        "PFR": _pct(c["pfr"], c["hands"]),
+        "3Bet": _pct(c["threebet"], c["threebet_opp"]),
+        "Fold to 3Bet": _pct(c["fold_to_3b"], c["faced_3b"]),
+        "CBet": _pct(c["cbet"], c["cbet_opp"]),
+        "Fold to CBet": _pct(c["fold_to_cbet"], c["faced_cbet"]),
+        "WTSD": _pct(c["wtsd"], c["saw_flop"]),
+        "W$SD": _pct(c["wsd"], c["wtsd"]),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Пересборка player_stats")
+    registry.add_db_argument(parser)
+    registry.configure(parser.parse_args().db)
+    for path in registry.read_paths():
+        with closing(connect(path)) as cx:
+            rebuild_all(cx)
+            cx.commit()
+            n = cx.execute("SELECT COUNT(*), SUM(hands) FROM player_stats;").fetchone()
+        print(f"✅  player_stats пересобран ({path.name}): {n[0]} игроков, {n[1] or 0} сидов")
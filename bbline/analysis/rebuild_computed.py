@@ -2,178 +2,435 @@
 """
 Пересчитывает computed_stats + hero_collected, hero_rake, net_bb в 'hands'.
 Запуск:
-    python -m bbline.analysis.rebuild_computed
+    python -m bbline.analysis.rebuild_computed          # только новые/изменённые руки
+    python -m bbline.analysis.rebuild_computed --full   # всё с нуля
+    python -m bbline.analysis.rebuild_computed --engine numpy   # векторный движок
+
+Инкрементальный режим берёт руки без строки в computed_stats или с пустым
+net_bb. Триггеры (см. _ensure_stale_triggers) удаляют строку computed_stats,
+когда у руки меняются исходные данные, так что она тоже попадает в пересчёт.
+Новые руки HandWriter считает сам через update_hands() в той же транзакции,
+что и импорт. После пересчёта затронутые дни daily_rollup, строки
+combo_rollup, игроки этих рук в player_stats и их board_features пересобираются.
 """
 
+import argparse
 import sqlite3
-from pathlib import Path
 from collections import defaultdict
+from typing import List, Sequence, Tuple
+
+import numpy as np
 
-DB = Path(__file__).resolve().parents[1] / "database" / "bbline.sqlite"
+from bbline.analysis import board_features, combo_rollup, player_stats, rollup
+from bbline.database import registry
+from bbline.database.connection import connect
+from bbline.database.create_schema import STALE_TRIGGERS_SQL
+from bbline.database.meta import bump_generation
 
 VPIP = {"CALL", "BET", "RAISE"}
 RAISE = {"RAISE"}
 
+_HAND_COLUMNS = """
+    hand_id, hero_seat, hero_net, hero_showdown,
+    hero_invested, rake, final_pot, limit_bb
+"""
 
-def rebuild() -> None:
-    with sqlite3.connect(DB) as cx:
-        cx.row_factory = sqlite3.Row
-        cur = cx.cursor()
-        cur.execute("PRAGMA foreign_keys = ON;")
+# лимит переменных SQLite (старые сборки — 999)
+_MAX_VARS = 900
 
-        # чистим computed_stats
-        cur.execute("DELETE FROM computed_stats;")
 
-        # забираем всё нужное одним запросом
-        hands = cur.execute(
-            """
-            SELECT  hand_id, hero_seat, hero_net, hero_showdown,
-                    hero_invested, rake, final_pot, limit_bb
-            FROM    hands;
+def _ensure_stale_triggers(cur: sqlite3.Cursor) -> None:
+    """
+    Триггеры «устаревания» (create_schema.STALE_TRIGGERS_SQL) — и в базах,
+    созданных до них: правка исходных строк руки удаляет её computed_stats,
+    и следующий инкрементальный rebuild пересчитает руку.
+    INSERT не отслеживаем — дочерние строки вставляются только вместе с новой рукой.
+    """
+    cur.executescript(STALE_TRIGGERS_SQL)
+
+
+def _hand_money(
+    rake_total: float, bb: float, profit: float, hero_collected: float, total_won: float
+) -> Tuple[float, float]:
+    """hero_rake и net_bb руки — общая формула для обоих движков."""
+    # --- корректная доля рейка героя (H2N/HEM-стайл) ---
+    if rake_total > 0 and total_won > 0:
+        hero_rake = round(rake_total * (hero_collected / total_won), 4)
+    else:
+        hero_rake = 0.0
+
+    # --- чистый профит и winrate ---
+    net_bb = round(profit / bb, 4)  # bb > 0 гарантирован
+    return hero_rake, net_bb
+
+
+def _compute_hand(cur: sqlite3.Cursor, h: sqlite3.Row) -> None:
+    """Пересчитывает одну руку: UPDATE hands + INSERT OR REPLACE computed_stats."""
+    hand_id = h["hand_id"]
+    hero_seat = h["hero_seat"]
+    hero_net = h["hero_net"] or 0.0
+    # hero_in = h["hero_invested"] or 0.0   # если нужно, используй hero_in дальше по коду
+    hero_sd = bool(h["hero_showdown"])
+    rake_total = h["rake"] or 0.0
+    # final_pot = h["final_pot"] or 0.0      # если нужно, используй final_pot дальше по коду
+    bb = h["limit_bb"] or 0.02  # страхуемся
+    profit = hero_net or 0.0  # hero_net уже «чистый»
+
+    # --- сколько собрал именно Hero ---
+    row = cur.execute(
         """
-        ).fetchall()
+        SELECT SUM(amount) AS hero_sum
+        FROM collected
+        WHERE hand_id = ?
+          AND seat_no  = ?
+        """,
+        (hand_id, hero_seat),
+    ).fetchone()
+    hero_collected = float(row["hero_sum"] or 0.0)
+
+    # --- сколько всего победители собрали ---
+    row = cur.execute(
+        """
+        SELECT SUM(amount) AS total_collected
+        FROM collected
+        WHERE hand_id = ?
+        """,
+        (hand_id,),
+    ).fetchone()
+    total_won = float(row["total_collected"] or 0.0)
+
+    hero_rake, net_bb = _hand_money(rake_total, bb, profit, hero_collected, total_won)
+
+    # обновляем руки
+    cur.execute(
+        """
+        UPDATE hands
+           SET hero_collected = ?,
+               hero_rake      = ?,
+               net_bb         = ?
+         WHERE hand_id        = ?;
+    """,
+        (hero_collected, hero_rake, net_bb, hand_id),
+    )
+
+    # ---------------- computed_stats -------------
+    st = defaultdict(int)
+
+    # исходы
+    st["wtsd"] = int(hero_sd)
+    st["wsd"] = int(hero_sd and profit > 0)
+    st["wwsf"] = int((profit > 0) and not hero_sd)
+
+    # действия по руке
+    acts = cur.execute(
+        """
+        SELECT street, seat_no, act
+        FROM   actions
+        WHERE  hand_id = ?
+        ORDER  BY order_no;
+    """,
+        (hand_id,),
+    ).fetchall()
+
+    preflop_raises = 0
+    hero_raised_pf = False
+    hero_faced_3bet = False
+    flop_bet_seen = False
+
+    for a in acts:
+        street, seat, act = a["street"], a["seat_no"], a["act"]
+
+        # ---------- PREFLOP ----------
+        if street == "PREFLOP":
+            if act in VPIP and seat == hero_seat:
+                st["vpip"] = 1
+
+            if act in RAISE:
+                preflop_raises += 1
+
+                if seat == hero_seat:  #   действия героя
+                    st["pfr"] = 1
+                    if preflop_raises == 1:
+                        hero_raised_pf = True
+                    elif preflop_raises == 2:
+                        st["threebet"] = 1
+                else:  #   действия оппа
+                    if hero_raised_pf:
+                        hero_faced_3bet = True
+
+            if act == "FOLD" and seat == hero_seat and hero_faced_3bet:
+                st["fold_to_3b"] = 1
+
+        # ---------- FLOP ----------
+        if street == "FLOP":
+            if act == "BET" and not flop_bet_seen:
+                flop_bet_seen = True
+                if hero_raised_pf and seat == hero_seat:
+                    st["cbet_flop"] = 1
+            if act == "FOLD" and seat == hero_seat and flop_bet_seen:
+                st["fold_to_cbet"] = 1
+
+    # пишем в таблицу
+    cur.execute(
+        """
+        INSERT OR REPLACE INTO computed_stats (
+            hand_id, vpip, pfr, threebet,
+            fold_to_3b, cbet_flop, fold_to_cbet,
+            wwsf, wt_sd, w_sd
+        ) VALUES (?,?,?,?,?,?,?,?,?,?);
+    """,
+        (
+            hand_id,
+            st["vpip"],
+            st["pfr"],
+            st["threebet"],
+            st["fold_to_3b"],
+            st["cbet_flop"],
+            st["fold_to_cbet"],
+            st["wwsf"],
+            st["wtsd"],
+            st["wsd"],
+        ),
+    )
+
+
+# ---------------------------------------------------------------------------
+# векторный движок: те же флаги, но для всех рук скоупа сразу —
+# actions грузятся одним запросом, дальше NumPy-массивы по (hand, order_no)
+# ---------------------------------------------------------------------------
+_SQL_HANDS_BULK = """
+    SELECT h.hand_id, h.hero_seat, h.hero_net, h.hero_showdown, h.rake, h.limit_bb,
+           (SELECT SUM(amount) FROM collected c
+             WHERE c.hand_id = h.hand_id AND c.seat_no = h.hero_seat) AS hero_sum,
+           (SELECT SUM(amount) FROM collected c
+             WHERE c.hand_id = h.hand_id)                             AS total_collected
+    FROM   hands h
+    {where};
+"""
+
+# действие упаковано в одно число (так fetchall почти вдвое быстрее):
+#   order_no << 9 | (seat_no + 1) << 4 | is_flop << 3 | act,
+#   act: 1 CALL, 2 BET, 3 RAISE, 4 FOLD, 0 — остальное
+_SQL_ACTIONS_BULK = """
+    SELECT a.hand_id,
+           (a.order_no << 9) | ((a.seat_no + 1) << 4) | ((a.street = 'FLOP') << 3)
+           | CASE a.act WHEN 'CALL' THEN 1 WHEN 'BET' THEN 2
+                        WHEN 'RAISE' THEN 3 WHEN 'FOLD' THEN 4 ELSE 0 END
+    FROM   actions a
+    WHERE  a.street IN ('PREFLOP', 'FLOP') {and_scope};
+"""
+
+_SCOPE = "temp._rc_scope"
+
+
+def _fill_scope(cur: sqlite3.Cursor, hand_ids: Sequence[str]) -> None:
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS _rc_scope (hand_id TEXT PRIMARY KEY);")
+    cur.execute(f"DELETE FROM {_SCOPE};")
+    cur.executemany(f"INSERT OR IGNORE INTO {_SCOPE} VALUES (?);", ((h,) for h in hand_ids))
+
+
+def _running_count(mask: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Накопленное число True внутри каждой руки (включая текущую строку)."""
+    total = np.cumsum(mask)
+    lengths = np.diff(np.append(starts, len(mask)))
+    before = np.where(starts > 0, total[starts - 1], 0)
+    return total - np.repeat(before, lengths)
+
+
+def _compute_vectorized(cur: sqlite3.Cursor, scoped: bool) -> int:
+    """
+    Пересчёт всех рук (scoped=False) или рук из temp._rc_scope.
+    Повторяет логику цикла из _compute_hand без построчного прохода:
+    «сколько рейзов/бетов было до этой строки» считается cumsum'ом внутри руки.
+    """
+    # sqlite3.Row на миллионе строк actions дороже самого запроса — берём кортежи
+    cur = cur.connection.cursor()
+    cur.row_factory = None
+    where = f"WHERE h.hand_id IN (SELECT hand_id FROM {_SCOPE})" if scoped else ""
+    and_scope = f"AND a.hand_id IN (SELECT hand_id FROM {_SCOPE})" if scoped else ""
+
+    hands = cur.execute(_SQL_HANDS_BULK.format(where=where)).fetchall()
+    n_hands = len(hands)
+    if not n_hands:
+        return 0
+    pos = {h[0]: i for i, h in enumerate(hands)}
+    hero_seats = np.fromiter((h[1] for h in hands), dtype=np.int64, count=n_hands)
+
+    rows = cur.execute(_SQL_ACTIONS_BULK.format(and_scope=and_scope)).fetchall()
+    hand_pos = np.fromiter((pos.get(r[0], -1) for r in rows), dtype=np.int64, count=len(rows))
+    codes = np.fromiter((r[1] for r in rows), dtype=np.int64, count=len(rows))
+    known = hand_pos >= 0
+    hand_pos, codes = hand_pos[known], codes[known]
+
+    # порядок как в цикле: по руке, внутри — по order_no (старшие биты кода)
+    order = np.lexsort((codes, hand_pos))
+    hand_pos, codes = hand_pos[order], codes[order]
+    seat = ((codes >> 4) & 31) - 1
+    flop = ((codes >> 3) & 1).astype(bool)
+    act = codes & 7
+    preflop = ~flop
+    is_hero = seat == hero_seats[hand_pos]
+
+    starts = np.flatnonzero(np.diff(hand_pos, prepend=-1))
+    pf_raise = preflop & (act == 3)
+    pf_raises = _running_count(pf_raise, starts)
+    opp_pf_raises = _running_count(pf_raise & ~is_hero, starts)
+    flop_bets = _running_count(flop & (act == 2), starts)
+
+    def per_hand(mask: np.ndarray) -> np.ndarray:
+        out = np.zeros(n_hands, dtype=bool)
+        out[hand_pos[mask]] = True
+        return out
+
+    hero_pf = preflop & is_hero
+    hero_flop = flop & is_hero
+    vpip = per_hand(hero_pf & (act >= 1) & (act <= 3))
+    pfr = per_hand(hero_pf & (act == 3))
+    threebet = per_hand(hero_pf & (act == 3) & (pf_raises == 2))
+    opened = per_hand(hero_pf & (act == 3) & (pf_raises == 1))  # hero_raised_pf
+    # после опена героя любой рейз оппа — это 3-бет против него
+    fold_to_3b = opened & per_hand(hero_pf & (act == 4) & (opp_pf_raises >= 1))
+    cbet_flop = opened & per_hand(hero_flop & (act == 2) & (flop_bets == 1))
+    fold_to_cbet = per_hand(hero_flop & (act == 4) & (flop_bets >= 1))
+    flags = np.column_stack([vpip, pfr, threebet, fold_to_3b, cbet_flop, fold_to_cbet])
+
+    updates, stats = [], []
+    for (hand_id, _, hero_net, hero_sd, rake, limit_bb, hero_sum, total), f in zip(
+        hands, flags.astype(int).tolist()
+    ):
+        profit = hero_net or 0.0
+        hero_sd = bool(hero_sd)
+        hero_collected = float(hero_sum or 0.0)
+        hero_rake, net_bb = _hand_money(
+            rake or 0.0, limit_bb or 0.02, profit, hero_collected, float(total or 0.0)
+        )
+        updates.append((hero_collected, hero_rake, net_bb, hand_id))
+        wwsf = int((profit > 0) and not hero_sd)
+        stats.append((hand_id, *f, wwsf, int(hero_sd), int(hero_sd and profit > 0)))
+
+    cur.executemany(
+        """
+        UPDATE hands
+           SET hero_collected = ?,
+               hero_rake      = ?,
+               net_bb         = ?
+         WHERE hand_id        = ?;
+        """,
+        updates,
+    )
+    cur.executemany(
+        """
+        INSERT OR REPLACE INTO computed_stats (
+            hand_id, vpip, pfr, threebet,
+            fold_to_3b, cbet_flop, fold_to_cbet,
+            wwsf, wt_sd, w_sd
+        ) VALUES (?,?,?,?,?,?,?,?,?,?);
+        """,
+        stats,
+    )
+    return n_hands
+
+
+ENGINES = ("loop", "numpy")
+
+
+def update_hands(cx: sqlite3.Connection, hand_ids: Sequence[str], engine: str = "loop") -> int:
+    """
+    Пересчитывает только переданные руки. Не коммитит — вызывающий код
+    (HandWriter, rebuild) сам решает, в какой транзакции это происходит.
+    engine: 'loop' — построчный цикл, 'numpy' — векторный (результат идентичен).
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Неизвестный движок: {engine}. Используй: {', '.join(ENGINES)}")
+    cur = cx.cursor()
+    if engine == "numpy":
+        _fill_scope(cur, hand_ids)
+        return _compute_vectorized(cur, scoped=True)
 
+    cur.row_factory = sqlite3.Row
+    done = 0
+    for i in range(0, len(hand_ids), _MAX_VARS):
+        part = list(hand_ids[i : i + _MAX_VARS])
+        ph = ",".join("?" * len(part))
+        hands = cur.execute(
+            f"SELECT {_HAND_COLUMNS} FROM hands WHERE hand_id IN ({ph});", part
+        ).fetchall()
         for h in hands:
-            hand_id = h["hand_id"]
-            hero_seat = h["hero_seat"]
-            hero_net = h["hero_net"] or 0.0
-            # hero_in = h["hero_invested"] or 0.0   # если нужно, используй hero_in дальше по коду
-            hero_sd = bool(h["hero_showdown"])
-            rake_total = h["rake"] or 0.0
-            # final_pot = h["final_pot"] or 0.0      # если нужно, используй final_pot дальше по коду
-            bb = h["limit_bb"] or 0.02  # страхуемся
-
-            # --- сколько собрал именно Hero ---
-            row = cur.execute(
-                """
-                SELECT SUM(amount) AS hero_sum
-                FROM collected
-                WHERE hand_id = ?
-                  AND seat_no  = ?
-                """,
-                (hand_id, hero_seat),
-            ).fetchone()
-            hero_collected = float(row["hero_sum"] or 0.0)
-
-            # --- сколько всего победители собрали ---
-            row = cur.execute(
-                """
-                SELECT SUM(amount) AS total_collected
-                FROM collected
-                WHERE hand_id = ?
-                """,
-                (hand_id,),
-            ).fetchone()
-            total_won = float(row["total_collected"] or 0.0)
-
-            # --- корректная доля рейка героя (H2N/HEM-стайл) ---
-            if rake_total > 0 and total_won > 0:
-                hero_rake = round(rake_total * (hero_collected / total_won), 4)
+            _compute_hand(cur, h)
+        done += len(hands)
+    return done
+
+
+def pending_hand_ids(cur: sqlite3.Cursor) -> List[str]:
+    """Руки, которым нужен пересчёт: нет строки computed_stats или не посчитан net_bb."""
+    rows = cur.execute(
+        """
+        SELECT h.hand_id
+        FROM   hands h
+        LEFT JOIN computed_stats cs ON cs.hand_id = h.hand_id
+        WHERE  cs.hand_id IS NULL OR h.net_bb IS NULL;
+        """
+    ).fetchall()
+    return [r[0] for r in rows]
+
+
+def rebuild(full: bool = False, engine: str = "loop", db_path=None) -> None:
+    if engine not in ENGINES:
+        raise ValueError(f"Неизвестный движок: {engine}. Используй: {', '.join(ENGINES)}")
+    with connect(db_path) as cx:
+        cx.row_factory = sqlite3.Row
+        cur = cx.cursor()
+        cur.execute("PRAGMA foreign_keys = ON;")
+        _ensure_stale_triggers(cur)
+
+        if full:
+            # чистим computed_stats и забираем всё нужное одним запросом
+            cur.execute("DELETE FROM computed_stats;")
+            if engine == "numpy":
+                n_hands = _compute_vectorized(cur, scoped=False)
             else:
-                hero_rake = 0.0
-
-            # --- чистый профит и winrate ---
-            profit = hero_net or 0.0  # hero_net уже «чистый»
-            net_bb = round(profit / bb, 4)  # bb > 0 гарантирован
-
-            # обновляем руки
-            cur.execute(
-                """
-                UPDATE hands
-                   SET hero_collected = ?,
-                       hero_rake      = ?,
-                       net_bb         = ?
-                 WHERE hand_id        = ?;
-            """,
-                (hero_collected, hero_rake, net_bb, hand_id),
-            )
-
-            # ---------------- computed_stats -------------
-            st = defaultdict(int)
-
-            # исходы
-            st["wtsd"] = int(hero_sd)
-            st["wsd"] = int(hero_sd and profit > 0)
-            st["wwsf"] = int((profit > 0) and not hero_sd)
-
-            # действия по руке
-            acts = cur.execute(
-                """
-                SELECT street, seat_no, act
-                FROM   actions
-                WHERE  hand_id = ?
-                ORDER  BY order_no;
-            """,
-                (hand_id,),
-            ).fetchall()
-
-            preflop_raises = 0
-            hero_raised_pf = False
-            hero_faced_3bet = False
-            flop_bet_seen = False
-
-            for a in acts:
-                street, seat, act = a["street"], a["seat_no"], a["act"]
-
-                # ---------- PREFLOP ----------
-                if street == "PREFLOP":
-                    if act in VPIP and seat == hero_seat:
-                        st["vpip"] = 1
-
-                    if act in RAISE:
-                        preflop_raises += 1
-
-                        if seat == hero_seat:  #   действия героя
-                            st["pfr"] = 1
-                            if preflop_raises == 1:
-                                hero_raised_pf = True
-                            elif preflop_raises == 2:
-                                st["threebet"] = 1
-                        else:  #   действия оппа
-                            if hero_raised_pf:
-                                hero_faced_3bet = True
-
-                    if act == "FOLD" and seat == hero_seat and hero_faced_3bet:
-                        st["fold_to_3b"] = 1
-
-                # ---------- FLOP ----------
-                if street == "FLOP":
-                    if act == "BET" and not flop_bet_seen:
-                        flop_bet_seen = True
-                        if hero_raised_pf and seat == hero_seat:
-                            st["cbet_flop"] = 1
-                    if act == "FOLD" and seat == hero_seat and flop_bet_seen:
-                        st["fold_to_cbet"] = 1
-
-            # пишем в таблицу
-            cur.execute(
-                """
-                INSERT OR REPLACE INTO computed_stats (
-                    hand_id, vpip, pfr, threebet,
-                    fold_to_3b, cbet_flop, fold_to_cbet,
-                    wwsf, wt_sd, w_sd
-                ) VALUES (?,?,?,?,?,?,?,?,?,?);
-            """,
-                (
-                    hand_id,
-                    st["vpip"],
-                    st["pfr"],
-                    st["threebet"],
-                    st["fold_to_3b"],
-                    st["cbet_flop"],
-                    st["fold_to_cbet"],
-                    st["wwsf"],
-                    st["wtsd"],
-                    st["wsd"],
-                ),
-            )
+                hands = cur.execute(f"SELECT {_HAND_COLUMNS} FROM hands;").fetchall()
+                for h in hands:
+                    _compute_hand(cur, h)
+                n_hands = len(hands)
+            rollup.rebuild_all(cx)
+            combo_rollup.rebuild_all(cx)
+            player_stats.rebuild_all(cx)
+            board_features.rebuild_all(cx)
+        else:
+            pending = pending_hand_ids(cur)
+            n_hands = update_hands(cx, pending, engine=engine)
+            rollup.refresh_hands(cx, pending)
+            combo_rollup.refresh_hands(cx, pending)
+            player_stats.refresh_hands(cx, pending)
+            board_features.add_hands(cx, pending)  # INSERT OR REPLACE — строки рук заново
+        if n_hands:
+            bump_generation(cx)
 
         cx.commit()
 
+    mode = "полный" if full else "инкрементальный"
     print(
-        f"✅  пересчитали computed_stats + hero_collected + hero_rake + winrate для {len(hands)} рук"
+        f"✅  пересчитали computed_stats + hero_collected + hero_rake + winrate "
+        f"для {n_hands} рук ({mode} режим, движок {engine})"
     )
 
 
 if __name__ == "__main__":
-    rebuild()
+    parser = argparse.ArgumentParser(description="Пересчёт computed_stats")
+    parser.add_argument(
+        "--full", action="store_true", help="удалить computed_stats и пересчитать все руки"
+    )
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="loop",
+        help="loop — построчный цикл, numpy — векторный движок по всем рукам сразу",
+    )
+    registry.add_db_argument(parser)
+    args = parser.parse_args()
+    registry.configure(args.db)
+    # computed_stats живут в каждой базе — пересчитываем все шарды реестра
+    for path in registry.read_paths():
+        print(f"— {path}")
+        rebuild(full=args.full, engine=args.engine, db_path=path)
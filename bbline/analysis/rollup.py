@@ -0,0 +1,257 @@
+# bbline/analysis/rollup.py
+"""
+daily_rollup — суточные суммы по (day, limit_bb, hero_position).
+Дашборд и отчёты по неделям/месяцам читают несколько сотен строк
+отсюда вместо миллионов рук из hands + computed_stats.
+
+Как поддерживается:
+    ▪ HandWriter после записи пачки вызывает add_hands() — новые руки
+      просто прибавляются к своим строкам (UPSERT);
+    ▪ rebuild_computed после пересчёта вызывает refresh_hands() — дни,
+      в которых поменялись computed_stats, пересобираются целиком;
+    ▪ rebuild_computed --full и таблица, которой ещё не было, — rebuild_all().
+
+Запуск (пересобрать с нуля):
+    python -m bbline.analysis.rollup
+"""
+
+import sqlite3
+from contextlib import closing
+from typing import Any, Dict, List, Sequence
+
+from bbline.database import registry
+from bbline.database.connection import connect
+
+# hero_position NULL храним как '' — иначе NULL ломает PRIMARY KEY / UPSERT
+_SQL_CREATE = """
+    CREATE TABLE IF NOT EXISTS daily_rollup (
+        day           TEXT    NOT NULL,        -- 'YYYY-MM-DD' (UTC)
+        limit_bb      REAL    NOT NULL,
+        hero_position TEXT    NOT NULL,        -- '' если позиция неизвестна
+        hands         INTEGER NOT NULL,
+        hero_net      REAL    NOT NULL,
+        net_bb        REAL    NOT NULL,
+        hero_rake     REAL    NOT NULL,
+        flop_seen     INTEGER NOT NULL,
+        stats_hands   INTEGER NOT NULL,        -- рук с computed_stats (знаменатель VPIP/PFR)
+        vpip          INTEGER NOT NULL,
+        pfr           INTEGER NOT NULL,
+        threebet      INTEGER NOT NULL,
+        fold_to_3b    INTEGER NOT NULL,
+        cbet_flop     INTEGER NOT NULL,
+        wt_sd         INTEGER NOT NULL,
+        w_sd          INTEGER NOT NULL,
+        wwsf          INTEGER NOT NULL,
+        PRIMARY KEY (day, limit_bb, hero_position)
+    );
+"""
+
+_COUNTERS = [
+    "hands",
+    "hero_net",
+    "net_bb",
+    "hero_rake",
+    "flop_seen",
+    "stats_hands",
+    "vpip",
+    "pfr",
+    "threebet",
+    "fold_to_3b",
+    "cbet_flop",
+    "wt_sd",
+    "w_sd",
+    "wwsf",
+]
+
+# суммы по рукам, отобранным {where} (алиасы h / c)
+_SQL_SELECT_DELTA = """
+    SELECT SUBSTR(h.datetime_utc, 1, 10),
+           h.limit_bb,
+           COALESCE(h.hero_position, ''),
+           COUNT(*),
+           TOTAL(h.hero_net),
+           TOTAL(h.net_bb),
+           TOTAL(h.hero_rake),
+           SUM(CASE WHEN h.board IS NOT NULL AND h.board != '' THEN 1 ELSE 0 END),
+           COUNT(c.hand_id),
+           COALESCE(SUM(c.vpip), 0),
+           COALESCE(SUM(c.pfr), 0),
+           COALESCE(SUM(c.threebet), 0),
+           COALESCE(SUM(c.fold_to_3b), 0),
+           COALESCE(SUM(c.cbet_flop), 0),
+           COALESCE(SUM(c.wt_sd), 0),
+           COALESCE(SUM(c.w_sd), 0),
+           COALESCE(SUM(c.wwsf), 0)
+    FROM   hands h
+    LEFT   JOIN computed_stats c ON c.hand_id = h.hand_id
+    WHERE  {where}
+    GROUP  BY 1, 2, 3
+"""
+
+_SQL_UPSERT = (
+    f"INSERT INTO daily_rollup (day, limit_bb, hero_position, {', '.join(_COUNTERS)}) "
+    + _SQL_SELECT_DELTA
+    + " ON CONFLICT (day, limit_bb, hero_position) DO UPDATE SET "
+    + ", ".join(f"{c} = {c} + excluded.{c}" for c in _COUNTERS)
+    + ";"
+)
+
+_SCOPE = "temp._ru_scope"
+
+
+def _ensure_rollup_table(cur: sqlite3.Cursor) -> bool:
+    """
+    Создаёт daily_rollup; если таблицы не было — сразу заполняет по всей базе.
+    True — таблица только что построена (и уже учитывает все руки в базе).
+    """
+    exists = cur.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'daily_rollup';"
+    ).fetchone()
+    if exists:
+        return False
+    try:
+        cur.execute(_SQL_CREATE)
+    except sqlite3.OperationalError:
+        # соединение readonly (UI) — строим таблицу отдельным пишущим соединением
+        path = cur.execute("PRAGMA database_list;").fetchone()[2]
+        with closing(connect(path)) as wx:
+            _ensure_rollup_table(wx.cursor())
+            wx.commit()
+        return True
+    cur.execute(_SQL_UPSERT.format(where="1=1"))
+    return True
+
+
+def _fill_scope(cur: sqlite3.Cursor, hand_ids: Sequence[str]) -> None:
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS _ru_scope (hand_id TEXT PRIMARY KEY);")
+    cur.execute(f"DELETE FROM {_SCOPE};")
+    cur.executemany(f"INSERT OR IGNORE INTO {_SCOPE} VALUES (?);", ((h,) for h in hand_ids))
+
+
+def add_hands(cx: sqlite3.Connection, hand_ids: Sequence[str]) -> None:
+    """
+    Прибавляет к rollup только что вставленные руки. Не коммитит.
+    Вызывать ровно один раз на руку — повторный вызов посчитает её дважды.
+    """
+    if not hand_ids:
+        return
+    cur = cx.cursor()
+    if _ensure_rollup_table(cur):
+        return  # свежая таблица уже посчитана вместе с этими руками
+    _fill_scope(cur, hand_ids)
+    cur.execute(_SQL_UPSERT.format(where=f"h.hand_id IN (SELECT hand_id FROM {_SCOPE})"))
+
+
+def refresh_days(cx: sqlite3.Connection, days: Sequence[str]) -> None:
+    """Пересобирает строки rollup за указанные дни ('YYYY-MM-DD'). Не коммитит."""
+    cur = cx.cursor()
+    if _ensure_rollup_table(cur):
+        return
+    # диапазон по самой колонке — идёт по idx_hands_datetime
+    where = "h.datetime_utc >= ? AND h.datetime_utc < date(?, '+1 day')"
+    for day in days:
+        cur.execute("DELETE FROM daily_rollup WHERE day = ?;", (day,))
+        cur.execute(_SQL_UPSERT.format(where=where), (day, day))
+
+
+def refresh_hands(cx: sqlite3.Connection, hand_ids: Sequence[str]) -> None:
+    """Пересобирает дни, в которые попали hand_ids (после пересчёта computed_stats)."""
+    if not hand_ids:
+        return
+    cur = cx.cursor()
+    _fill_scope(cur, hand_ids)
+    days = [
+        r[0]
+        for r in cur.execute(
+            f"SELECT DISTINCT SUBSTR(datetime_utc, 1, 10) FROM hands "
+            f"WHERE hand_id IN (SELECT hand_id FROM {_SCOPE});"
+        )
+    ]
+    refresh_days(cx, days)
+
+
+def rebuild_all(cx: sqlite3.Connection) -> None:
+    """Пересобирает rollup по всей базе. Не коммитит."""
+    cur = cx.cursor()
+    _ensure_rollup_table(cur)
+    cur.execute("DELETE FROM daily_rollup;")
+    cur.execute(_SQL_UPSERT.format(where="1=1"))
+
+
+def rollup_counters(
+    cur: sqlite3.Cursor, where: str = "1=1", params: Sequence[Any] = ()
+) -> Dict[str, Any]:
+    """
+    Те же счётчики, что dashboard_data.dashboard_counters, но из rollup.
+    where — из hand_filter_sql(..., alias="r", by_day=True).
+    """
+    _ensure_rollup_table(cur)
+    row = cur.execute(
+        f"""
+        SELECT SUM(hands)       AS hands,
+               SUM(hero_net)    AS hero_net,
+               SUM(net_bb)      AS net_bb,
+               SUM(hero_rake)   AS hero_rake,
+               SUM(flop_seen)   AS flop_seen,
+               SUM(stats_hands) AS stats_hands,
+               SUM(vpip)        AS vpip,
+               SUM(pfr)         AS pfr,
+               SUM(wt_sd)       AS wt_sd,
+               SUM(w_sd)        AS w_sd,
+               SUM(wwsf)        AS wwsf_only   -- wwsf=1 уже значит «без шоудауна»
+        FROM   daily_rollup r
+        WHERE  {where};
+        """,
+        params,
+    ).fetchone()
+    names = [d[0] for d in cur.description]
+    return dict(zip(names, row))
+
+
+def profit_by_day(
+    cur: sqlite3.Cursor, where: str = "1=1", params: Sequence[Any] = ()
+) -> List[tuple]:
+    """[(day, профит $ за день)] по возрастанию дня — для графика дашборда."""
+    _ensure_rollup_table(cur)
+    return cur.execute(
+        f"""
+        SELECT r.day, ROUND(SUM(r.hero_net), 2)
+        FROM   daily_rollup r
+        WHERE  {where}
+        GROUP  BY r.day
+        ORDER  BY r.day;
+        """,
+        params,
+    ).fetchall()
+
+
+def rows_by_period(cur: sqlite3.Cursor, period_expr: str) -> List[sqlite3.Row]:
+    """Суммы rollup по периоду (period_expr — выражение от колонки day), новые сверху."""
+    _ensure_rollup_table(cur)
+    return cur.execute(
+        f"""
+        SELECT {period_expr}    AS period,
+               SUM(fold_to_3b)  AS fold_to_3b,
+               SUM(threebet)    AS threebet,
+               SUM(cbet_flop)   AS cbet_flop,
+               SUM(stats_hands) AS total
+        FROM   daily_rollup
+        GROUP  BY period
+        HAVING SUM(stats_hands) > 0
+        ORDER  BY period DESC;
+        """
+    ).fetchall()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Пересборка daily_rollup")
+    registry.add_db_argument(parser)
+    registry.configure(parser.parse_args().db)
+    for path in registry.read_paths():
+        with closing(connect(path)) as cx:
+            rebuild_all(cx)
+            cx.commit()
+            n = cx.execute("SELECT COUNT(*), SUM(hands) FROM daily_rollup;").fetchone()
+        print(f"✅  daily_rollup пересобран ({path.name}): {n[0]} строк, {n[1] or 0} рук")
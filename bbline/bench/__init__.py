@@ -0,0 +1,8 @@
+"""
+Бенчмарки BBLine (не тесты — гоняются руками).
+Запуск:
+    python -m bbline.bench.computed_engines --hands 100000 1000000
+    python -m bbline.bench.suite --hands 10000 100000 1000000 --out bench.json
+    python -m bbline.bench.concurrent_load --hands 100000 --readers 2
+    python -m bbline.bench.analytics_backends --hands 1000000
+"""
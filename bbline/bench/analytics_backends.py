@@ -0,0 +1,196 @@
+"""
+Аналитика дашборда: SQLite (как сейчас) против DuckDB поверх Parquet-выгрузки.
+
+Запуск:
+    python -m bbline.bench.analytics_backends --hands 1000000 --workdir /tmp/bb
+
+База — та же, что собирает suite (stage insert_batch); если её нет в
+workdir, собирается. Дальше:
+    ▪ полная выгрузка parquet_export и повторный запуск без новых рук;
+    ▪ по FILTERS из dashboard_query — дашборд (SQLite: daily_rollup и прямой
+      скан; DuckDB: скан Parquet), график профита, агрегаты лик-файндера;
+    ▪ periodic по неделям и топ проигрышей по месяцам;
+    ▪ тяжёлый скан actions (GROUP BY улица × действие) — на такие запросы
+      rollup не заготовить.
+Для каждого запроса — медиана времени и совпали ли ответы движков
+(деньги — с точностью до последнего знака округления: суммы float
+складываются в другом порядке).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from bbline.bench.dashboard_query import FILTERS
+from bbline.bench.hh_generator import corpus_path
+from bbline.bench.suite import stage_insert_batch
+
+# одинаковый SQL для обоих движков: where — из hand_filter_sql по hands h
+_SQL_ACTIONS = """
+    SELECT a.street, a.act, COUNT(*) AS n, ROUND(SUM(a.amount), 2) AS amount
+    FROM   actions a
+    JOIN   hands h ON h.hand_id = a.hand_id
+    WHERE  {where}
+    GROUP  BY a.street, a.act
+    ORDER  BY a.street, a.act;
+"""
+
+
+def _median(fn: Callable[[], Any], repeat: int) -> tuple[float, Any]:
+    fn()  # прогрев: кеш страниц SQLite, метаданные Parquet
+    times, result = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times), result
+
+
+def _close(a: Any, b: Any) -> bool:
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_close(a[k], b[k]) for k in a)
+    if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+        return len(a) == len(b) and all(_close(x, y) for x, y in zip(a, b))
+    if isinstance(a, float) or isinstance(b, float):
+        return math.isclose(a, b, abs_tol=0.11)
+    return a == b
+
+
+def _losing_key(rows: List[Dict[str, Any]]) -> List[tuple]:
+    # при равном hero_net порядок рук у движков свой — сверяем суммы по периодам
+    return [(r["period"], sorted(h["hero_net"] for h in r["hands"])) for r in rows]
+
+
+def export(db: Path, out: Path) -> Dict[str, Any]:
+    from bbline.export.parquet_export import export_parquet
+
+    t0 = time.perf_counter()
+    full = export_parquet(out, db_path=db, full=True)
+    full_sec = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    export_parquet(out, db_path=db)
+    noop_sec = time.perf_counter() - t0
+    size = sum(f.stat().st_size for f in out.rglob("*.parquet"))
+    return {
+        "full_sec": round(full_sec, 1),
+        "noop_sec": round(noop_sec, 3),
+        "rows": full["rows"],
+        "parquet_mb": round(size / 2**20, 1),
+        "sqlite_mb": round(db.stat().st_size / 2**20, 1),
+    }
+
+
+def run(db: Path, out: Path, repeat: int = 3) -> List[Dict[str, Any]]:
+    import bbline.analysis.duckdb_backend as duck
+    import bbline.analysis.leakfinder as lf
+    import bbline.analysis.periodic as pe
+    import bbline.dashboard_data as dd
+    from bbline.database import registry
+    from bbline.database.connection import get_connection
+    from bbline.utils import hand_filter_sql
+
+    registry.configure(str(db))
+    os.environ[duck.ENV_VAR] = str(out)
+
+    def scan_sqlite(**flt: Any) -> Dict[str, Any]:
+        where, params = hand_filter_sql(**flt)
+        cur = get_connection(readonly=True).cursor()
+        return dd.stats_from_counters(dd.dashboard_counters(cur, where, params))
+
+    def actions_sqlite(**flt: Any) -> List[tuple]:
+        where, params = hand_filter_sql(**flt)
+        return (
+            get_connection(readonly=True)
+            .execute(_SQL_ACTIONS.format(where=where), params)
+            .fetchall()
+        )
+
+    def actions_duck(**flt: Any) -> List[tuple]:
+        where, params = duck._filter_sql(**flt)
+        return duck.connect().execute(_SQL_ACTIONS.format(where=where), params).fetchall()
+
+    # (запрос, фильтры, SQLite, DuckDB, ключ сравнения)
+    cases: List[tuple] = []
+    for flt in FILTERS:
+        cases += [
+            ("dashboard (rollup)", flt, dd.get_dashboard_stats, duck.get_dashboard_stats, None),
+            ("dashboard (scan)", flt, scan_sqlite, duck.get_dashboard_stats, None),
+            ("profit_by_date", flt, dd.get_profit_by_date, duck.get_profit_by_date, None),
+            ("leak aggregates", flt, lf.run_leakfinder, duck.run_leakfinder, None),
+            ("actions street×act", flt, actions_sqlite, actions_duck, None),
+        ]
+    cases += [
+        (
+            "stats by week",
+            {"period": "week"},
+            pe.agg_stats_by_period,
+            duck.agg_stats_by_period,
+            None,
+        ),
+        (
+            "top losing by month",
+            {"period": "month", "n": 5},
+            pe.top_losing_hands,
+            duck.top_losing_hands,
+            _losing_key,
+        ),
+    ]
+
+    rows = []
+    for name, flt, sqlite_fn, duck_fn, key in cases:
+        sqlite_sec, a = _median(lambda: sqlite_fn(**flt), repeat)
+        duck_sec, b = _median(lambda: duck_fn(**flt), repeat)
+        if key is not None:
+            a, b = key(a), key(b)
+        rows.append(
+            {
+                "query": name,
+                "filters": flt or "—",
+                "sqlite_ms": round(sqlite_sec * 1000, 1),
+                "duckdb_ms": round(duck_sec * 1000, 1),
+                "match": _close(a, b),
+            }
+        )
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="аналитика: SQLite vs DuckDB по Parquet")
+    parser.add_argument("--hands", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workdir", type=Path, default=None)
+    args = parser.parse_args()
+
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="bbline_bench_"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    db = workdir / f"suite_{args.hands}_{args.seed}.sqlite"
+    if not db.exists():
+        stage_insert_batch(corpus_path(workdir, args.hands, args.seed), db)
+    out = workdir / f"parquet_{args.hands}_{args.seed}"
+    shutil.rmtree(out, ignore_errors=True)
+
+    exp = export(db, out)
+    print(
+        f"выгрузка: {exp['full_sec']} с полная, {exp['noop_sec']} с без новых рук · "
+        f"Parquet {exp['parquet_mb']} МБ vs SQLite {exp['sqlite_mb']} МБ",
+        file=sys.stderr,
+    )
+    rows = run(db, out, args.repeat)
+    for r in rows:
+        print(
+            f"  {r['query']:<20} {r['sqlite_ms']:>9} мс SQLite · {r['duckdb_ms']:>8} мс DuckDB"
+            f" · {'ok' if r['match'] else 'MISMATCH'} · {r['filters']}",
+            file=sys.stderr,
+        )
+    print(json.dumps({"export": exp, "queries": rows}, ensure_ascii=False, indent=2, default=str))
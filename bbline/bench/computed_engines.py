@@ -0,0 +1,100 @@
+"""
+Сравнение движков rebuild_computed: построчный цикл vs векторный (NumPy).
+
+Запуск:
+    python -m bbline.bench.computed_engines --hands 100000 1000000
+
+Для каждого размера собирает синтетическую базу (раздачи из
+assets/test_session.txt с новыми hand_id), делает полный rebuild
+обоими движками на копиях базы и сверяет computed_stats + денежные
+поля hands побайтно.
+"""
+
+from __future__ import annotations
+
+import argparse
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+from bbline.analysis.rebuild_computed import rebuild
+from bbline.database.create_schema import SCHEMA_SQL
+from bbline.database.db_utils import HandWriter
+from bbline.parse.hand_parser import parse_file
+
+SAMPLE = Path(__file__).resolve().parents[1] / "assets" / "test_session.txt"
+
+
+def _synthetic_hands(n: int) -> Iterator[dict]:
+    base = parse_file(str(SAMPLE))
+    start = datetime.fromisoformat(base[0]["datetime_utc"])
+    for i in range(n):
+        h = base[i % len(base)]
+        hid = f"BENCH{i:09d}"
+        # раздача раз в 40 секунд — чтобы фильтры по датам было на чём гонять
+        played = (start + timedelta(seconds=40 * i)).isoformat(timespec="seconds")
+        yield dict(
+            h,
+            hand_id=hid,
+            datetime_utc=played,
+            collected_rows=[(hid, s, a) for _, s, a in h["collected_rows"]],
+        )
+
+
+def build_db(path: Path, n_hands: int) -> None:
+    cx = sqlite3.connect(path)
+    cx.executescript(SCHEMA_SQL)
+    with HandWriter(cx=cx, batch_size=5000, compute_stats=False) as w:
+        w.write_all(_synthetic_hands(n_hands))
+    cx.close()
+
+
+def _snapshot(path: Path) -> List[tuple]:
+    with sqlite3.connect(path) as cx:
+        rows = cx.execute("SELECT * FROM computed_stats ORDER BY hand_id").fetchall()
+        rows += cx.execute(
+            "SELECT hand_id, hero_collected, hero_rake, net_bb FROM hands ORDER BY hand_id"
+        ).fetchall()
+    return rows
+
+
+def run(sizes: List[int], workdir: Path) -> List[Dict[str, float]]:
+    results = []
+    for n in sizes:
+        src = workdir / f"bench_{n}.sqlite"
+        if not src.exists():
+            build_db(src, n)
+        row: Dict[str, float] = {"hands": n}
+        snaps = {}
+        for engine in ("loop", "numpy"):
+            db = workdir / f"bench_{n}_{engine}.sqlite"
+            shutil.copy(src, db)
+            t0 = time.perf_counter()
+            rebuild(full=True, engine=engine, db_path=db)
+            row[f"{engine}_sec"] = round(time.perf_counter() - t0, 2)
+            snaps[engine] = _snapshot(db)
+            db.unlink()
+        row["identical"] = snaps["loop"] == snaps["numpy"]
+        row["speedup"] = round(row["loop_sec"] / row["numpy_sec"], 1) if row["numpy_sec"] else 0.0
+        results.append(row)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="loop vs numpy движок rebuild_computed")
+    parser.add_argument("--hands", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--workdir", type=Path, default=None, help="куда класть базы")
+    args = parser.parse_args()
+
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="bbline_bench_"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    print(f"{'hands':>9} | {'loop, s':>8} | {'numpy, s':>8} | {'x':>5} | identical")
+    for r in run(args.hands, workdir):
+        print(
+            f"{r['hands']:>9} | {r['loop_sec']:>8} | {r['numpy_sec']:>8} | "
+            f"{r['speedup']:>5} | {r['identical']}"
+        )
@@ -0,0 +1,189 @@
+"""
+Импорт и дашборд одновременно: журнал DELETE + новое соединение на каждый
+запрос (как было) против WAL + общих соединений из database.connection.
+
+Запуск:
+    python -m bbline.bench.concurrent_load --hands 100000 --readers 2
+
+Сценарий для каждого режима:
+    ▪ база заранее наполнена первой половиной корпуса;
+    ▪ отдельный процесс дописывает вторую половину через HandWriter;
+    ▪ пока он пишет, readers потоков крутят get_dashboard_stats и
+      fetch_hands_page по FILTERS из dashboard_query (с паузой --think).
+
+Меряем латентность запросов читателей (p50 / p95 / max), сколько запросов
+упало с «database is locked» и скорость писателя (рук/с).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Dict, List
+
+from bbline.bench.dashboard_query import FILTERS
+from bbline.bench.hh_generator import corpus_path
+from bbline.bench.suite import BATCH_SIZE, _new_db
+
+MODES = ("legacy", "wal")
+THINK = 0.05  # сек между запросами читателя — UI не долбит базу в цикле
+LEGACY_TIMEOUT = 5.0  # таймаут sqlite3.connect по умолчанию — так UI открывал базу раньше
+
+
+def _writer_connection(db: Path, mode: str) -> sqlite3.Connection:
+    from bbline.database.connection import connect
+
+    if mode == "wal":
+        return connect(db)
+    cx = sqlite3.connect(db, timeout=30.0)
+    cx.execute("PRAGMA journal_mode = DELETE;")
+    return cx
+
+
+def _seed(corpus: Path, db: Path, mode: str, n: int) -> None:
+    from bbline.database.db_utils import HandWriter
+    from bbline.parse.hand_parser import iter_hands
+
+    _new_db(db)
+    cx = _writer_connection(db, mode)
+    with HandWriter(cx=cx, batch_size=BATCH_SIZE) as w:
+        w.write_all(islice(iter_hands(str(corpus)), n))
+    cx.close()
+
+
+def _write_rest(corpus: Path, db: Path, mode: str, skip: int) -> Dict[str, Any]:
+    """Процесс-писатель: вторая половина корпуса одной сессией HandWriter."""
+    from bbline.database.db_utils import HandWriter
+    from bbline.parse.hand_parser import iter_hands
+
+    hands = list(islice(iter_hands(str(corpus)), skip, None))
+    cx = _writer_connection(db, mode)
+    t0 = time.perf_counter()
+    with HandWriter(cx=cx, batch_size=BATCH_SIZE) as w:
+        w.write_all(hands)
+    seconds = time.perf_counter() - t0
+    cx.close()
+    return {
+        "hands": int(w.stats["inserted"]),
+        "seconds": round(seconds, 3),
+        "hands_per_sec": round(w.stats["inserted"] / seconds, 1) if seconds else None,
+        "failed": int(w.stats["failed"]),
+    }
+
+
+def _reader(stop: threading.Event, latencies: List[float], errors: List[str], think: float) -> None:
+    import bbline.dashboard_data as dd
+    import bbline.hands_table as ht
+
+    queries = [dd.get_dashboard_stats, ht.fetch_hands_page]
+    i = 0
+    while not stop.is_set():
+        fn, flt = queries[i % len(queries)], FILTERS[i // len(queries) % len(FILTERS)]
+        i += 1
+        t0 = time.perf_counter()
+        try:
+            fn(**flt)
+        except sqlite3.OperationalError as e:
+            errors.append(str(e))
+        else:
+            latencies.append(time.perf_counter() - t0)
+        stop.wait(think)
+
+
+def _patch_readers(db: Path, mode: str) -> None:
+    import bbline.dashboard_data as dd
+    import bbline.hands_table as ht
+    from bbline.database import connection
+
+    dd.DB_PATH = ht.DB_PATH = db
+    if mode == "legacy":
+        # как до database.connection: новое соединение на каждый запрос
+        def legacy(db_path=None, readonly=False):
+            return sqlite3.connect(db_path, timeout=LEGACY_TIMEOUT)
+
+        dd.get_connection = ht.get_connection = legacy
+    else:
+        dd.get_connection = ht.get_connection = connection.get_connection
+
+
+def _quantile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run_mode(
+    corpus: Path, db: Path, mode: str, n: int, readers: int, think: float = THINK
+) -> Dict[str, Any]:
+    half = n // 2
+    _seed(corpus, db, mode, half)
+    _patch_readers(db, mode)
+
+    stop = threading.Event()
+    latencies: List[float] = []
+    errors: List[str] = []
+    threads = [
+        threading.Thread(target=_reader, args=(stop, latencies, errors, think))
+        for _ in range(readers)
+    ]
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        future = pool.submit(_write_rest, corpus, db, mode, half)
+        for t in threads:
+            t.start()
+        writer = future.result()
+        stop.set()
+        for t in threads:
+            t.join()
+
+    return {
+        "mode": mode,
+        "readers": readers,
+        "think_ms": think * 1000,
+        "queries": len(latencies),
+        "locked_errors": sum("locked" in e for e in errors),
+        "other_errors": sum("locked" not in e for e in errors),
+        "read_p50_ms": round(_quantile(latencies, 0.50) * 1000, 2),
+        "read_p95_ms": round(_quantile(latencies, 0.95) * 1000, 2),
+        "read_max_ms": round(max(latencies, default=0.0) * 1000, 2),
+        "read_mean_ms": round(statistics.mean(latencies) * 1000, 2) if latencies else None,
+        "writer": writer,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="импорт + дашборд одновременно: DELETE vs WAL")
+    parser.add_argument("--hands", type=int, default=50_000)
+    parser.add_argument("--readers", type=int, default=2, help="потоков-читателей")
+    parser.add_argument(
+        "--think", type=float, default=THINK, help="пауза читателя между запросами, сек"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--workdir", type=Path, default=None)
+    args = parser.parse_args()
+
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="bbline_bench_"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    corpus = corpus_path(workdir, args.hands, args.seed)
+    report = []
+    for mode in args.modes:
+        db = workdir / f"concurrent_{mode}.sqlite"
+        res = run_mode(corpus, db, mode, args.hands, args.readers, args.think)
+        report.append(res)
+        print(
+            f"  {mode:<7} чтение p50 {res['read_p50_ms']:>8} мс · p95 {res['read_p95_ms']:>8} мс"
+            f" · locked {res['locked_errors']:>4} · запись {res['writer']['hands_per_sec']} рук/с",
+            file=sys.stderr,
+        )
+    print(json.dumps(report, ensure_ascii=False, indent=2))
@@ -0,0 +1,177 @@
+"""
+Дашборд: старый get_dashboard_stats (6 отдельных сканов) vs один проход
+dashboard_counters vs daily_rollup (текущий get_dashboard_stats).
+Сверяет результат на наборе фильтров и меряет время.
+
+Запуск:
+    python -m bbline.bench.dashboard_query --hands 500000
+"""
+
+from __future__ import annotations
+
+import argparse
+import sqlite3
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import bbline.dashboard_data as dd
+from bbline.analysis import rollup
+from bbline.analysis.rebuild_computed import rebuild
+from bbline.bench.computed_engines import build_db
+from bbline.utils import hand_filter_sql
+
+FILTERS: List[Dict[str, Any]] = [
+    {},
+    {"positions": ["BTN", "CO"]},
+    {"limits": [0.02]},
+    {"date_from": "2025-03-01", "date_to": "2025-04-30", "positions": ["BB"]},
+    {"date_from": "2025-01-01", "limits": [0.02, 0.05], "positions": ["SB", "EP", "MP"]},
+]
+
+
+def legacy_dashboard_stats(
+    db_path: Path,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    limits: Optional[List[float]] = None,
+    positions: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """Копия прежнего get_dashboard_stats: отдельный скан на каждую метрику."""
+    with sqlite3.connect(db_path) as cx:
+        cur = cx.cursor()
+        _fetch_one = dd._fetch_one
+        where, params = hand_filter_sql(date_from, date_to, limits, positions)
+        hands_cnt = int(_fetch_one(cur, f"SELECT COUNT(*) FROM hands h WHERE {where}", params))
+        if not hands_cnt:
+            return {k: 0 for k in dd._DASHBOARD_KEYS}
+
+        profit_usd = round(
+            _fetch_one(cur, f"SELECT SUM(h.hero_net) FROM hands h WHERE {where}", params), 2
+        )
+        profit_bb = round(
+            _fetch_one(cur, f"SELECT SUM(h.net_bb) FROM hands h WHERE {where}", params), 1
+        )
+        hero_rake_usd = round(
+            _fetch_one(cur, f"SELECT SUM(h.hero_rake) FROM hands h WHERE {where}", params), 2
+        )
+        tbb_per_100 = round((profit_bb / hands_cnt) * 100, 1)
+
+        vpip_pct, pfr_pct = cur.execute(
+            f"""
+            SELECT 100.0 * SUM(c.vpip) / COUNT(*),
+                   100.0 * SUM(c.pfr)  / COUNT(*)
+            FROM   computed_stats c
+            JOIN   hands h ON h.hand_id = c.hand_id
+            WHERE  {where};
+            """,
+            params,
+        ).fetchone()
+        vpip_pct = round(vpip_pct or 0.0)
+        pfr_pct = round(pfr_pct or 0.0)
+
+        wt_s_cnt, w_sd_cnt, wwsf_only_cnt = cur.execute(
+            f"""
+            SELECT SUM(c.wt_sd),
+                   SUM(c.w_sd),
+                   SUM(CASE WHEN c.wwsf=1 AND c.wt_sd=0 THEN 1 ELSE 0 END)
+            FROM   computed_stats c
+            JOIN   hands h ON h.hand_id = c.hand_id
+            WHERE  {where};
+            """,
+            params,
+        ).fetchone()
+        wt_s_cnt = int(wt_s_cnt or 0)
+        w_sd_cnt = int(w_sd_cnt or 0)
+        wws_only_cnt = int(wwsf_only_cnt or 0)
+
+        flop_cnt = int(
+            _fetch_one(
+                cur,
+                f"SELECT COUNT(*) FROM hands h WHERE {where} AND h.board IS NOT NULL AND h.board != ''",
+                params,
+            )
+        )
+
+        def pct(num: int, den: int) -> int:
+            return round((num / den) * 100) if den else 0
+
+        return {
+            "Hands": hands_cnt,
+            "Profit $": profit_usd,
+            "Profit bb": profit_bb,
+            "TBB/100": tbb_per_100,
+            "Hero Rake $": hero_rake_usd,
+            "VPIP": vpip_pct,
+            "PFR": pfr_pct,
+            "WtS": pct(wt_s_cnt, flop_cnt),
+            "WaS": pct(w_sd_cnt, wt_s_cnt) if wt_s_cnt else 0,
+            "WwS": pct(wws_only_cnt, flop_cnt),
+            "WWSF": pct(w_sd_cnt + wws_only_cnt, flop_cnt),
+        }
+
+
+def _best_of(fn, repeat: int) -> tuple[float, Any]:
+    times, result = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times), result
+
+
+def _scan_stats(db: Path, **flt: Any) -> Dict[str, Any]:
+    """Один проход hands × computed_stats без rollup."""
+    with sqlite3.connect(db) as cx:
+        where, params = hand_filter_sql(
+            flt.get("date_from"), flt.get("date_to"), flt.get("limits"), flt.get("positions")
+        )
+        return dd.stats_from_counters(dd.dashboard_counters(cx.cursor(), where, params))
+
+
+def run(db: Path, repeat: int = 3) -> List[Dict[str, Any]]:
+    dd.DB_PATH = db
+    with sqlite3.connect(db) as cx:  # rollup строится один раз, не в замере
+        rollup.rollup_counters(cx.cursor())
+    rows = []
+    for flt in FILTERS:
+        old_sec, old = _best_of(lambda: legacy_dashboard_stats(db, **flt), repeat)
+        scan_sec, scan = _best_of(lambda: _scan_stats(db, **flt), repeat)
+        new_sec, new = _best_of(lambda: dd.get_dashboard_stats(**flt), repeat)
+        rows.append(
+            {
+                "filters": flt or "—",
+                "hands": new["Hands"],
+                "legacy_sec": round(old_sec, 3),
+                "scan_sec": round(scan_sec, 3),
+                "rollup_sec": round(new_sec, 4),
+                "identical": old == scan == new,
+            }
+        )
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="дашборд: 6 сканов vs один проход")
+    parser.add_argument("--hands", type=int, default=500_000)
+    parser.add_argument("--workdir", type=Path, default=None, help="куда класть базу")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="bbline_bench_"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    db = workdir / f"dashboard_{args.hands}.sqlite"
+    if not db.exists():
+        build_db(db, args.hands)
+        rebuild(full=True, engine="numpy", db_path=db)
+
+    print(
+        f"{'hands':>8} | {'legacy, s':>9} | {'scan, s':>8} | {'rollup, s':>9} | identical | filters"
+    )
+    for r in run(db, args.repeat):
+        print(
+            f"{r['hands']:>8} | {r['legacy_sec']:>9} | {r['scan_sec']:>8} | {r['rollup_sec']:>9} | "
+            f"{str(r['identical']):>9} | {r['filters']}"
+        )
@@ -0,0 +1,385 @@
+"""
+Детерминированный генератор HH в формате GGPoker для бенчмарков.
+
+Запуск (записать корпус):
+    python -m bbline.bench.hh_generator out.txt --hands 100000 [--seed 0]
+
+▪ 2–9 игроков (6-max / 9-max столы), лимиты из utils.LIMITS;
+▪ все улицы, олл-ины с ранаутом, uncalled bet, шоудауны, сплит-поты;
+▪ один и тот же (hands, seed) → тот же текст, меньший корпус — префикс
+  большего (10k — первые 10k раздач корпуса на 100k);
+▪ олл-ин возможен только когда в банке остались двое — побочных банков
+  нет (их формат парсер пока не разбирает).
+
+Кто выиграл на шоудауне, решает генератор случайно, а не сила руки —
+для замеров скорости это неважно.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+from bbline.utils import LIMITS
+
+RANKS = "23456789TJQKA"
+SUITS = "shdc"
+DECK = [r + s for r in RANKS for s in SUITS]
+
+START = datetime(2025, 1, 1)
+FIRST_HAND_ID = 3_000_000_000
+
+# сколько игроков за столом — чаще полный 6-max, реже хедз-ап и 9-max
+_TABLE_SIZES = [2, 3, 4, 5, 6, 6, 6, 6, 7, 8, 9]
+_VILLAINS = 500  # пул оппонентов: одни и те же ники встречаются в разных раздачах
+_HAND_DESCS = [
+    "a pair of Aces",
+    "a pair of Fives",
+    "two pair, Queens and Sixes",
+    "three of a kind, Sevens",
+    "a straight, Ace to Five",
+    "a flush, King high",
+    "high card Ace",
+]
+_STREETS = ("PREFLOP", "FLOP", "TURN", "RIVER")
+
+
+def _money(cents: int) -> str:
+    # всегда два знака: парсер ждёт суммы вида \d+\.\d+
+    return f"${cents / 100:.2f}"
+
+
+def _stack(cents: int) -> str:
+    # стеки GG пишет без хвостовых нулей: $2.7, $2
+    return "$" + f"{cents / 100:.2f}".rstrip("0").rstrip(".")
+
+
+class _Hand:
+    """Состояние одной раздачи; суммы — в центах."""
+
+    def __init__(self, rng: random.Random, villains: List[str]):
+        self.rng = rng
+        self.bb = rng.choice([round(x * 100) for x in LIMITS])
+        self.sb = self.bb // 2
+        n = rng.choice(_TABLE_SIZES)
+        self.max_seats = 6 if n <= 6 else 9
+        seats = sorted(rng.sample(range(1, self.max_seats + 1), n))
+        names = ["Hero"] + rng.sample(villains, n - 1)
+        rng.shuffle(names)
+        self.players = [
+            {
+                "seat": s,
+                "name": name,
+                "stack": rng.randint(20, 150) * self.bb,
+                "street": 0,  # поставлено на текущей улице
+                "total": 0,  # поставлено за раздачу
+                "folded": None,  # улица, на которой сбросил
+                "allin": False,
+                "acted": False,
+            }
+            for s, name in zip(seats, names)
+        ]
+        self.button = rng.randrange(n)
+        deck = DECK[:]
+        rng.shuffle(deck)
+        for i, p in enumerate(self.players):
+            p["cards"] = deck[2 * i : 2 * i + 2]
+        self.board_cards = deck[2 * n : 2 * n + 5]
+        self.lines: List[str] = []
+        self.current_bet = 0
+        self.min_raise = self.bb
+
+    # ------------------------------------------------------------ helpers
+    def _order_from(self, start: int) -> List[dict]:
+        n = len(self.players)
+        return [self.players[(start + k) % n] for k in range(n)]
+
+    def _live(self) -> List[dict]:
+        return [p for p in self.players if p["folded"] is None]
+
+    def _can_act(self) -> List[dict]:
+        return [p for p in self._live() if not p["allin"]]
+
+    def _put(self, p: dict, amount: int) -> None:
+        p["stack"] -= amount
+        p["street"] += amount
+        p["total"] += amount
+        if p["stack"] == 0:
+            p["allin"] = True
+
+    def _pot(self) -> int:
+        return sum(p["total"] for p in self.players)
+
+    # ------------------------------------------------------------ betting
+    def _post_blinds(self) -> List[dict]:
+        """Блайнды; возвращает порядок хода на префлопе."""
+        n = len(self.players)
+        if n == 2:  # хедз-ап: баттон — малый блайнд и ходит первым
+            sb_i, bb_i, first = self.button, (self.button + 1) % n, self.button
+        else:
+            sb_i, bb_i = (self.button + 1) % n, (self.button + 2) % n
+            first = (self.button + 3) % n
+        self.sb_i, self.bb_i = sb_i, bb_i
+        for i, kind, amt in ((sb_i, "small", self.sb), (bb_i, "big", self.bb)):
+            p = self.players[i]
+            self._put(p, amt)
+            self.lines.append(f"{p['name']}: posts {kind} blind {_money(amt)}")
+        self.current_bet = self.bb
+        return self._order_from(first)
+
+    def _raise_cap(self, p: dict) -> int:
+        """
+        Максимум «raise to» для p. В мультипоте — так, чтобы любой мог
+        уравнять без олл-ина (побочных банков не бывает); в хедз-апе — весь стек.
+        """
+        own = p["street"] + p["stack"]
+        if len(self._live()) <= 2:
+            return own
+        others = [q["street"] + q["stack"] for q in self._live() if q is not p]
+        return min([own] + others) - 1
+
+    def _act(self, p: dict, street: str) -> bool:
+        """Ход игрока; True — была ставка/рейз (остальные ходят снова)."""
+        rng = self.rng
+        to_call = self.current_bet - p["street"]
+        pot = self._pot()
+        cap = self._raise_cap(p)
+        heads_up = len(self._live()) == 2
+        suffix = ""
+
+        if heads_up and rng.random() < 0.02:
+            target = p["street"] + p["stack"]  # пуш
+        elif to_call == 0:
+            if rng.random() < (0.3 if street != "PREFLOP" else 0.15):
+                target = self.current_bet + max(self.bb, int(pot * rng.uniform(0.33, 1.0)))
+            else:
+                self.lines.append(f"{p['name']}: checks")
+                return False
+        else:
+            r = rng.random()
+            if r < 0.45:
+                p["folded"] = street
+                self.lines.append(f"{p['name']}: folds")
+                return False
+            if r < 0.85 or cap <= self.current_bet:
+                amount = min(to_call, p["stack"])
+                if amount < to_call and not heads_up:  # без побочных банков
+                    p["folded"] = street
+                    self.lines.append(f"{p['name']}: folds")
+                    return False
+                self._put(p, amount)
+                if p["allin"]:
+                    suffix = " and is all-in"
+                self.lines.append(f"{p['name']}: calls {_money(amount)}{suffix}")
+                return False
+            target = self.current_bet + max(
+                self.min_raise, int(self.current_bet * rng.uniform(1.0, 2.5))
+            )
+
+        target = min(target, cap)
+        if target <= self.current_bet:  # поднять нельзя — просто уравниваем / чекаем
+            if to_call == 0:
+                self.lines.append(f"{p['name']}: checks")
+                return False
+            amount = min(to_call, p["stack"])
+            self._put(p, amount)
+            if p["allin"]:
+                suffix = " and is all-in"
+            self.lines.append(f"{p['name']}: calls {_money(amount)}{suffix}")
+            return False
+
+        prev_bet = self.current_bet
+        self._put(p, target - p["street"])
+        if p["allin"]:
+            suffix = " and is all-in"
+        if prev_bet == 0:
+            self.lines.append(f"{p['name']}: bets {_money(target)}{suffix}")
+        else:
+            self.lines.append(
+                f"{p['name']}: raises {_money(target - prev_bet)} to {_money(target)}{suffix}"
+            )
+        self.min_raise = max(self.min_raise, target - prev_bet)
+        self.current_bet = target
+        return True
+
+    def _betting_round(self, order: List[dict], street: str) -> None:
+        pending = [p for p in order if p["folded"] is None and not p["allin"]]
+        while pending and len(self._live()) > 1:
+            p = pending.pop(0)
+            if p["folded"] is not None or p["allin"]:
+                continue
+            # все остальные в олл-ине и ставка уравнена — ходить незачем
+            if len(self._can_act()) == 1 and p["street"] >= self.current_bet:
+                break
+            if self._act(p, street):
+                i = order.index(p)
+                pending = [
+                    q for q in order[i + 1 :] + order[:i] if q["folded"] is None and not q["allin"]
+                ]
+        self._return_uncalled()
+
+    def _return_uncalled(self) -> None:
+        top = max(self.players, key=lambda q: q["street"])
+        second = max((q["street"] for q in self.players if q is not top), default=0)
+        if top["street"] > second:
+            back = top["street"] - second
+            top["stack"] += back
+            top["street"] -= back
+            top["total"] -= back
+            top["allin"] = top["stack"] == 0
+            self.lines.append(f"Uncalled bet ({_money(back)}) returned to {top['name']}")
+
+    def _new_street(self) -> None:
+        for p in self.players:
+            p["street"] = 0
+        self.current_bet = 0
+        self.min_raise = self.bb
+
+    def _street_line(self, street: str) -> str:
+        b = self.board_cards
+        if street == "FLOP":
+            return f"*** FLOP *** [{' '.join(b[:3])}]"
+        if street == "TURN":
+            return f"*** TURN *** [{' '.join(b[:3])}] [{b[3]}]"
+        return f"*** RIVER *** [{' '.join(b[:4])}] [{b[4]}]"
+
+    # ------------------------------------------------------------- output
+    def render(self, hand_id: int, played: datetime) -> str:
+        lines = self.lines
+        stakes = f"({_money(self.sb)}/{_money(self.bb)})"
+        lines.append(
+            f"Poker Hand #HD{hand_id}: Hold'em No Limit {stakes} - " f"{played:%Y/%m/%d %H:%M:%S}"
+        )
+        lines.append(
+            f"Table 'NLHBench{hand_id % 97}' {self.max_seats}-max "
+            f"Seat #{self.players[self.button]['seat']} is the button"
+        )
+        for p in self.players:
+            lines.append(f"Seat {p['seat']}: {p['name']} ({_stack(p['stack'])} in chips)")
+
+        order = self._post_blinds()
+        lines.append("*** HOLE CARDS ***")
+        for p in self.players:
+            cards = f"[{' '.join(p['cards'])}]" if p["name"] == "Hero" else ""
+            lines.append(f"Dealt to {p['name']} {cards}")
+
+        shown = False
+        board_streets = 0
+        postflop_order = self._order_from((self.button + 1) % len(self.players))
+        if len(self.players) == 2:  # хедз-ап: после флопа первым ходит BB
+            postflop_order = self._order_from(self.bb_i)
+        for street in _STREETS:
+            if street != "PREFLOP":
+                self._new_street()
+                board_streets += 1
+                lines.append(self._street_line(street))
+            if len(self._live()) == 1:
+                break
+            if not shown:
+                self._betting_round(order if street == "PREFLOP" else postflop_order, street)
+            if len(self._live()) == 1:
+                break
+            if not shown and len(self._can_act()) <= 1:
+                # олл-ин: карты открываются сразу, дальше ранаут без действий
+                self._show()
+                shown = True
+        if len(self._live()) > 1 and not shown:
+            self._show()
+
+        pot = self._pot()
+        saw_flop = board_streets > 0
+        rake = pot * 5 // 100 if saw_flop else 0  # no flop — no drop
+        jackpot = self.bb if saw_flop and pot >= 40 * self.bb else 0
+        net = pot - rake - jackpot
+        live = self._live()
+        if len(live) == 1:
+            winners = {live[0]["name"]: net}
+        elif self.rng.random() < 0.1:  # сплит
+            a, b = self.rng.sample(live, 2)
+            winners = {a["name"]: net - net // 2, b["name"]: net // 2}
+        else:
+            winners = {self.rng.choice(live)["name"]: net}
+
+        lines.append("*** SHOWDOWN ***")
+        for name, amt in winners.items():
+            lines.append(f"{name} collected {_money(amt)} from pot")
+        lines.append("*** SUMMARY ***")
+        lines.append(
+            f"Total pot {_money(pot)} | Rake {_money(rake)} | Jackpot {_money(jackpot)} | "
+            "Bingo $0 | Fortune $0 | Tax $0"
+        )
+        if board_streets:
+            lines.append(f"Board [{' '.join(self.board_cards[: board_streets + 2])}]")
+        for p in self.players:
+            lines.append(self._summary_line(p, winners, shown or len(live) > 1))
+        return "\n".join(lines)
+
+    def _show(self) -> None:
+        for p in self._live():
+            desc = self.rng.choice(_HAND_DESCS)
+            self.lines.append(f"{p['name']}: shows [{' '.join(p['cards'])}] ({desc})")
+            p["desc"] = desc
+
+    def _summary_line(self, p: dict, winners: Dict[str, int], showdown: bool) -> str:
+        i = self.players.index(p)
+        label = ""
+        if i == self.button:
+            label = " (button)"
+        elif i == self.sb_i:
+            label = " (small blind)"
+        elif i == self.bb_i:
+            label = " (big blind)"
+        head = f"Seat {p['seat']}: {p['name']}{label}"
+        won = winners.get(p["name"])
+        if p["folded"] is not None:
+            if p["folded"] == "PREFLOP":
+                return f"{head} folded before Flop" + (" (didn't bet)" if not p["total"] else "")
+            return f"{head} folded on the {p['folded'].capitalize()}"
+        if showdown:
+            cards = " ".join(p["cards"])
+            if won is not None:
+                return f"{head} showed [{cards}] and won ({_money(won)}) with {p['desc']}"
+            return f"{head} showed [{cards}] and lost with {p['desc']}"
+        return f"{head} won ({_money(won or 0)})"
+
+
+def generate_hands(n: int, seed: int = 0) -> Iterator[str]:
+    """n сырых раздач подряд (текст одной раздачи, без пустых строк между ними)."""
+    rng = random.Random(seed)
+    villains = [f"{rng.getrandbits(32):08x}" for _ in range(_VILLAINS)]
+    played = START
+    for i in range(n):
+        played += timedelta(seconds=rng.randint(20, 90))
+        # у каждого seed свой диапазон hand_id — корпуса можно импортировать в одну базу
+        yield _Hand(rng, villains).render(FIRST_HAND_ID + seed * 100_000_000 + i, played)
+
+
+def write_corpus(path: Path, n: int, seed: int = 0) -> Path:
+    """Пишет корпус в файл в том же виде, что выгрузка GG (раздачи через две пустые строки)."""
+    path = Path(path)
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        for raw in generate_hands(n, seed):
+            f.write(raw)
+            f.write("\n\n\n")
+    return path
+
+
+def corpus_path(workdir: Path, n: int, seed: int = 0) -> Path:
+    """Корпус из workdir, если он уже сгенерирован, иначе — генерирует."""
+    path = Path(workdir) / f"hh_{n}_{seed}.txt"
+    if not path.exists():
+        write_corpus(path, n, seed)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="синтетические HH в формате GGPoker")
+    parser.add_argument("out", type=Path, help="куда писать .txt")
+    parser.add_argument("--hands", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_corpus(args.out, args.hands, args.seed)
+    print(f"✅  {args.hands} раздач → {args.out}")
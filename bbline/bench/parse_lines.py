@@ -0,0 +1,331 @@
+"""
+Парсер: parse_hand с однопроходным классификатором строк vs прежний
+(отдельный проход на баттон / места / карты Hero / Total pot и все
+regex подряд на каждой строке). Сверяет результат раздача-в-раздачу и
+меряет время на раздачу.
+
+Запуск:
+    python -m bbline.bench.parse_lines --copies 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+import statistics
+import time
+from typing import Any, Callable, Dict, List
+
+from bbline.bench.computed_engines import SAMPLE
+from bbline.parse.hand_parser import (
+    RE_COLLECTED,
+    RE_DEALT_HERO,
+    RE_HAND_START,
+    RE_POST_BLIND,
+    RE_SEAT_COLLECTED,
+    RE_SEAT_WON,
+    RE_SHOWS_COLLECTED,
+    RE_STREET_BOARD,
+    RE_TABLE_BUTTON,
+    RE_TOTAL_POT,
+    RE_UNCALLED,
+    RE_WON,
+    _hand_side_pots,
+    calculate_invested_voluntarily,
+    calculate_total_actual_investment,
+    hero_combo,
+    iter_raw_hands,
+    normalize_player_name,
+    parse_actions,
+    parse_hand,
+    parse_seat_block,
+    position_from_seats,
+    utc_iso,
+)
+
+
+def legacy_parse_hand(raw: str) -> dict:
+    """
+    parse_hand до однопроходного классификатора строк. Поля, которые парсер
+    получил позже (стеки и олл-ины в actions, side_pots, hero_combo), досчитываются теми же
+    хелперами — иначе сверка расходилась бы на каждой раздаче.
+    """
+    hero_uncalled = 0.0
+    hero_collected = 0.0
+    winners_total = 0.0
+    winners_rows = []
+    collected_set_total = set()  # пары (player, amount)
+    collected_set_hero = set()  # чтобы дважды не добавить героя
+    lines = [ln.rstrip() for ln in raw.splitlines() if ln.strip()]
+
+    m_header = RE_HAND_START.match(lines[0])
+    if not m_header:
+        raise ValueError("Ошибка: некорректный заголовок истории раздачи.")
+    hand_id = m_header.group("hand_id")
+    bb = float(m_header.group("bb"))
+    date_iso = utc_iso(m_header.group("date"), m_header.group("time"))
+
+    m_btn_info = next((RE_TABLE_BUTTON.match(ln) for ln in lines if "button" in ln.lower()), None)
+    button_seat = int(m_btn_info.group("button")) if m_btn_info else -1
+
+    first_action_or_cards_idx = next(
+        (i for i, ln in enumerate(lines) if RE_POST_BLIND.match(ln) or "*** HOLE CARDS ***" in ln),
+        len(lines),
+    )
+    seat_block_lines = lines[2:first_action_or_cards_idx]
+    seat_map_name_to_num, seats_info, seat_map_num_to_name = parse_seat_block(seat_block_lines)
+
+    hero_player_key: str | None = None
+    hero_seat = -1
+    for s_entry in seats_info:
+        if s_entry["player_id"] == "Hero":
+            hero_player_key = "Hero"
+            hero_seat = s_entry["seat_no"]
+            break
+    if hero_player_key is None:
+        hero_player_key = "Hero"
+
+    hero_cards_str: str | None = None
+    for ln in lines:
+        m_hero_cards = RE_DEALT_HERO.match(ln)
+        if m_hero_cards:
+            hero_cards_str = m_hero_cards.group("card1") + m_hero_cards.group("card2")
+            break
+
+    all_actions: List[Dict[str, Any]] = []
+    showdown_entries: List[Dict[str, Any]] = []
+    board_cards_by_street: Dict[str, List[str]] = {"FLOP": [], "TURN": [], "RIVER": []}
+    current_street_state = "PREFLOP"
+    action_order_no = 0
+    current_street_lines: List[str] = []
+    stacks = {s_entry["seat_no"]: s_entry["chips"] for s_entry in seats_info}
+    # несколлированная ставка возвращается в стек после разбора действий улицы
+    uncalled_by_seat: Dict[int, float] = {}
+
+    RE_SHOWDOWN_LINE = re.compile(
+        r"(?:Seat\s+(?P<seat>\d+):\s+)?(?P<player>\S+).*?show(?:ed|s)\s+\[(?P<card1>\w{2})\s+(?P<card2>\w{2})\]"
+    )
+
+    for line_idx, ln in enumerate(lines):
+        if ln.startswith("***") and "HOLE CARDS" not in ln:
+            if current_street_lines:
+                acts, action_order_no = parse_actions(
+                    current_street_lines,
+                    seat_map_name_to_num,
+                    current_street_state,
+                    action_order_no,
+                    stacks,
+                )
+                all_actions.extend(acts)
+                current_street_lines = []
+
+            m_board_line = RE_STREET_BOARD.match(ln)
+            if m_board_line:
+                current_street_state = m_board_line.group("street")
+                parsed_cards = m_board_line.group("cards").split()
+                board_cards_by_street[current_street_state] = parsed_cards
+                if m_board_line.group("turnriver"):
+                    board_cards_by_street[current_street_state].append(
+                        m_board_line.group("turnriver")
+                    )
+                continue
+
+        current_street_lines.append(ln)
+
+        m_uncalled_bet = RE_UNCALLED.match(ln)
+        if m_uncalled_bet:
+            uncalled_player = normalize_player_name(m_uncalled_bet.group("player"))
+            uncalled_seat = seat_map_name_to_num.get(uncalled_player, -1)
+            if uncalled_seat in stacks:
+                amt = float(m_uncalled_bet.group("amt"))
+                uncalled_by_seat[uncalled_seat] = uncalled_by_seat.get(uncalled_seat, 0.0) + amt
+        if (
+            m_uncalled_bet
+            and normalize_player_name(m_uncalled_bet.group("player")) == hero_player_key
+        ):
+            hero_uncalled += float(m_uncalled_bet.group("amt"))
+
+        m_showdown = RE_SHOWDOWN_LINE.search(ln)
+        if m_showdown:
+            player_name = normalize_player_name(m_showdown.group("player"))
+            shown_cards = m_showdown.group("card1") + m_showdown.group("card2")
+            player_seat = seat_map_name_to_num.get(player_name, -1)
+            if player_seat == -1 and m_showdown.group("seat"):
+                try:
+                    player_seat = int(m_showdown.group("seat"))
+                except ValueError:
+                    player_seat = -1
+            if player_seat != -1 and not any(
+                s_entry["seat_no"] == player_seat for s_entry in showdown_entries
+            ):
+                showdown_entries.append({"seat_no": player_seat, "cards": shown_cards, "won": None})
+            elif player_seat == -1:
+                print(
+                    f"[ПРЕДУПРЕЖДЕНИЕ] Шоудаун: не найден seat_no для игрока '{player_name}' (исходное: '{m_showdown.group('player')}') в раздаче {hand_id}."
+                )
+
+        m_collected_pot = RE_COLLECTED.match(ln)
+        m_won_pot = RE_WON.match(ln)
+        m_shows_collected = RE_SHOWS_COLLECTED.match(ln)
+        m_seat_collected = RE_SEAT_COLLECTED.match(ln)
+        m_seat_won = RE_SEAT_WON.match(ln)
+        collected_amount = None
+        winner_name = None
+
+        if m_collected_pot:
+            winner_name = normalize_player_name(m_collected_pot.group("player"))
+            collected_amount = float(m_collected_pot.group("amt"))
+        elif m_won_pot:
+            winner_name = normalize_player_name(m_won_pot.group("player"))
+            collected_amount = float(m_won_pot.group("amt"))
+        elif m_shows_collected:
+            winner_name = hero_player_key
+            collected_amount = float(m_shows_collected.group("amt"))
+        elif m_seat_collected:
+            winner_name = normalize_player_name(m_seat_collected.group("player"))
+            collected_amount = float(m_seat_collected.group("amt"))
+        elif m_seat_won:
+            winner_name = normalize_player_name(m_seat_won.group("player"))
+            collected_amount = float(m_seat_won.group("amt"))
+        else:
+            collected_amount = None
+
+        if collected_amount is not None:
+            key = (winner_name, collected_amount)
+            if key in collected_set_total:
+                continue
+            collected_set_total.add(key)
+            winners_total += collected_amount
+            seat_no = seat_map_name_to_num.get(winner_name, -1)
+            if seat_no != -1:
+                winners_rows.append((hand_id, seat_no, collected_amount))
+
+            if winner_name == hero_player_key and key not in collected_set_hero:
+                hero_collected += collected_amount
+                collected_set_hero.add(key)
+
+    if current_street_lines:
+        acts, _ = parse_actions(
+            current_street_lines,
+            seat_map_name_to_num,
+            current_street_state,
+            action_order_no,
+            stacks,
+        )
+        all_actions.extend(acts)
+    for seat_no, amount in uncalled_by_seat.items():
+        stacks[seat_no] += amount
+
+    total_pot_val, rake_val, jackpot_val = None, 0.0, 0.0
+    for ln in lines:
+        m_total_pot_info = RE_TOTAL_POT.search(ln)
+        if m_total_pot_info:
+            total_pot_val = float(m_total_pot_info.group("total"))
+            rake_val = float(m_total_pot_info.group("rake"))
+            if m_total_pot_info.group("jackpot"):
+                jackpot_val = float(m_total_pot_info.group("jackpot"))
+            break
+
+    flop_str = "".join(board_cards_by_street["FLOP"])
+    turn_cards = board_cards_by_street["TURN"]
+    river_cards = board_cards_by_street["RIVER"]
+
+    turn_card_str = ""
+    if len(turn_cards) > len(board_cards_by_street["FLOP"]):
+        turn_card_str = turn_cards[-1]
+
+    river_card_str = ""
+    if len(river_cards) > len(turn_cards):
+        river_card_str = river_cards[-1]
+    elif not turn_card_str and len(river_cards) > len(board_cards_by_street["FLOP"]):
+        river_card_str = river_cards[-1]
+
+    board_string_representation = "|".join(filter(None, [flop_str, turn_card_str, river_card_str]))
+
+    # 1. Добровольно вложенное (без блайндов)
+    total_voluntary_sum_by_hero = calculate_invested_voluntarily(all_actions, hero_seat)
+    hero_invested_display_value = round(total_voluntary_sum_by_hero - hero_uncalled, 2)
+    # 2. Фактически вложено Hero (с учётом блайндов)
+    hero_total_investment = calculate_total_actual_investment(all_actions, hero_seat)
+    actual_hero_cost_for_hand = round(hero_total_investment - hero_uncalled, 2)
+    # 3. Profit
+    profit_for_hero = round(hero_collected - actual_hero_cost_for_hand, 2)
+    # ------- HERO RAKE (доля от общего рейка) -------
+    if winners_total > 0:
+        hero_rake = round(rake_val * (hero_collected / winners_total), 4)
+    else:
+        hero_rake = 0.0
+
+    hand_data_dict = {
+        "hand_id": hand_id,
+        "site": "ggpoker",
+        "game_type": "NLHE",
+        "limit_bb": bb,
+        "datetime_utc": date_iso,
+        "button_seat": button_seat,
+        "hero_seat": hero_seat,
+        "hero_position": position_from_seats(
+            hero_seat, button_seat, (s_entry["seat_no"] for s_entry in seats_info)
+        ),
+        "hero_name": hero_player_key,
+        "hero_cards": hero_cards_str,
+        "hero_combo": hero_combo(hero_cards_str),
+        "board": board_string_representation,
+        "hero_invested": hero_invested_display_value,
+        "hero_collected": hero_collected,
+        "hero_rake": hero_rake,
+        "rake": rake_val,
+        "jackpot": jackpot_val,
+        "final_pot": total_pot_val,
+        "hero_net": profit_for_hero,  # Чистый профит Hero (рассчитан от ПОЛНЫХ затрат, для bb/100)
+        "hero_showdown": int(any(s_entry["seat_no"] == hero_seat for s_entry in showdown_entries)),
+        "seats": seats_info,
+        "actions": all_actions,
+        "showdowns": showdown_entries,
+        "collected_rows": winners_rows,
+        "side_pots": _hand_side_pots(seats_info, stacks, all_actions),
+    }
+    return hand_data_dict
+
+
+def _per_hand_us(fn: Callable[[str], dict], raws: List[str], repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for raw in raws:
+            fn(raw)
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times) / len(raws) * 1e6
+
+
+def run(copies: int = 200, repeat: int = 3) -> Dict[str, Any]:
+    with open(SAMPLE, encoding="utf-8") as f:
+        corpus = list(iter_raw_hands(f))
+    mismatched = [
+        raw.splitlines()[0] for raw in corpus if parse_hand(raw) != legacy_parse_hand(raw)
+    ]
+    raws = corpus * copies
+    old_us = _per_hand_us(legacy_parse_hand, raws, repeat)
+    new_us = _per_hand_us(parse_hand, raws, repeat)
+    return {
+        "hands": len(raws),
+        "legacy_us": round(old_us, 1),
+        "new_us": round(new_us, 1),
+        "speedup": round(old_us / new_us, 2),
+        "identical": not mismatched,
+        "mismatched": mismatched,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="parse_hand: прежний vs однопроходный")
+    parser.add_argument("--copies", type=int, default=200, help="сколько раз прогнать корпус")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    r = run(args.copies, args.repeat)
+    print(f"раздач: {r['hands']} | identical: {r['identical']}")
+    print(f"прежний:      {r['legacy_us']:>7} мкс/раздача")
+    print(f"однопроходный: {r['new_us']:>6} мкс/раздача  (x{r['speedup']})")
+    for header in r["mismatched"]:
+        print(f"  [расходится] {header}")
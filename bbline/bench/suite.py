@@ -0,0 +1,228 @@
+"""
+Сквозной бенчмарк пайплайна на синтетическом корпусе (hh_generator).
+
+Запуск:
+    python -m bbline.bench.suite --hands 10000 100000 1000000 --out bench.json
+
+Для каждого размера:
+    parse        — iter_hands по файлу корпуса;
+    insert_batch — HandWriter (как batch_import), скорость записи без парсинга;
+    insert_one   — insert_hand по одной руке (первые INSERT_ONE_CAP рук);
+    rebuild      — полный rebuild_computed движком numpy;
+    dashboard    — get_dashboard_stats / get_profit_by_date / страница таблицы рук
+                   по FILTERS из dashboard_query.
+
+Каждая стадия идёт в отдельном процессе, поэтому peak_rss_mb — пик памяти
+именно этой стадии. Результат — JSON (в --out или в stdout), чтобы прогоны
+можно было сравнивать между версиями.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from bbline.bench.computed_engines import _schema_sql
+from bbline.bench.hh_generator import corpus_path
+
+INSERT_ONE_CAP = 5_000
+BATCH_SIZE = 2_000
+NEEDS_DB = ("rebuild", "dashboard")  # работают по базе, которую собрала insert_batch
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """Пик RSS текущего процесса; None, если платформа не умеет (Windows без resource)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS — байты
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+def _new_db(path: Path) -> Path:
+    path.unlink(missing_ok=True)
+    with sqlite3.connect(path) as cx:
+        cx.executescript(_schema_sql())
+    return path
+
+
+def _result(hands: int, seconds: float, **extra: Any) -> Dict[str, Any]:
+    return {
+        "hands": hands,
+        "seconds": round(seconds, 3),
+        "hands_per_sec": round(hands / seconds, 1) if seconds else None,
+        **extra,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+# ------------------------------------------------------------------ стадии
+def stage_parse(corpus: Path, db: Path) -> Dict[str, Any]:
+    from bbline.parse.hand_parser import iter_hands
+
+    t0 = time.perf_counter()
+    n = sum(1 for _ in iter_hands(str(corpus)))
+    return _result(n, time.perf_counter() - t0)
+
+
+def stage_insert_batch(corpus: Path, db: Path) -> Dict[str, Any]:
+    from bbline.database.db_utils import HandWriter
+    from bbline.parse.hand_parser import iter_hands
+
+    _new_db(db)
+    t0 = time.perf_counter()
+    with HandWriter(db, batch_size=BATCH_SIZE) as w:
+        w.write_all(iter_hands(str(corpus)))
+    wall = time.perf_counter() - t0
+    # скорость считаем по времени записи, парсинг меряет stage_parse
+    return _result(
+        int(w.stats["inserted"]),
+        w.stats["elapsed"],
+        wall_seconds=round(wall, 3),
+        failed=int(w.stats["failed"]),
+    )
+
+
+def stage_insert_one(corpus: Path, db: Path) -> Dict[str, Any]:
+    from itertools import islice
+
+    from bbline.database.db_utils import insert_hand
+    from bbline.parse.hand_parser import iter_hands
+
+    one_db = _new_db(db.with_name(db.stem + "_one.sqlite"))
+    hands = list(islice(iter_hands(str(corpus)), INSERT_ONE_CAP))
+    t0 = time.perf_counter()
+    with sqlite3.connect(one_db) as cx:
+        for h in hands:
+            insert_hand(h, cx)
+            cx.commit()  # как при ручном импорте: коммит на каждую руку
+    seconds = time.perf_counter() - t0
+    one_db.unlink()
+    return _result(len(hands), seconds)
+
+
+def stage_rebuild(corpus: Path, db: Path) -> Dict[str, Any]:
+    from bbline.analysis.rebuild_computed import rebuild
+
+    with sqlite3.connect(db) as cx:
+        n = cx.execute("SELECT COUNT(*) FROM hands").fetchone()[0]
+    t0 = time.perf_counter()
+    rebuild(full=True, engine="numpy", db_path=db)
+    return _result(n, time.perf_counter() - t0, engine="numpy")
+
+
+def stage_dashboard(corpus: Path, db: Path, repeat: int = 3) -> Dict[str, Any]:
+    import bbline.dashboard_data as dd
+    import bbline.hands_table as ht
+    from bbline.bench.dashboard_query import FILTERS, _best_of
+
+    dd.DB_PATH = ht.DB_PATH = db
+    with sqlite3.connect(db) as cx:
+        n = cx.execute("SELECT COUNT(*) FROM hands").fetchone()[0]
+    queries: Dict[str, Callable[..., Any]] = {
+        "dashboard_stats": dd.get_dashboard_stats,
+        "profit_by_date": dd.get_profit_by_date,
+        "hands_count": ht.count_hands,
+        "hands_page": ht.fetch_hands_page,
+    }
+    timings: Dict[str, float] = {}
+    for name, fn in queries.items():
+        per_filter = [_best_of(lambda: fn(**flt), repeat)[0] for flt in FILTERS]
+        timings[f"{name}_ms"] = round(statistics.mean(per_filter) * 1000, 2)
+    res = _result(n, sum(timings.values()) / 1000, filters=len(FILTERS), **timings)
+    res["hands_per_sec"] = None  # здесь важна латентность запросов, а не поток рук
+    return res
+
+
+STAGES: Dict[str, Callable[..., Dict[str, Any]]] = {
+    "parse": stage_parse,
+    "insert_batch": stage_insert_batch,
+    "insert_one": stage_insert_one,
+    "rebuild": stage_rebuild,
+    "dashboard": stage_dashboard,
+}
+
+
+def _in_child(fn: Callable[..., Dict[str, Any]], *args: Any) -> Dict[str, Any]:
+    # свежий процесс на стадию: иначе ru_maxrss — пик за весь прогон
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(fn, *args).result()
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=Path(__file__).resolve().parent,
+        )
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+def run(
+    sizes: List[int], workdir: Path, seed: int = 0, stages: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    stages = stages or list(STAGES)
+    results: List[Dict[str, Any]] = []
+    for n in sizes:
+        t0 = time.perf_counter()
+        corpus = corpus_path(workdir, n, seed)
+        results.append(
+            {"size": n, "stage": "generate", "seconds": round(time.perf_counter() - t0, 3)}
+        )
+        db = workdir / f"suite_{n}_{seed}.sqlite"
+        for name in stages:
+            if name in NEEDS_DB and not db.exists():
+                raise FileNotFoundError(f"Нет базы {db} — стадия {name} идёт после insert_batch")
+            res = _in_child(STAGES[name], corpus, db)
+            results.append({"size": n, "stage": name, **res})
+            print(f"  {n:>8} {name:<13} {res['hands_per_sec'] or '—':>12} рук/с", file=sys.stderr)
+    return {
+        "meta": {
+            "started": datetime.now().isoformat(timespec="seconds"),
+            "git": _git_rev(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "seed": seed,
+            "batch_size": BATCH_SIZE,
+        },
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="сквозной бенчмарк на синтетических HH")
+    parser.add_argument("--hands", type=int, nargs="+", default=[10_000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=None)
+    parser.add_argument("--workdir", type=Path, default=None, help="куда класть корпуса и базы")
+    parser.add_argument("--out", type=Path, default=None, help="JSON с результатом")
+    args = parser.parse_args()
+
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="bbline_bench_"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    report = run(args.hands, workdir, args.seed, args.stages)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        args.out.write_text(text, encoding="utf-8")
+        print(f"✅  {args.out}", file=sys.stderr)
+    else:
+        print(text)
@@ -19,16 +19,20 @@
     stats = get_dashboard_stats(date_from="2025-01-01", positions=["BTN","CO"])
     graph  = get_profit_by_date(date_from="2025-01-01")
 
-Если база лежит не рядом — поправь DB_PATH.
+База (или шарды) — из реестра: database/registry.py, BBLINE_DB / --db.
 """
 
 from __future__ import annotations
 
 import sqlite3
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Sequence, Tuple, Literal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from bbline.analysis.combo_rollup import combo_counters, grid_labels
 from bbline.analysis.leakfinder import run_leakfinder
-from .utils import DB_PATH, get_hand_ids
+from bbline.analysis.rollup import profit_by_day, rollup_counters
+from bbline.database.connection import get_connection
+from bbline.parse.hand_parser import COMBO_RANKS
+from .utils import DB_PATH, hand_filter_sql
 import pandas as pd
 
 # Константы для позиций
@@ -42,20 +46,6 @@ LIMITS = [0.02, 0.05, 0.10, 0.25, 0.50, 1.00]
 # ---------------------------------------------------------------------------
 
 
-def _pos_from_seats(hero: int, btn: int) -> Literal["BB", "SB", "BTN", "CO", "MP", "EP"]:
-    """Mapping seat → позиция (6‑max).
-    offset = (hero – btn) mod 6
-        0  BTN
-        1  SB
-        2  BB
-        3  UTG
-        4  MP
-        5  CO
-    """
-    offset = (hero - btn) % 6
-    return POSITIONS[offset]
-
-
 def _fetch_one(cur: sqlite3.Cursor, query: str, params: Sequence[Any] | None = None) -> float:
     """Выполняет SQL-запрос и возвращает одно значение с проверкой на None."""
     val = cur.execute(query, params or ()).fetchone()[0]
@@ -98,117 +88,114 @@ def get_saw_flop_ids(cur: sqlite3.Cursor) -> List[str]:
     return [row[0] for row in cur.fetchall()]
 
 
+_DASHBOARD_KEYS = [
+    "Hands",
+    "Profit $",
+    "Profit bb",
+    "TBB/100",
+    "Hero Rake $",
+    "VPIP",
+    "PFR",
+    "WtS",
+    "WaS",
+    "WwS",
+    "WWSF",
+]
+
+# Все счётчики дашборда за один проход: hands × computed_stats (1:1 по hand_id)
+_SQL_DASHBOARD_COUNTERS = """
+    SELECT COUNT(*)                                                        AS hands,
+           SUM(h.hero_net)                                                 AS hero_net,
+           SUM(h.net_bb)                                                   AS net_bb,
+           SUM(h.hero_rake)                                                AS hero_rake,
+           SUM(CASE WHEN h.board IS NOT NULL AND h.board != '' THEN 1 ELSE 0 END)
+                                                                           AS flop_seen,
+           COUNT(c.hand_id)                                                AS stats_hands,
+           SUM(c.vpip)                                                     AS vpip,
+           SUM(c.pfr)                                                      AS pfr,
+           SUM(c.wt_sd)                                                    AS wt_sd,
+           SUM(c.w_sd)                                                     AS w_sd,
+           SUM(CASE WHEN c.wwsf=1 AND c.wt_sd=0 THEN 1 ELSE 0 END)         AS wwsf_only
+    FROM   hands h
+    LEFT   JOIN computed_stats c ON c.hand_id = h.hand_id
+    WHERE  {where};
+"""
+
+
+def dashboard_counters(
+    cur: sqlite3.Cursor, where: str = "1=1", params: Sequence[Any] = ()
+) -> Dict[str, Any]:
+    """
+    Сырые суммы для дашборда одним сканом (where — из hand_filter_sql).
+    Суммы, а не проценты, — их можно складывать между кусками данных.
+    """
+    row = cur.execute(_SQL_DASHBOARD_COUNTERS.format(where=where), params).fetchone()
+    names = [d[0] for d in cur.description]
+    return dict(zip(names, row))
+
+
+def stats_from_counters(cnt: Dict[str, Any]) -> Dict[str, Any]:
+    """Метрики дашборда из счётчиков dashboard_counters (формулы как были)."""
+    hands_cnt = int(cnt["hands"] or 0)
+    if not hands_cnt:
+        return {k: 0 for k in _DASHBOARD_KEYS}
+
+    # --- базовые агрегаты (из hands) ---------------------------------------
+    profit_usd = round(cnt["hero_net"] or 0.0, 2)
+    profit_bb = round(cnt["net_bb"] or 0.0, 1)
+    hero_rake_usd = round(cnt["hero_rake"] or 0.0, 2)
+    tbb_per_100 = round((profit_bb / hands_cnt) * 100, 1)
+
+    # --- VPIP / PFR (доля среди рук, у которых есть computed_stats) --------
+    stats_hands = cnt["stats_hands"]
+    vpip_pct = round(100.0 * (cnt["vpip"] or 0) / stats_hands) if stats_hands else 0
+    pfr_pct = round(100.0 * (cnt["pfr"] or 0) / stats_hands) if stats_hands else 0
+
+    # --- постфлоп & шоудаун ------------------------------------------------
+    wt_s_cnt = int(cnt["wt_sd"] or 0)
+    w_sd_cnt = int(cnt["w_sd"] or 0)
+    wws_only_cnt = int(cnt["wwsf_only"] or 0)  # выиграл без вскрытия
+    flop_cnt = int(cnt["flop_seen"] or 0)
+
+    def pct(num: int, den: int) -> int:
+        return round((num / den) * 100) if den else 0
+
+    WtS = pct(wt_s_cnt, flop_cnt)
+    WaS = pct(w_sd_cnt, wt_s_cnt) if wt_s_cnt else 0
+    WwS = pct(wws_only_cnt, flop_cnt)
+    WWSF = pct(w_sd_cnt + wws_only_cnt, flop_cnt)
+
+    return {
+        "Hands": hands_cnt,
+        "Profit $": profit_usd,
+        "Profit bb": profit_bb,
+        "TBB/100": tbb_per_100,
+        "Hero Rake $": hero_rake_usd,
+        "VPIP": vpip_pct,
+        "PFR": pfr_pct,
+        "WtS": WtS,
+        "WaS": WaS,
+        "WwS": WwS,
+        "WWSF": WWSF,
+    }
+
+
 def get_dashboard_stats(
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
     limits: Optional[List[float]] = None,
     positions: Optional[List[str]] = None,
 ) -> Dict[str, Any]:
-    """Возвращает агрегаты с учётом фильтров."""
+    """
+    Возвращает агрегаты с учётом фильтров.
+    Все фильтры — по дню / лимиту / позиции, поэтому читаем daily_rollup;
+    dashboard_counters — тот же результат прямым проходом по рукам.
+    """
     _validate_filters(date_from, date_to, limits, positions)
 
-    with sqlite3.connect(DB_PATH) as cx:
-        cur = cx.cursor()
-
-        # --- отфильтрованные hand_ids --------------------------------------
-        hand_ids = get_hand_ids(cur, date_from, date_to, limits, positions)
-        if not hand_ids:
-            return {
-                k: 0
-                for k in [
-                    "Hands",
-                    "Profit $",
-                    "Profit bb",
-                    "TBB/100",
-                    "Hero Rake $",
-                    "VPIP",
-                    "PFR",
-                    "WtS",
-                    "WaS",
-                    "WwS",
-                    "WWSF",
-                ]
-            }
-
-        placeholders = ",".join(["?"] * len(hand_ids))
-
-        # --- базовые агрегаты (из hands) -----------------------------------
-        hands_cnt = len(hand_ids)
-        profit_usd = round(
-            _fetch_one(
-                cur, f"SELECT SUM(hero_net) FROM hands WHERE hand_id IN ({placeholders})", hand_ids
-            ),
-            2,
-        )
-        profit_bb = round(
-            _fetch_one(
-                cur, f"SELECT SUM(net_bb) FROM hands WHERE hand_id IN ({placeholders})", hand_ids
-            ),
-            1,
-        )
-        hero_rake_usd = round(
-            _fetch_one(
-                cur, f"SELECT SUM(hero_rake) FROM hands WHERE hand_id IN ({placeholders})", hand_ids
-            ),
-            2,
-        )
-        tbb_per_100 = round((profit_bb / hands_cnt) * 100, 1)
-
-        # --- VPIP / PFR ------------------------------------------------------
-        vpip_pct, pfr_pct = cur.execute(
-            f"""
-            SELECT 100.0 * SUM(vpip) / COUNT(*),
-                   100.0 * SUM(pfr)  / COUNT(*)
-            FROM   computed_stats WHERE hand_id IN ({placeholders});
-            """,
-            hand_ids,
-        ).fetchone()
-        vpip_pct = round(vpip_pct or 0.0)
-        pfr_pct = round(pfr_pct or 0.0)
-
-        # --- постфлоп & шоудаун --------------------------------------------
-        wt_s_cnt, w_sd_cnt, wwsf_only_cnt = cur.execute(
-            f"""
-            SELECT SUM(wt_sd),
-                   SUM(w_sd),
-                   SUM(CASE WHEN wwsf=1 AND wt_sd=0 THEN 1 ELSE 0 END)
-            FROM   computed_stats WHERE hand_id IN ({placeholders});
-            """,
-            hand_ids,
-        ).fetchone()
-        wt_s_cnt = int(wt_s_cnt or 0)
-        w_sd_cnt = int(w_sd_cnt or 0)
-        wws_only_cnt = int(wwsf_only_cnt or 0)  # выиграл без вскрытия
-
-        # --- сколько рук дошли до флопа ------------------------------------
-        flop_cnt = _fetch_one(
-            cur,
-            f"SELECT COUNT(*) FROM hands WHERE hand_id IN ({placeholders}) AND board IS NOT NULL AND board != ''",
-            hand_ids,
-        )
-        flop_cnt = int(flop_cnt)
-
-        def pct(num: int, den: int) -> int:
-            return round((num / den) * 100) if den else 0
-
-        WtS = pct(wt_s_cnt, flop_cnt)
-        WaS = pct(w_sd_cnt, wt_s_cnt) if wt_s_cnt else 0
-        WwS = pct(wws_only_cnt, flop_cnt)
-        WWSF = pct(w_sd_cnt + wws_only_cnt, flop_cnt)
-
-        return {
-            "Hands": hands_cnt,
-            "Profit $": profit_usd,
-            "Profit bb": profit_bb,
-            "TBB/100": tbb_per_100,
-            "Hero Rake $": hero_rake_usd,
-            "VPIP": vpip_pct,
-            "PFR": pfr_pct,
-            "WtS": WtS,
-            "WaS": WaS,
-            "WwS": WwS,
-            "WWSF": WWSF,
-        }
+    with get_connection(DB_PATH, readonly=True) as cx:
+        where, params = hand_filter_sql(date_from, date_to, limits, positions, "r", by_day=True)
+        return stats_from_counters(rollup_counters(cx.cursor(), where, params))
 
 
 def get_profit_by_date(
@@ -220,26 +207,50 @@ def get_profit_by_date(
     """Возвращает даты и профит для графика."""
     _validate_filters(date_from, date_to, limits, positions)
 
-    with sqlite3.connect(DB_PATH) as cx:
+    with get_connection(DB_PATH, readonly=True) as cx:
         cur = cx.cursor()
-        hand_ids = get_hand_ids(cur, date_from, date_to, limits, positions)
-        if not hand_ids:
-            return [], []
-        placeholders = ",".join(["?"] * len(hand_ids))
-        rows = cur.execute(
-            f"""
-            SELECT SUBSTR(datetime_utc, 1, 10) as d,
-                   ROUND(SUM(hero_net), 2)
-            FROM   hands
-            WHERE  hand_id IN ({placeholders})
-            GROUP  BY d
-            ORDER  BY d;
-            """,
-            hand_ids,
-        ).fetchall()
+        where, params = hand_filter_sql(date_from, date_to, limits, positions, "r", by_day=True)
+        rows = profit_by_day(cur, where, params)
         return [row[0] for row in rows], [row[1] for row in rows]
 
 
+def get_range_grid(
+    limits: Optional[List[float]] = None,
+    positions: Optional[List[str]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Клетки сетки 13×13 (все 169): {'AKo': {Hands, VPIP, PFR, bb/100}}.
+    Из combo_rollup — фильтры только по лимиту и позиции (за всё время).
+    """
+    _validate_filters(None, None, limits, positions)
+
+    with get_connection(DB_PATH, readonly=True) as cx:
+        where, params = hand_filter_sql(limits=limits, positions=positions, alias="r")
+        counters = combo_counters(cx.cursor(), where, params)
+
+    grid = {}
+    for combo in (c for row in grid_labels() for c in row):
+        cnt = counters.get(combo) or {}
+        hands_cnt = int(cnt.get("hands") or 0)
+        stats_hands = cnt.get("stats_hands") or 0
+        grid[combo] = {
+            "Hands": hands_cnt,
+            "VPIP": round(100.0 * cnt["vpip"] / stats_hands) if stats_hands else 0,
+            "PFR": round(100.0 * cnt["pfr"] / stats_hands) if stats_hands else 0,
+            "bb/100": round(100.0 * (cnt["net_bb"] or 0) / hands_cnt, 1) if hands_cnt else 0,
+        }
+    return grid
+
+
+def range_grid_frame(grid: Dict[str, Dict[str, Any]], metric: str) -> pd.DataFrame:
+    """Таблица 13×13 одной метрики из get_range_grid: строки и столбцы — ранги A…2."""
+    return pd.DataFrame(
+        [[grid[combo][metric] for combo in row] for row in grid_labels()],
+        index=list(COMBO_RANKS),
+        columns=list(COMBO_RANKS),
+    )
+
+
 if __name__ == "__main__":
     from pprint import pprint
 
@@ -0,0 +1,144 @@
+# bbline/database/connection.py
+"""
+Соединения с SQLite для всего пакета.
+
+▪ WAL — Streamlit читает, пока импорт пишет: читатели не ждут писателя,
+  писатель не ждёт читателей (режим хранится в самом файле базы);
+▪ PRAGMAS — кеш страниц, mmap, temp в памяти, synchronous=NORMAL
+  (в WAL это безопасно: при сбое ОС теряется максимум последний commit);
+▪ readonly=True — соединение mode=ro для UI и отчётов: случайная запись
+  падает сразу, а не висит на блокировке;
+▪ get_connection — одно соединение на (поток, базы, режим), переиспользуется
+  между вызовами; Streamlit гоняет каждую сессию в своём потоке;
+▪ шарды — get_connection() без пути берёт все базы реестра (registry.py):
+  первая открывается как main, остальные — ATTACH (только чтение), а
+  hands / computed_stats / daily_rollup / … подменяются TEMP VIEW с
+  UNION ALL по всем базам. Запросы отчётов не меняются: SUM / COUNT /
+  GROUP BY сами сводят агрегаты шардов. SQLite подключает не больше
+  10 баз на соединение.
+
+Пример:
+    with get_connection(readonly=True) as cx:   # все базы реестра
+        cx.execute("SELECT COUNT(*) FROM hands").fetchone()
+
+Соединения из get_connection общие — не меняйте на них row_factory
+(ставьте его на курсор) и не закрывайте их руками. Писать в шардовое
+соединение можно только в main.<таблица> — имена без схемы ведут во view.
+"""
+
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+from bbline.database import registry
+
+BUSY_TIMEOUT = 30.0  # сек — сколько писатель ждёт другого писателя
+PRAGMAS = (
+    ("synchronous", "NORMAL"),
+    ("cache_size", -64_000),  # ~64 МБ кеша страниц на соединение
+    ("mmap_size", 256 << 20),  # читать файл через mmap до 256 МБ
+    ("temp_store", "MEMORY"),  # temp-таблицы и сортировки — в памяти
+)
+
+# таблицы, которые в шардовом соединении читаются сразу из всех баз
+SHARDED_TABLES = (
+    "hands",
+    "seats",
+    "actions",
+    "showdowns",
+    "collected",
+    "computed_stats",
+    "daily_rollup",
+    "combo_rollup",
+    "board_features",
+    "player_stats",
+    "tags",
+    "db_meta",
+)
+
+_local = threading.local()
+
+
+def connect(
+    db_path=None, readonly: bool = False, timeout: float = BUSY_TIMEOUT
+) -> sqlite3.Connection:
+    """
+    Новое соединение с включённым WAL и PRAGMAS. Закрывает вызывающий.
+    db_path=None — база для записи из реестра.
+    """
+    path = Path(db_path) if db_path else registry.write_path()
+    # URI и для записи: иначе ATTACH шарда с ?mode=ro не поймёт параметр
+    uri = path.resolve().as_uri() + ("?mode=ro" if readonly else "")
+    cx = sqlite3.connect(uri, uri=True, timeout=timeout)
+    if not readonly:
+        cx.execute("PRAGMA journal_mode = WAL;")
+    for name, value in PRAGMAS:
+        cx.execute(f"PRAGMA {name} = {value};")
+    return cx
+
+
+def get_connection(db_path=None, readonly: bool = False) -> sqlite3.Connection:
+    """
+    Соединение текущего потока (создаётся при первом вызове).
+    db_path=None — все базы реестра (шардовое соединение, если их несколько).
+    """
+    pool: Dict[Tuple[Tuple[str, ...], bool], sqlite3.Connection] = _local.__dict__.setdefault(
+        "pool", {}
+    )
+    paths = (Path(db_path),) if db_path else registry.read_paths()
+    key = (tuple(str(p.resolve()) for p in paths), readonly)
+    cx = pool.get(key)
+    if cx is None:
+        cx = connect(key[0][0], readonly)
+        if len(key[0]) > 1:
+            _attach_shards(cx, key[0])
+        pool[key] = cx
+    return cx
+
+
+def _columns(cx: sqlite3.Connection, schema: str, table: str) -> List[str]:
+    return [row[1] for row in cx.execute(f"PRAGMA {schema}.table_info({table});")]
+
+
+def _attach_shards(cx: sqlite3.Connection, paths: Sequence[str]) -> None:
+    """
+    paths[0] уже открыт как main; остальные — ATTACH (только чтение),
+    затем TEMP VIEW с UNION ALL по SHARDED_TABLES. В шарды ничего не пишет.
+    """
+    from bbline.database.create_schema import DERIVED_TABLES
+
+    schemas = {"main": paths[0]}
+    for i, path in enumerate(paths[1:], 1):
+        schemas[f"shard{i}"] = path
+        cx.execute(f"ATTACH DATABASE ? AS shard{i};", (f"{Path(path).as_uri()}?mode=ro",))
+
+    for table in SHARDED_TABLES:
+        having = {s: _columns(cx, s, table) for s in schemas}
+        having = {s: cols for s, cols in having.items() if cols}
+        if table in DERIVED_TABLES and having:
+            # агрегаты строят create_schema / migrate_add_derived_tables.py, а не чтение:
+            # шард без таблицы в view не попадает — отчёты его рук не увидят
+            for s in (s for s in schemas if s not in having):
+                print(f"[!] {schemas[s]}: нет {table} — запустите migrate_add_derived_tables.py")
+        if len(having) < 2:
+            continue  # таблица есть в одной базе — имя и так найдётся без view
+        # старые шарды могут быть без новых колонок — берём общие, в порядке первой базы
+        first, *rest = having.values()
+        common = [c for c in first if all(c in cols for cols in rest)]
+        select = ", ".join(f'"{c}"' for c in common)
+        union = " UNION ALL ".join(f"SELECT {select} FROM {s}.{table}" for s in having)
+        cx.execute(f"CREATE TEMP VIEW {table} AS {union};")
+
+
+def is_sharded(cx: sqlite3.Connection) -> bool:
+    """hands в этом соединении — view по нескольким базам."""
+    row = cx.execute("SELECT 1 FROM sqlite_temp_master WHERE type = 'view' AND name = 'hands';")
+    return row.fetchone() is not None
+
+
+def close_all() -> None:
+    """Закрывает соединения текущего потока (тесты, бенчмарки, смена базы)."""
+    pool = _local.__dict__.pop("pool", {})
+    for cx in pool.values():
+        cx.close()
@@ -4,20 +4,50 @@
 
 ▪ hero-only, но сохраняем все сиды ― пригодится для мульти-героя/оппов.
 ▪ всё в одной базе SQLite, поэтому сразу добавляем индексы для быстрой агрегации.
+
+База — для записи из реестра (database/registry.py); новый шард:
+    python -m bbline.database.create_schema --db hh_2026.sqlite
+Таблицы-агрегаты (daily_rollup, combo_rollup, board_features, player_stats)
+строятся тут же; в старые базы их добавляет migrate_add_derived_tables.py.
 """
 
+import argparse
 import sqlite3
+from contextlib import closing
 from pathlib import Path
-
-DB_PATH = Path(__file__).with_name("bbline.sqlite")
-DB_PATH.parent.mkdir(exist_ok=True, parents=True)
-
-conn = sqlite3.connect(DB_PATH)
-cur = conn.cursor()
+from typing import Callable, Dict, List
+
+from bbline.database import registry
+from bbline.database.connection import connect
+
+# --------- триггеры «устаревания» computed_stats ----------
+# правка исходных строк руки удаляет её computed_stats, инкрементальный
+# rebuild_computed пересчитает такую руку (он же ставит их в старые базы)
+STALE_TRIGGERS_SQL = """
+CREATE TRIGGER IF NOT EXISTS trg_actions_upd_stale
+AFTER UPDATE ON actions BEGIN
+    DELETE FROM computed_stats WHERE hand_id IN (OLD.hand_id, NEW.hand_id);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_actions_del_stale
+AFTER DELETE ON actions BEGIN
+    DELETE FROM computed_stats WHERE hand_id = OLD.hand_id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_collected_upd_stale
+AFTER UPDATE ON collected BEGIN
+    DELETE FROM computed_stats WHERE hand_id IN (OLD.hand_id, NEW.hand_id);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_collected_del_stale
+AFTER DELETE ON collected BEGIN
+    DELETE FROM computed_stats WHERE hand_id = OLD.hand_id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_hands_upd_stale
+AFTER UPDATE OF hero_seat, hero_net, hero_showdown, limit_bb, rake ON hands BEGIN
+    DELETE FROM computed_stats WHERE hand_id = NEW.hand_id;
+END;
+"""
 
 # ---------- HAND LEVEL ----------
-cur.executescript(
-    """
+SCHEMA_SQL = """
 PRAGMA foreign_keys = ON;
 
 /* 1. hands — «шапка» раздачи */
@@ -44,7 +74,9 @@ CREATE TABLE IF NOT EXISTS hands (
     hero_ev_diff  REAL,                    -- all-in EV – net (если есть)
     hero_won      INTEGER,                 -- 1/0 выиграл ли шоудаун
     hero_showdown INTEGER,                 -- 1/0 WTSD
-    duration_ms   INTEGER                  -- заполним позже (vision-мод)
+    duration_ms   INTEGER,                 -- заполним позже (vision-мод)
+    hero_position TEXT,                    -- BTN/SB/BB/EP/MP/CO по реальному числу игроков
+    hero_combo    TEXT                     -- клетка сетки 13×13: ‘95s’, ‘AKo’, ‘TT’
 );
 
 /* 2. seats — игроки и стеки в начале руки (1 строка = 1 сид) */
@@ -104,7 +136,7 @@ CREATE TABLE IF NOT EXISTS tags (
 );
 
 /* 8. computed_stats — денорм. кеш, чтобы не жечь проц каждый запрос
-      (заполняется batch-скриптом после импорта) */
+      (новые руки считает HandWriter при импорте, остальное — rebuild_computed) */
 CREATE TABLE IF NOT EXISTS computed_stats (
     hand_id      TEXT PRIMARY KEY REFERENCES hands(hand_id) ON DELETE CASCADE,
     vpip         INTEGER,   -- 1/0
@@ -128,16 +160,65 @@ CREATE TABLE IF NOT EXISTS collected (
     PRIMARY KEY (hand_id, seat_no, amount)   -- ← добавил amount: игрок может собрать пару разных банков
 );
 
+/* 10. side_pots — банки рук с олл-ином (без олл-ина банк один — не храним) */
+CREATE TABLE IF NOT EXISTS side_pots (
+    hand_id  TEXT    NOT NULL REFERENCES hands(hand_id) ON DELETE CASCADE,
+    pot_no   INTEGER NOT NULL,          -- 0 — основной, дальше побочные
+    amount   REAL    NOT NULL,          -- $ без несколлированной ставки
+    seats    TEXT    NOT NULL,          -- претенденты: '2,5'
+    PRIMARY KEY (hand_id, pot_no)
+);
+
 
 
 /* --------- полезные индексы для скорости отчётов ---------- */
 CREATE INDEX IF NOT EXISTS idx_actions_hand_street ON actions(hand_id, street);
 CREATE INDEX IF NOT EXISTS idx_actions_seat ON actions(seat_no);
+CREATE INDEX IF NOT EXISTS idx_seats_player ON seats(player_id);
 CREATE INDEX IF NOT EXISTS idx_hands_datetime ON hands(datetime_utc);
-"""
-)
+CREATE INDEX IF NOT EXISTS idx_hands_pos_limit_dt ON hands(hero_position, limit_bb, datetime_utc);
+""" + STALE_TRIGGERS_SQL
 
-conn.commit()
-conn.close()
 
-print(f"✅  База создана: {DB_PATH.resolve()}")
+# таблицы-агрегаты по рукам базы (ведут HandWriter / insert_hand / rebuild_computed)
+DERIVED_TABLES = ("daily_rollup", "combo_rollup", "board_features", "player_stats")
+
+
+def _derived_builders() -> Dict[str, Callable[[sqlite3.Connection], None]]:
+    """DERIVED_TABLES → rebuild_all (импорт здесь: analysis сам импортирует database)."""
+    from bbline.analysis import board_features, combo_rollup, player_stats, rollup
+
+    builders = (rollup, combo_rollup, board_features, player_stats)
+    return {table: module.rebuild_all for table, module in zip(DERIVED_TABLES, builders)}
+
+
+def build_derived_tables(cx: sqlite3.Connection) -> List[str]:
+    """
+    Строит недостающие таблицы-агрегаты сразу по всем рукам базы. Не коммитит.
+    Возвращает имена построенных. На большой базе — минуты, поэтому это делают
+    create_schema и migrate_add_derived_tables.py, а не чтение отчётов.
+    """
+    built = []
+    for table, rebuild_all in _derived_builders().items():
+        if not cx.execute(f"PRAGMA main.table_info({table});").fetchone():
+            rebuild_all(cx)  # сам создаёт таблицу и заполняет её по всей базе
+            built.append(table)
+    return built
+
+
+def create_schema(db_path=None) -> Path:
+    """Создаёт таблицы и индексы (db_path=None — база для записи из реестра)."""
+    path = Path(db_path) if db_path else registry.write_path()
+    path.parent.mkdir(exist_ok=True, parents=True)
+    with closing(connect(path)) as conn:  # заодно переводит файл в WAL
+        conn.executescript(SCHEMA_SQL)
+        build_derived_tables(conn)
+        conn.commit()
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Создание схемы базы BBLine")
+    registry.add_db_argument(parser)
+    registry.configure(parser.parse_args().db)
+    print(f"✅  База создана: {create_schema().resolve()}")
@@ -1,14 +1,179 @@
 # db_utils.py
 
 import sqlite3
+import threading
+import time
 from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
 
-DB_PATH = Path(__file__).with_name("bbline.sqlite")
+from bbline.analysis import board_features, combo_rollup, player_stats, rollup
+from bbline.analysis.rebuild_computed import update_hands
+from bbline.database import registry
+from bbline.database.connection import connect, get_connection
+from bbline.database.meta import bump_generation
+from bbline.parse.hand_parser import hero_combo, position_from_seats
+
+
+# Проверяем наличие всех необходимых полей
+REQUIRED_FIELDS = [
+    "hand_id",
+    "site",
+    "game_type",
+    "limit_bb",
+    "datetime_utc",
+    "button_seat",
+    "hero_seat",
+    "hero_name",
+    "hero_cards",
+    "board",
+    "hero_invested",
+    "hero_collected",
+    "hero_rake",
+    "rake",
+    "jackpot",
+    "final_pot",
+    "hero_net",
+    "hero_showdown",
+]
+
+SQL_INSERT_HAND = """
+    INSERT OR IGNORE INTO hands (
+        hand_id, site, game_type, limit_bb, datetime_utc,
+        button_seat, hero_seat, hero_name, hero_cards, board,
+        hero_invested, hero_collected, hero_rake, rake, jackpot,
+        final_pot, hero_net, hero_showdown, hero_position, hero_combo
+    )
+    VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?);
+"""
+SQL_INSERT_SEAT = (
+    "INSERT OR REPLACE INTO seats (hand_id, seat_no, player_id, chips) VALUES (?,?,?,?);"
+)
+SQL_INSERT_ACTION = (
+    "INSERT INTO actions (hand_id, street, order_no, seat_no, act, amount, allin) "
+    "VALUES (?,?,?,?,?,?,?);"
+)
+SQL_INSERT_COLLECTED = "INSERT INTO collected (hand_id, seat_no, amount) VALUES (?,?,?);"
+SQL_INSERT_SHOWDOWN = "INSERT INTO showdowns (hand_id, seat_no, cards, won) VALUES (?,?,?,?);"
+SQL_INSERT_SIDE_POT = "INSERT INTO side_pots (hand_id, pot_no, amount, seats) VALUES (?,?,?,?);"
+
+# как в create_schema.py — для баз, созданных до появления таблицы
+SQL_CREATE_SIDE_POTS = """
+    CREATE TABLE IF NOT EXISTS side_pots (
+        hand_id TEXT    NOT NULL REFERENCES hands(hand_id) ON DELETE CASCADE,
+        pot_no  INTEGER NOT NULL,
+        amount  REAL    NOT NULL,
+        seats   TEXT    NOT NULL,
+        PRIMARY KEY (hand_id, pot_no)
+    );
+"""
+
+# лимит переменных SQLite (старые сборки — 999)
+_MAX_VARS = 900
+
+# ошибки, при которых пачка переписывается по одной руке
+_BATCH_ERRORS = (sqlite3.Error, ValueError, KeyError, TypeError)
+
+# deferred HandWriter: рук на одну транзакцию финального прохода по агрегатам
+_FINISH_CHUNK = 50_000
+
+# соединение потока, для которого _prepare уже отработал (ссылка держит его id занятым)
+_prepared = threading.local()
+
+
+def _hand_row(hand: dict) -> Tuple[Any, ...]:
+    """Строка для таблицы hands; ValueError, если не хватает полей."""
+    for field in REQUIRED_FIELDS:
+        if field not in hand:
+            raise ValueError(f"Отсутствует обязательное поле: {field}")
+    if "hero_position" in hand:
+        position = hand["hero_position"]
+    else:  # раздача собрана не через parse_hand
+        position = position_from_seats(
+            hand["hero_seat"], hand["button_seat"], (s["seat_no"] for s in hand.get("seats", []))
+        )
+    combo = hand["hero_combo"] if "hero_combo" in hand else hero_combo(hand["hero_cards"])
+    return (*(hand[field] for field in REQUIRED_FIELDS), position, combo)
+
+
+def _ensure_hero_position(cur: sqlite3.Cursor) -> None:
+    """Старые базы: добавляем hands.hero_position и индекс (заполняет migrate_add_hero_position)."""
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(hands);")}
+    if "hero_position" not in columns:
+        cur.execute("ALTER TABLE hands ADD COLUMN hero_position TEXT;")
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_hands_pos_limit_dt "
+        "ON hands(hero_position, limit_bb, datetime_utc);"
+    )
+
+
+def _ensure_hero_combo(cur: sqlite3.Cursor) -> None:
+    """Старые базы: добавляем hands.hero_combo (заполняет migrate_add_hero_combo)."""
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(hands);")}
+    if "hero_combo" not in columns:
+        cur.execute("ALTER TABLE hands ADD COLUMN hero_combo TEXT;")
+
+
+def _ensure_side_pots(cur: sqlite3.Cursor) -> None:
+    """Старые базы: таблица side_pots появляется при первой записи."""
+    cur.execute(SQL_CREATE_SIDE_POTS)
+
+
+def _prepare(cx: sqlite3.Connection) -> None:
+    """Схема старых баз под запись — один раз на соединение, а не на каждую руку."""
+    if getattr(_prepared, "cx", None) is cx:
+        return
+    cur = cx.cursor()
+    _ensure_hero_position(cur)
+    _ensure_hero_combo(cur)
+    _ensure_side_pots(cur)
+    _prepared.cx = cx
+
+
+def _check_collected_rows(rows: Sequence[Any]) -> None:
+    """Проверяем формат collected_rows."""
+    for row in rows:
+        if not isinstance(row, (list, tuple)) or len(row) != 3:
+            raise ValueError(f"Неверный формат записи в collected_rows: {row}")
+        if not isinstance(row[0], str):
+            raise ValueError(f"hand_id должен быть строкой, получен {type(row[0])}")
+        if not isinstance(row[1], int):
+            raise ValueError(f"seat_no должен быть целым числом, получен {type(row[1])}")
+        if not isinstance(row[2], (int, float)):
+            raise ValueError(f"amount должен быть числом, получен {type(row[2])}")
+
+
+def _child_rows(hand: dict) -> Tuple[list, list, list, list, list]:
+    """Строки для seats / actions / collected / showdowns / side_pots одной раздачи."""
+    # Проверяем наличие всех необходимых данных для связанных таблиц
+    if "seats" not in hand:
+        raise ValueError("Отсутствуют данные о местах игроков")
+    if "actions" not in hand:
+        raise ValueError("Отсутствуют данные о действиях")
+    if "collected_rows" not in hand:
+        raise ValueError("Отсутствуют данные о выигрышах")
+    if "showdowns" not in hand:
+        raise ValueError("Отсутствуют данные о шоудаунах")
+    _check_collected_rows(hand["collected_rows"])
+
+    hid = hand["hand_id"]
+    seats = [(hid, s["seat_no"], s["player_id"], s["chips"]) for s in hand["seats"]]
+    actions = [
+        (hid, a["street"], a["order_no"], a["seat_no"], a["act"], a["amount"], a["allin"])
+        for a in hand["actions"]
+    ]
+    showdowns = [(hid, sd["seat_no"], sd["cards"], sd.get("won")) for sd in hand["showdowns"]]
+    # раздача собрана не через parse_hand — банков нет
+    pots = [
+        (hid, p["pot_no"], p["amount"], ",".join(map(str, p["seats"])))
+        for p in hand.get("side_pots", ())
+    ]
+    return seats, actions, list(hand["collected_rows"]), showdowns, pots
 
 
 def insert_hand(hand: dict, cx: sqlite3.Connection | None = None) -> bool:
     """
     Вставляет раздачу в базу данных.
+    Для массового импорта используй HandWriter — он пишет пачками.
 
     Args:
         hand: Словарь с данными раздачи
@@ -23,126 +188,27 @@ def insert_hand(hand: dict, cx: sqlite3.Connection | None = None) -> bool:
     own_conn = cx is None
     try:
         if own_conn:
-            cx = sqlite3.connect(DB_PATH, timeout=30.0)  # Увеличиваем таймаут
+            cx = get_connection(registry.write_path())  # общее соединение потока, не закрываем
+        _prepare(cx)
         cur = cx.cursor()
-
-        # Проверяем наличие всех необходимых полей
-        required_fields = [
-            "hand_id",
-            "site",
-            "game_type",
-            "limit_bb",
-            "datetime_utc",
-            "button_seat",
-            "hero_seat",
-            "hero_name",
-            "hero_cards",
-            "board",
-            "hero_invested",
-            "hero_collected",
-            "hero_rake",
-            "rake",
-            "jackpot",
-            "final_pot",
-            "hero_net",
-            "hero_showdown",
-        ]
-        for field in required_fields:
-            if field not in hand:
-                raise ValueError(f"Отсутствует обязательное поле: {field}")
-
-        cur.execute(
-            """
-            INSERT OR IGNORE INTO hands (
-                hand_id, site, game_type, limit_bb, datetime_utc,
-                button_seat, hero_seat, hero_name, hero_cards, board,
-                hero_invested, hero_collected, hero_rake, rake, jackpot,
-                final_pot, hero_net, hero_showdown
-            )
-            VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?);
-            """,
-            (
-                hand["hand_id"],
-                hand["site"],
-                hand["game_type"],
-                hand["limit_bb"],
-                hand["datetime_utc"],
-                hand["button_seat"],
-                hand["hero_seat"],
-                hand["hero_name"],
-                hand["hero_cards"],
-                hand["board"],
-                hand["hero_invested"],
-                hand["hero_collected"],
-                hand["hero_rake"],
-                hand["rake"],
-                hand["jackpot"],
-                hand["final_pot"],
-                hand["hero_net"],
-                hand["hero_showdown"],
-            ),
-        )
+        cur.execute(SQL_INSERT_HAND, _hand_row(hand))
         inserted = cur.rowcount == 1
 
         if inserted:
-            # Проверяем наличие всех необходимых данных для связанных таблиц
-            if "seats" not in hand:
-                raise ValueError("Отсутствуют данные о местах игроков")
-            if "actions" not in hand:
-                raise ValueError("Отсутствуют данные о действиях")
-            if "collected_rows" not in hand:
-                raise ValueError("Отсутствуют данные о выигрышах")
-            if "showdowns" not in hand:
-                raise ValueError("Отсутствуют данные о шоудаунах")
-
-            # Пишем в связанные таблицы
-            for seat in hand["seats"]:
-                cur.execute(
-                    "INSERT OR REPLACE INTO seats (hand_id, seat_no, player_id, chips) VALUES (?,?,?,?);",
-                    (hand["hand_id"], seat["seat_no"], seat["player_id"], seat["chips"]),
-                )
-            for action in hand["actions"]:
-                cur.execute(
-                    "INSERT INTO actions (hand_id, street, order_no, seat_no, act, amount, allin) VALUES (?,?,?,?,?,?,?);",
-                    (
-                        hand["hand_id"],
-                        action["street"],
-                        action["order_no"],
-                        action["seat_no"],
-                        action["act"],
-                        action["amount"],
-                        action["allin"],
-                    ),
-                )
-            # Проверяем формат collected_rows
-            for row in hand["collected_rows"]:
-                if not isinstance(row, (list, tuple)) or len(row) != 3:
-                    raise ValueError(f"Неверный формат записи в collected_rows: {row}")
-                if not isinstance(row[0], str):
-                    raise ValueError(f"hand_id должен быть строкой, получен {type(row[0])}")
-                if not isinstance(row[1], int):
-                    raise ValueError(f"seat_no должен быть целым числом, получен {type(row[1])}")
-                if not isinstance(row[2], (int, float)):
-                    raise ValueError(f"amount должен быть числом, получен {type(row[2])}")
-
-            # Вставляем данные о выигрышах
-            cur.executemany(
-                "INSERT INTO collected (hand_id, seat_no, amount) VALUES (?,?,?);",
-                hand["collected_rows"],
-            )
-
-            for showdown in hand["showdowns"]:
-                cur.execute(
-                    "INSERT INTO showdowns (hand_id, seat_no, player_id, cards, is_winner, won_amount) VALUES (?,?,?,?,?,?);",
-                    (
-                        hand["hand_id"],
-                        showdown["seat_no"],
-                        showdown["player_id"],
-                        showdown["cards"],
-                        showdown["is_winner"],
-                        showdown["won_amount"],
-                    ),
-                )
+            seats, actions, collected, showdowns, pots = _child_rows(hand)
+            cur.executemany(SQL_INSERT_SEAT, seats)
+            cur.executemany(SQL_INSERT_ACTION, actions)
+            cur.executemany(SQL_INSERT_COLLECTED, collected)
+            cur.executemany(SQL_INSERT_SHOWDOWN, showdowns)
+            cur.executemany(SQL_INSERT_SIDE_POT, pots)
+            # как HandWriter: computed_stats / net_bb — до агрегатов, они их суммируют
+            new_ids = [hand["hand_id"]]
+            update_hands(cx, new_ids)
+            rollup.add_hands(cx, new_ids)
+            combo_rollup.add_hands(cx, new_ids)
+            player_stats.add_hands(cx, new_ids)
+            board_features.add_hands(cx, new_ids)
+            bump_generation(cx)
 
         if own_conn:
             cx.commit()
@@ -150,11 +216,255 @@ def insert_hand(hand: dict, cx: sqlite3.Connection | None = None) -> bool:
         return inserted
 
     except sqlite3.Error as e:
+        _prepared.cx = None  # ALTER внутри открытой транзакции мог откатиться
         if own_conn and cx:
             cx.rollback()
         raise sqlite3.Error(
             f"Ошибка при вставке раздачи {hand.get('hand_id', 'unknown')}: {str(e)}"
         )
-    finally:
+    except Exception:
+        # соединение потока общее и не закрывается: без rollback строка hands
+        # без seats/actions уйдёт в базу со следующим commit
+        _prepared.cx = None
         if own_conn and cx:
-            cx.close()
+            cx.rollback()
+        raise
+
+
+class HandWriter:
+    """
+    Пакетная запись раздач в БД.
+
+    ▪ одна транзакция на batch_size рук (а не commit на каждую руку);
+    ▪ executemany для hands / seats / actions / collected / showdowns / side_pots;
+    ▪ дубли ищутся одним запросом hand_id IN (...) на пачку;
+    ▪ если пачка падает — она переписывается по одной руке, чтобы
+      битая раздача не тянула за собой соседей;
+    ▪ compute_stats=True — computed_stats / net_bb новых рук считаются
+      в той же транзакции, отдельный rebuild после импорта не нужен;
+    ▪ новые руки сразу прибавляются к daily_rollup и combo_rollup (см. analysis/rollup.py,
+      analysis/combo_rollup.py);
+    ▪ и получают строку board_features (см. analysis/board_features.py);
+    ▪ счётчики всех игроков за столом — в player_stats (см. analysis/player_stats.py);
+    ▪ deferred=True (пакетный импорт) — computed_stats и все агрегаты считаются
+      не в каждой пачке, а одним проходом по всем новым рукам в finish() / close():
+      так пачка — только вставка строк. До finish() новые руки уже в hands, но ещё
+      не в отчётах; если процесс упал раньше — их подберёт rebuild_computed
+      (у них нет строки computed_stats);
+    ▪ stage_hook(стадия, секунды, рук) — замеры dedup / insert / compute / commit
+      на каждую пачку (см. ingest/metrics.py).
+
+    Пример:
+        with HandWriter(batch_size=2000) as w:
+            w.write_all(iter_hands(path))
+        print(w.stats, w.hands_per_sec)
+    """
+
+    def __init__(
+        self,
+        db_path: str | Path | None = None,
+        batch_size: int = 1000,
+        cx: sqlite3.Connection | None = None,
+        compute_stats: bool = True,
+        stage_hook: Optional[Callable[[str, float, int], None]] = None,
+        deferred: bool = False,
+    ):
+        self.batch_size = max(1, batch_size)
+        self.compute_stats = compute_stats
+        self.deferred = deferred
+        self._pending: List[str] = []  # deferred: новые руки, ждущие finish()
+        self.stage_hook = stage_hook
+        self._own_conn = cx is None
+        self.cx = cx if cx is not None else connect(db_path)  # None — база из реестра
+        _prepare(self.cx)
+        self._buf: List[dict] = []
+        self.stats: Dict[str, float] = {
+            "hands": 0,
+            "inserted": 0,
+            "duplicates": 0,
+            "failed": 0,
+            "batches": 0,
+            "elapsed": 0.0,
+        }
+
+    # ---------------------------------------------------------------- API
+    def add(self, hand: dict) -> List[Tuple[str, bool]]:
+        """
+        Кладёт раздачу в буфер. Когда буфер заполнен — пишет пачку и
+        возвращает [(hand_id, вставлена?)] по ней, иначе пустой список.
+        """
+        self._buf.append(hand)
+        if len(self._buf) >= self.batch_size:
+            return self.flush()
+        return []
+
+    def flush(self) -> List[Tuple[str, bool]]:
+        """Пишет буфер одной транзакцией. Упавшие раздачи в результат не попадают."""
+        if not self._buf:
+            return []
+        batch, self._buf = self._buf, []
+        t0 = time.perf_counter()
+        try:
+            results = self._write_batch(batch)
+        except _BATCH_ERRORS:
+            results = []
+            for hand in batch:
+                try:
+                    results.extend(self._write_batch([hand]))
+                except _BATCH_ERRORS as e:
+                    self.stats["hands"] += 1
+                    self.stats["failed"] += 1
+                    print(f"[ERR] Не удалось вставить {hand.get('hand_id')} — {e}")
+        self.stats["elapsed"] += time.perf_counter() - t0
+        return results
+
+    def write_all(self, hands: Iterable[dict]) -> Dict[str, float]:
+        """Пишет все раздачи из итератора и возвращает счётчики."""
+        for hand in hands:
+            self.add(hand)
+        self.flush()
+        return self.stats
+
+    @property
+    def hands_per_sec(self) -> float:
+        elapsed = self.stats["elapsed"]
+        return round(self.stats["hands"] / elapsed, 1) if elapsed else 0.0
+
+    def finish(self) -> None:
+        """
+        deferred: computed_stats и агрегаты всех рук, вставленных с прошлого finish(),
+        по _FINISH_CHUNK рук на транзакцию. Без deferred делать нечего.
+        """
+        pending, self._pending = self._pending, []
+        t_start = time.perf_counter()
+        for i in range(0, len(pending), _FINISH_CHUNK):
+            cur = self.cx.cursor()
+            try:
+                t0 = time.perf_counter()
+                cur.execute("BEGIN IMMEDIATE")
+                part = pending[i : i + _FINISH_CHUNK]
+                if self.compute_stats:
+                    # руки, которые тем временем досчитал rebuild_computed, второй раз
+                    # к агрегатам не прибавляем
+                    part = self._uncomputed(cur, part)
+                self._derive(part)
+                if part:
+                    bump_generation(self.cx)
+                t0 = self._lap("compute", t0, len(part))
+                self.cx.commit()
+                self._lap("commit", t0, len(part))
+            except Exception:
+                self.cx.rollback()
+                raise
+        self.stats["elapsed"] += time.perf_counter() - t_start
+
+    def close(self) -> None:
+        try:
+            self.flush()
+            self.finish()
+        finally:
+            if self._own_conn:
+                self.cx.close()
+
+    def __enter__(self) -> "HandWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    # ----------------------------------------------------------- internals
+    def _existing_ids(self, cur: sqlite3.Cursor, hand_ids: List[str]) -> set:
+        found = set()
+        for i in range(0, len(hand_ids), _MAX_VARS):
+            part = hand_ids[i : i + _MAX_VARS]
+            ph = ",".join("?" * len(part))
+            found.update(
+                r[0]
+                for r in cur.execute(f"SELECT hand_id FROM hands WHERE hand_id IN ({ph})", part)
+            )
+        return found
+
+    def _uncomputed(self, cur: sqlite3.Cursor, hand_ids: List[str]) -> List[str]:
+        """Руки из hand_ids без строки computed_stats — в исходном порядке."""
+        done = set()
+        for i in range(0, len(hand_ids), _MAX_VARS):
+            part = hand_ids[i : i + _MAX_VARS]
+            ph = ",".join("?" * len(part))
+            done.update(
+                r[0]
+                for r in cur.execute(
+                    f"SELECT hand_id FROM computed_stats WHERE hand_id IN ({ph})", part
+                )
+            )
+        return [hid for hid in hand_ids if hid not in done]
+
+    def _derive(self, new_ids: List[str]) -> None:
+        """computed_stats / net_bb и агрегаты новых рук. Не коммитит."""
+        if self.compute_stats:
+            update_hands(self.cx, new_ids, engine="numpy")
+        rollup.add_hands(self.cx, new_ids)
+        combo_rollup.add_hands(self.cx, new_ids)
+        player_stats.add_hands(self.cx, new_ids)
+        board_features.add_hands(self.cx, new_ids)
+
+    def _lap(self, stage: str, t0: float, hands: int) -> float:
+        """Отдаёт время стадии в stage_hook; возвращает начало следующей."""
+        now = time.perf_counter()
+        if self.stage_hook is not None:
+            self.stage_hook(stage, now - t0, hands)
+        return now
+
+    def _write_batch(self, batch: List[dict]) -> List[Tuple[str, bool]]:
+        cx = self.cx
+        cur = cx.cursor()
+        try:
+            t0 = time.perf_counter()
+            cur.execute("BEGIN IMMEDIATE")
+            existing = self._existing_ids(cur, [h["hand_id"] for h in batch])
+            t0 = self._lap("dedup", t0, len(batch))
+
+            results: List[Tuple[str, bool]] = []
+            hands_rows, seats, actions, collected, showdowns, pots = [], [], [], [], [], []
+            for hand in batch:
+                hid = hand["hand_id"]
+                if hid in existing:
+                    results.append((hid, False))
+                    continue
+                existing.add(hid)  # дубль внутри одной пачки
+                hands_rows.append(_hand_row(hand))
+                s, a, c, sd, sp = _child_rows(hand)
+                seats.extend(s)
+                actions.extend(a)
+                collected.extend(c)
+                showdowns.extend(sd)
+                pots.extend(sp)
+                results.append((hid, True))
+
+            cur.executemany(SQL_INSERT_HAND, hands_rows)
+            cur.executemany(SQL_INSERT_SEAT, seats)
+            cur.executemany(SQL_INSERT_ACTION, actions)
+            cur.executemany(SQL_INSERT_COLLECTED, collected)
+            cur.executemany(SQL_INSERT_SHOWDOWN, showdowns)
+            cur.executemany(SQL_INSERT_SIDE_POT, pots)
+            new_ids = [r[0] for r in hands_rows]
+            t0 = self._lap("insert", t0, len(new_ids))
+            if not self.deferred:
+                self._derive(new_ids)
+            if new_ids:
+                bump_generation(cx)  # закешированные в UI результаты устарели
+            t0 = self._lap("compute", t0, len(new_ids))
+            cx.commit()
+            self._lap("commit", t0, len(new_ids))
+        except Exception:
+            cx.rollback()
+            raise
+
+        inserted = len(hands_rows)
+        if self.deferred:
+            # только после commit: откаченная пачка перепишется по одной руке
+            self._pending.extend(row[0] for row in hands_rows)
+        self.stats["hands"] += len(batch)
+        self.stats["inserted"] += inserted
+        self.stats["duplicates"] += len(batch) - inserted
+        self.stats["batches"] += 1
+        return results
@@ -0,0 +1,167 @@
+# bbline/database/imported_files.py
+"""
+imported_files — какие файлы HH и до какого байта уже разобраны.
+
+offset — граница последней целиком записанной раздачи: GG дописывает руки
+в открытый файл сессии, и следующий проход читает файл только с этого места.
+content_hash — хеш всего содержимого уже разобранной части [0, offset): по нему
+видно, что файл только дописали (читаем хвост), а не подменили (читаем заново),
+и что файл — копия уже импортированного под другим именем (пропускаем).
+Хешер префикса отдаёт resume_point; импорт дополняет его байтами, которые и так
+читает, так что на хеш файл целиком перечитывается только при дописывании.
+Запись в таблицу не коммитится здесь — её коммитит тот, кто записал руки.
+"""
+
+import hashlib
+import os
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+HASH_BLOCK = 1 << 20  # файл хешируется блоками по 1 МБ
+
+
+class FileState(NamedTuple):
+    size: int  # размер файла на момент разбора
+    mtime: float
+    offset: int  # до какого байта раздачи уже в базе
+    content_hash: Optional[str] = None  # fingerprint(path, offset) — хеш всего префикса
+    last_hand_id: Optional[str] = None  # последняя раздача файла, дошедшая до базы
+
+
+def _ensure_files_table(cur: sqlite3.Cursor) -> None:
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS imported_files (
+            path         TEXT PRIMARY KEY,
+            size         INTEGER NOT NULL,
+            mtime        REAL    NOT NULL,
+            offset       INTEGER NOT NULL,
+            content_hash TEXT,
+            last_hand_id TEXT
+        );
+        """
+    )
+    # таблица из первой версии автоимпорта — без хеша содержимого
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(imported_files);")}
+    for column in ("content_hash", "last_hand_id"):
+        if column not in columns:
+            cur.execute(f"ALTER TABLE imported_files ADD COLUMN {column} TEXT;")
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_imported_files_hash ON imported_files(content_hash);"
+    )
+
+
+def prefix_hasher(path: Optional[Path] = None, upto: int = 0) -> Any:
+    """
+    blake2b, уже прочитавший первые upto байт файла: дальше в него дописывают
+    update(байты после upto), hexdigest() — content_hash.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    if path is not None and upto:
+        with open(path, "rb") as f:
+            while upto > 0:
+                block = f.read(min(HASH_BLOCK, upto))
+                if not block:
+                    break
+                h.update(block)
+                upto -= len(block)
+    return h
+
+
+def fingerprint(path: Path, upto: int) -> str:
+    """Хеш содержимого первых upto байт файла (content_hash). Читает весь префикс."""
+    return prefix_hasher(path, upto).hexdigest()
+
+
+def resume_point(
+    path: Path, st: os.stat_result, state: Optional[FileState]
+) -> Optional[Tuple[int, Any]]:
+    """
+    С какого байта читать файл и хешер уже разобранной части [0, offset):
+    None — не менялся с прошлого разбора (пропустить), (state.offset, …) — только
+    дописан, (0, пустой хешер) — новый или подменённый.
+    """
+    if state is None:
+        return 0, prefix_hasher()
+    if (state.size, state.mtime) == (st.st_size, st.st_mtime):
+        return None
+    if st.st_size >= state.offset:
+        h = prefix_hasher(path, state.offset)
+        if h.hexdigest() == state.content_hash:
+            return state.offset, h
+    return 0, prefix_hasher()
+
+
+def load_states(cx: sqlite3.Connection) -> Dict[str, FileState]:
+    """Все известные файлы: path → FileState."""
+    cur = cx.cursor()
+    _ensure_files_table(cur)
+    rows = cur.execute(
+        "SELECT path, size, mtime, offset, content_hash, last_hand_id FROM imported_files;"
+    )
+    return {row[0]: FileState(*row[1:]) for row in rows}
+
+
+def get_state(cx: sqlite3.Connection, path: str) -> Optional[FileState]:
+    cur = cx.cursor()
+    _ensure_files_table(cur)
+    row = cur.execute(
+        """
+        SELECT size, mtime, offset, content_hash, last_hand_id
+        FROM   imported_files
+        WHERE  path = ?;
+        """,
+        (path,),
+    ).fetchone()
+    return FileState(*row) if row else None
+
+
+def find_copy(cx: sqlite3.Connection, path: Path, size: int) -> Optional[FileState]:
+    """
+    Уже целиком разобранный файл с тем же содержимым, что path (или None).
+    Хеш path считается, только если есть разобранные файлы того же размера.
+    """
+    cur = cx.cursor()
+    _ensure_files_table(cur)
+    hashes = {
+        row[0]
+        for row in cur.execute(
+            "SELECT content_hash FROM imported_files WHERE offset = ?;",
+            (size,),
+        )
+    }
+    if not hashes:
+        return None
+    content_hash = fingerprint(path, size)
+    if content_hash not in hashes:
+        return None
+    row = cur.execute(
+        """
+        SELECT size, mtime, offset, content_hash, last_hand_id
+        FROM   imported_files
+        WHERE  content_hash = ? AND offset = ?
+        LIMIT  1;
+        """,
+        (content_hash, size),
+    ).fetchone()
+    return FileState(*row)
+
+
+def save_state(cx: sqlite3.Connection, path: str, state: FileState) -> None:
+    """Запоминает, до какого места файл разобран. Не коммитит."""
+    cur = cx.cursor()
+    _ensure_files_table(cur)
+    cur.execute(
+        """
+        INSERT INTO imported_files (path, size, mtime, offset, content_hash, last_hand_id)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (path) DO UPDATE
+            SET size         = excluded.size,
+                mtime        = excluded.mtime,
+                offset       = excluded.offset,
+                content_hash = excluded.content_hash,
+                last_hand_id = IFNULL(excluded.last_hand_id, last_hand_id);
+        """,
+        (path, *state),
+    )
@@ -0,0 +1,47 @@
+# bbline/database/meta.py
+"""
+db_meta — служебные пары key → value внутри самой базы.
+
+generation — «поколение» данных: растёт на каждом коммите, который меняет
+руки или их агрегаты (импорт HandWriter, rebuild_computed, миграции).
+UI кладёт его в ключ кеша: пока generation тот же, результаты запросов
+можно не пересчитывать.
+"""
+
+import sqlite3
+
+GENERATION = "generation"
+
+
+def _ensure_meta_table(cur: sqlite3.Cursor) -> None:
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS db_meta (
+            key   TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        """
+    )
+
+
+def get_generation(cx: sqlite3.Connection) -> int:
+    """Текущее поколение данных (0 — базу ещё ни разу не меняли через ingest)."""
+    try:
+        # SUM — в шардовом соединении db_meta это view по всем базам
+        row = cx.execute("SELECT SUM(value) FROM db_meta WHERE key = ?;", (GENERATION,)).fetchone()
+    except sqlite3.OperationalError:  # таблицы ещё нет — читаем, не создаём
+        return 0
+    return row[0] or 0
+
+
+def bump_generation(cx: sqlite3.Connection) -> None:
+    """+1 к поколению. Не коммитит — вызывать внутри транзакции, которая меняет данные."""
+    cur = cx.cursor()
+    _ensure_meta_table(cur)
+    cur.execute(
+        """
+        INSERT INTO db_meta (key, value) VALUES (?, 1)
+        ON CONFLICT (key) DO UPDATE SET value = value + 1;
+        """,
+        (GENERATION,),
+    )
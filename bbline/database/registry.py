@@ -0,0 +1,113 @@
+# bbline/database/registry.py
+"""
+Реестр баз BBLine — единственное место, где решается, какой файл открывать.
+
+Откуда берётся (первое, что задано):
+    1. --db у CLI (add_db_argument + configure);
+    2. переменная окружения BBLINE_DB;
+    3. bbline/database/bbline.sqlite.
+
+Значение — путь к одной базе .sqlite или к JSON-реестру шардов:
+    {
+        "write": "2025",
+        "databases": {
+            "2024":     "hh_2024.sqlite",
+            "2025":     "hh_2025.sqlite",
+            "nl25_old": "D:/poker/nl25.sqlite"
+        }
+    }
+Относительные пути считаются от файла реестра. write — куда пишет импорт
+(по умолчанию первая база); читают отчёты все базы сразу (см. connection.py:
+шарды подключаются через ATTACH). --db <имя> оставляет из реестра одну базу.
+
+configure() кладёт выбор в BBLINE_DB, так что его видят и дочерние процессы
+(воркеры импорта, бенчмарки).
+"""
+
+import argparse
+import json
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Tuple
+
+ENV_VAR = "BBLINE_DB"
+DEFAULT_DB = Path(__file__).with_name("bbline.sqlite")
+
+
+class Registry(NamedTuple):
+    databases: Dict[str, Path]  # имя → путь, в порядке из реестра
+    write: str  # имя базы, в которую пишет импорт
+
+    @property
+    def write_path(self) -> Path:
+        return self.databases[self.write]
+
+    @property
+    def read_paths(self) -> Tuple[Path, ...]:
+        """Все базы; база для записи — первой (в ней main при ATTACH)."""
+        rest = [p for name, p in self.databases.items() if name != self.write]
+        return (self.write_path, *rest)
+
+
+def _load_json(path: Path) -> Registry:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    databases = {
+        str(name): (path.parent / p).resolve() for name, p in data.get("databases", {}).items()
+    }
+    if not databases:
+        raise ValueError(f"{path}: в реестре нет ни одной базы (ключ databases)")
+    write = str(data.get("write") or next(iter(databases)))
+    if write not in databases:
+        raise ValueError(f"{path}: write={write!r} нет среди databases")
+    return Registry(databases, write)
+
+
+@lru_cache(maxsize=8)
+def load(spec: Optional[str] = None) -> Registry:
+    """Реестр по значению BBLINE_DB / --db (None — база по умолчанию)."""
+    if not spec:
+        return Registry({DEFAULT_DB.stem: DEFAULT_DB}, DEFAULT_DB.stem)
+    path = Path(spec).expanduser()
+    if path.suffix.lower() == ".json":
+        return _load_json(path.resolve())
+    path = path.resolve()
+    return Registry({path.stem: path}, path.stem)
+
+
+def current() -> Registry:
+    return load(os.environ.get(ENV_VAR) or None)
+
+
+def write_path() -> Path:
+    """База, в которую пишут импорт, rebuild и миграции по умолчанию."""
+    return current().write_path
+
+
+def read_paths() -> Tuple[Path, ...]:
+    """Базы, по которым считаются отчёты (одна или все шарды реестра)."""
+    return current().read_paths
+
+
+def configure(spec: Optional[str]) -> None:
+    """
+    Выбор базы из CLI: путь к .sqlite, путь к JSON-реестру или имя базы
+    из текущего реестра. None — оставить как есть.
+    """
+    if not spec:
+        return
+    named = current().databases.get(spec)
+    if named is not None:
+        os.environ[ENV_VAR] = str(named)
+    else:
+        os.environ[ENV_VAR] = str(Path(spec).expanduser().resolve())
+    current()  # битый реестр — ошибка сразу, а не на первом запросе
+
+
+def add_db_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--db",
+        default=None,
+        help=f"база .sqlite, JSON-реестр шардов или имя базы из реестра (иначе ${ENV_VAR})",
+    )
@@ -0,0 +1,240 @@
+# bbline/export/parquet_export.py
+"""
+Выгрузка рук в Parquet для колоночной аналитики (DuckDB, pandas, Polars).
+
+Запуск:
+    python -m bbline.export.parquet_export <папка> [--full] [--db ...]
+
+Раскладка — Hive-партиции по месяцу и лимиту:
+    <папка>/hands/month=2025-04/limit_bb=0.02/part-<run>.parquet
+    <папка>/actions/month=2025-04/limit_bb=0.02/...
+    ... seats, showdowns, computed_stats — с месяцем и лимитом своей руки.
+Запрос с фильтром по дате / лимиту читает только нужные каталоги.
+
+Инкрементально: в <папка>/_bbline_export.json хранится watermark — для
+каждой базы (шарда) наибольший rowid hands, который уже выгружен. rowid
+растёт в порядке вставки, так что следующий запуск берёт ровно руки,
+вставленные после прошлой выгрузки, — какой бы datetime_utc у них ни был
+(мультитейбл, импорт старых HH, автоимпорт во время выгрузки). Новые
+part-файлы дописываются, старые не трогаются. Все таблицы читаются в одной
+транзакции чтения — рука, вставленная посреди выгрузки, не попадёт в actions
+без своей строки hands. Пересчёт computed_stats (rebuild_computed --full)
+и VACUUM после удаления рук watermark не видит — тогда нужен --full.
+
+Нужен pyarrow (pip install pyarrow); без него модуль импортируется,
+а выгрузка падает с понятной ошибкой.
+"""
+
+import argparse
+import json
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+
+from bbline.database import registry
+from bbline.database.connection import get_connection
+
+TABLES = ("hands", "actions", "seats", "showdowns", "computed_stats")
+PARTITIONS = ("month", "limit_bb")
+MANIFEST = "_bbline_export.json"
+BATCH_ROWS = 100_000  # строк на RecordBatch — память выгрузки не зависит от размера базы
+
+# руки окна (watermark, upper] по rowid одной базы — месяц и лимит дочерние таблицы
+# берут у своей руки; колонки перечислены явно — у старых шардов их может быть больше
+_SQL_HANDS = """
+    SELECT {columns}, SUBSTR(h.datetime_utc, 1, 7) AS month
+    FROM   {schema}.hands h
+    WHERE  h.rowid > ? AND h.rowid <= ?
+"""
+_SQL_CHILD = """
+    SELECT {columns}, SUBSTR(h.datetime_utc, 1, 7) AS month, h.limit_bb
+    FROM   {schema}.{table} c
+    JOIN   {schema}.hands h ON h.hand_id = c.hand_id
+    WHERE  h.rowid > ? AND h.rowid <= ?
+"""
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Для выгрузки в Parquet нужен pyarrow: pip install pyarrow") from e
+    return pa, pq
+
+
+def _arrow_type(pa, decl: str):
+    """Тип колонки по объявленному типу SQLite (правила affinity)."""
+    decl = (decl or "").upper()
+    if "INT" in decl:
+        return pa.int64()
+    if any(t in decl for t in ("REAL", "FLOA", "DOUB")):
+        return pa.float64()
+    return pa.string()
+
+
+def _schema(pa, cx: sqlite3.Connection, table: str):
+    # в шардовом соединении table_info view — общие колонки всех баз
+    fields = [
+        pa.field(name, _arrow_type(pa, decl))
+        for _, name, decl, *_ in cx.execute(f"PRAGMA table_info({table});")
+    ]
+    fields.append(pa.field("month", pa.string()))
+    if table != "hands":
+        fields.append(pa.field("limit_bb", pa.float64()))
+    return pa.schema(fields)
+
+
+def _select_sql(table: str, schema: str, names: List[str]) -> str:
+    """
+    Окно одной базы. names — колонки _schema (общие для всех баз, как у view,
+    и в том же порядке), последние — month и у дочерних таблиц limit_bb руки.
+    """
+    if table == "hands":
+        columns = ", ".join(f'h."{n}"' for n in names[:-1])
+        return _SQL_HANDS.format(columns=columns, schema=schema)
+    columns = ", ".join(f'c."{n}"' for n in names[:-2])
+    return _SQL_CHILD.format(columns=columns, schema=schema, table=table)
+
+
+def _write_table(pa, pq, cursors: Iterable[sqlite3.Cursor], schema, root: Path, run: str) -> int:
+    """
+    Раскладывает строки курсоров (по одному на базу) по каталогам
+    month=…/limit_bb=…: на каждую партицию — один ParquetWriter на запуск,
+    в него пишется пачка за пачкой.
+    Колонки партиций в файлы не попадают (их значения — в имени каталога).
+    """
+    import pyarrow.compute as pc
+
+    names = schema.names
+    data_names = [n for n in names if n not in PARTITIONS]
+    file_schema = pa.schema([schema.field(n) for n in data_names])
+    writers: Dict[Tuple[Any, ...], Any] = {}
+    total = 0
+    batches = (rows for cur in cursors for rows in iter(lambda: cur.fetchmany(BATCH_ROWS), []))
+    try:
+        for rows in batches:
+            total += len(rows)
+            # строки → колонки один раз на пачку, дальше партиции режет arrow
+            batch = pa.RecordBatch.from_arrays(
+                [pa.array(col, type=schema.field(n).type) for n, col in zip(names, zip(*rows))],
+                names=names,
+            )
+            keys = pa.Table.from_batches([batch]).group_by(list(PARTITIONS)).aggregate([])
+            for key in zip(*(keys.column(p).to_pylist() for p in PARTITIONS)):
+                mask = pc.and_(*(pc.equal(batch[p], v) for p, v in zip(PARTITIONS, key)))
+                writer = writers.get(key)
+                if writer is None:
+                    folder = root.joinpath(*(f"{p}={v}" for p, v in zip(PARTITIONS, key)))
+                    folder.mkdir(parents=True, exist_ok=True)
+                    writer = writers[key] = pq.ParquetWriter(
+                        folder / f"part-{run}.parquet", file_schema
+                    )
+                writer.write_batch(batch.filter(mask).select(data_names))
+        return total
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+
+def _load_manifest(out: Path) -> Dict[str, Any]:
+    path = out / MANIFEST
+    if not path.exists():
+        return {"watermark": {}, "rows": {}, "runs": 0}
+    manifest = json.loads(path.read_text(encoding="utf-8"))
+    if not isinstance(manifest["watermark"], dict):
+        # старая выгрузка с watermark по datetime_utc — по rowid её не продолжить
+        raise RuntimeError(f"{path}: выгрузка старого формата — запустите с --full")
+    return manifest
+
+
+def _sources(cx: sqlite3.Connection) -> Dict[str, str]:
+    """Базы соединения с таблицей hands: файл → схема (main, shard1, …)."""
+    return {
+        file: schema
+        for _, schema, file in cx.execute("PRAGMA database_list;")
+        if schema != "temp"
+        and cx.execute(f"PRAGMA {schema}.table_info(hands);").fetchone() is not None
+    }
+
+
+def _save_manifest(out: Path, manifest: Dict[str, Any]) -> None:
+    # через временный файл: упавшая выгрузка не оставит битый manifest
+    tmp = out / (MANIFEST + ".tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp.replace(out / MANIFEST)
+
+
+def export_parquet(out_dir, db_path=None, full: bool = False) -> Dict[str, Any]:
+    """
+    Выгружает руки позже watermark (full=True — всё заново) в out_dir.
+    db_path=None — все базы реестра (шарды сливаются в один набор файлов).
+    Возвращает manifest после выгрузки + rows_added по таблицам.
+    """
+    pa, pq = _require_pyarrow()
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    if full:
+        for table in TABLES:
+            shutil.rmtree(out / table, ignore_errors=True)
+        (out / MANIFEST).unlink(missing_ok=True)
+    manifest = _load_manifest(out)
+
+    cx = get_connection(db_path, readonly=True)
+    added = {table: 0 for table in TABLES}
+    run = datetime.now().strftime("%Y%m%d%H%M%S%f")
+    # одна транзакция чтения: все таблицы видят один и тот же снимок каждой базы
+    cx.execute("BEGIN;")
+    try:
+        windows = {}  # схема → (watermark, upper] по rowid hands
+        for file, schema in _sources(cx).items():
+            upper = cx.execute(f"SELECT MAX(rowid) FROM {schema}.hands;").fetchone()[0] or 0
+            low = manifest["watermark"].get(file, 0)
+            if upper < low:
+                raise RuntimeError(f"{file}: rowid hands ниже watermark (VACUUM?) — нужен --full")
+            if upper > low:
+                windows[schema] = (file, low, upper)
+        if not windows:
+            return {**manifest, "rows_added": added}
+
+        for table in TABLES:
+            schema = _schema(pa, cx, table)
+            cursors = (
+                cx.execute(_select_sql(table, name, schema.names), (low, upper))
+                for name, (_, low, upper) in windows.items()
+            )
+            # новые part-файлы рядом со старыми — прошлые запуски не переписываются
+            added[table] = _write_table(pa, pq, cursors, schema, out / table, run)
+            manifest["rows"][table] = manifest["rows"].get(table, 0) + added[table]
+    finally:
+        cx.rollback()  # только читали
+
+    manifest.update(
+        watermark={**manifest["watermark"], **{f: up for f, _, up in windows.values()}},
+        runs=manifest["runs"] + 1,
+        updated=datetime.now().isoformat(timespec="seconds"),
+        source=[str(p) for p in ([Path(db_path)] if db_path else registry.read_paths())],
+    )
+    _save_manifest(out, manifest)
+    return {**manifest, "rows_added": added}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Выгрузка рук BBLine в Parquet (месяц × лимит)")
+    parser.add_argument("out", type=Path, help="папка для Parquet")
+    parser.add_argument("--full", action="store_true", help="выгрузить всё заново")
+    registry.add_db_argument(parser)
+    args = parser.parse_args()
+    registry.configure(args.db)
+
+    t0 = time.perf_counter()
+    res = export_parquet(args.out, full=args.full)
+    added = res["rows_added"]
+    if not any(added.values()):
+        print(f"Новых рук нет (выгрузок: {res['runs']})")
+    else:
+        print(f"✅  {args.out}: " + ", ".join(f"{t} +{n}" for t, n in added.items()))
+        print(f"выгрузка №{res['runs']} · {time.perf_counter() - t0:.1f} с")
@@ -1,23 +1,85 @@
-import sqlite3
+import math
+from typing import Optional, Tuple
+
 import pandas as pd
-from bbline.utils import get_hand_ids, DB_PATH, _pos_from_seats  # Изменены импорты
+from bbline.analysis.rollup import rollup_counters
+from bbline.database.connection import get_connection, is_sharded
+from bbline.utils import hand_filter_sql, DB_PATH
+
+PAGE_SIZE = 50
+
+# сортировка → выражение. Ключ страницы = (выражение, datetime_utc, hand_id),
+# поэтому NULL подменяем: сравнение кортежей с NULL ломает keyset.
+SORTS = {
+    "date": None,  # по самим (datetime_utc, hand_id) — идёт по idx_hands_datetime
+    "profit": "IFNULL(h.hero_net, 0)",
+    "limit": "h.limit_bb",
+}
+
+_UI_COLUMNS = {
+    "date": "Дата",
+    "hand_id": "HandID",
+    "hole_cards": "Карты",
+    "board": "Борд",
+    "$": "Профит $",
+    "bb": "Профит bb",
+    "pos": "Позиция",
+    "limit_bb": "Лимит",
+}
+
+
+def count_hands(
+    date_from: str | None = None,
+    date_to: str | None = None,
+    limits: list[float] | None = None,
+    positions: list[str] | None = None,
+) -> int:
+    """Сколько рук под фильтры — суммой по daily_rollup, без прохода по hands."""
+    with get_connection(DB_PATH, readonly=True) as cx:
+        where, params = hand_filter_sql(date_from, date_to, limits, positions, "r", by_day=True)
+        return rollup_counters(cx.cursor(), where, params)["hands"] or 0
+
+
+def page_count(total: int, page_size: int = PAGE_SIZE) -> int:
+    return max(1, math.ceil(total / page_size))
 
 
-def fetch_hands_df(
+def fetch_hands_page(
     date_from: str | None = None,
     date_to: str | None = None,
     limits: list[float] | None = None,
     positions: list[str] | None = None,
-) -> pd.DataFrame:
-    """Возвращает DataFrame со всеми нужными колонками под UI-таблицу."""
-    with sqlite3.connect(DB_PATH) as cx:
-        cur = cx.cursor()
-        hand_ids = get_hand_ids(cur, date_from, date_to, limits, positions)
-        if not hand_ids:
-            return pd.DataFrame()
+    sort: str = "date",
+    descending: bool = True,
+    after: Optional[tuple] = None,
+    page_size: int = PAGE_SIZE,
+) -> Tuple[pd.DataFrame, Optional[tuple]]:
+    """
+    Одна страница UI-таблицы рук (keyset-пагинация, без OFFSET).
 
-        ph = ",".join("?" * len(hand_ids))
-        rows = cur.execute(
+    after — ключ, который вернул вызов для предыдущей страницы (None — первая).
+    Возвращает (DataFrame страницы, ключ для следующей | None, если это последняя).
+    """
+    if sort not in SORTS:
+        raise ValueError(f"Неизвестная сортировка: {sort}")
+    expr = SORTS[sort]
+    key_cols = ([expr] if expr else []) + ["h.datetime_utc", "h.hand_id"]
+    direction = "DESC" if descending else "ASC"
+
+    where, params = hand_filter_sql(date_from, date_to, limits, positions)
+    if after is not None:
+        if len(after) != len(key_cols):
+            raise ValueError(f"Ключ страницы не подходит к сортировке {sort}: {after}")
+        where += f" AND ({', '.join(key_cols)}) {'<' if descending else '>'} "
+        where += f"({', '.join('?' * len(key_cols))})"
+        params = [*params, *after]
+
+    with get_connection(DB_PATH, readonly=True) as cx:
+        # по дате планировщик иначе берёт индекс позиции и сортирует все руки
+        # под фильтр, а по idx_hands_datetime страница читается сразу
+        # (у шардов hands — view, подсказка индекса к нему не применима)
+        indexed = "INDEXED BY idx_hands_datetime" if expr is None and not is_sharded(cx) else ""
+        rows = cx.execute(
             f"""
             SELECT  h.hand_id,
                     SUBSTR(h.datetime_utc, 1, 10)        AS date,
@@ -26,16 +88,24 @@ def fetch_hands_df(
                     h.hero_net          AS profit_usd,
                     h.net_bb            AS profit_bb,
                     h.limit_bb,
-                    h.hero_seat, h.button_seat
-            FROM    hands h
-            WHERE   h.hand_id IN ({ph})
-            ORDER BY h.datetime_utc DESC
+                    h.hero_position     AS pos,
+                    {", ".join(key_cols)}
+            FROM    hands h {indexed}
+            WHERE   {where}
+            ORDER BY {", ".join(f"{c} {direction}" for c in key_cols)}
+            LIMIT   ?
             """,
-            hand_ids,
+            [*params, page_size + 1],
         ).fetchall()
 
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+    next_key = tuple(rows[-1][8:]) if has_next else None
+    if not rows:
+        return pd.DataFrame(), None
+
     df = pd.DataFrame(
-        rows,
+        [r[:8] for r in rows],
         columns=[
             "hand_id",
             "date",
@@ -44,28 +114,14 @@ def fetch_hands_df(
             "$",
             "bb",
             "limit_bb",
-            "hero_seat",
-            "button_seat",
+            "pos",
         ],
     )
-    # маппинг позиции
-    df["pos"] = df.apply(
-        lambda r: _pos_from_seats(int(r["hero_seat"]), int(r["button_seat"])), axis=1
-    )
     # косметика/порядок
     df = df[["date", "hand_id", "hole_cards", "board", "$", "bb", "pos", "limit_bb"]].rename(
-        columns={
-            "date": "Дата",
-            "hand_id": "HandID",
-            "hole_cards": "Карты",
-            "board": "Борд",
-            "$": "Профит $",
-            "bb": "Профит bb",
-            "pos": "Позиция",
-            "limit_bb": "Лимит",
-        }
+        columns=_UI_COLUMNS
     )
     # округление
     df["Профит $"] = df["Профит $"].round(2)
     df["Профит bb"] = df["Профит bb"].round(1)
-    return df
+    return df, next_key
@@ -1,24 +1,295 @@
 """
 batch_import.py — пакетный импорт HH в базу BBLine
 Запуск:
-    python -m bbline.ingest.batch_import <папка_с_HH> [--ext .txt]
+    python -m bbline.ingest.batch_import [<папка_с_HH>] [--ext .txt] [--workers N]
 По дефолту импортит все .txt из указанной папки.
 
 Важно:
 - Игнорирует файлы, которые уже были импортированы (по hand_id).
+- Ведёт imported_files: файл без изменений пропускается по size/mtime
+  без чтения, дописанный — читается с прошлого offset, копия уже
+  импортированного файла — пропускается по хешу содержимого.
+- Читает только целые раздачи: недописанная рука в конце файла сессии
+  остаётся за offset до следующего запуска. Файл, который давно не
+  менялся (или --final), читается до конца — последняя рука без пустой
+  строки после неё тоже импортируется. Если раздачи файла не
+  распарсились или не вставились, offset не сохраняется и файл не удаляется.
 - После каждого файла пишет короткий итог.
 - Можно использовать для ежедневного/массового импорта архивов.
 - Удаляет файлы после успешного импорта.
+- --workers N > 1: парсинг идёт пачками раздач в пуле процессов,
+  а в SQLite пишет только главный процесс (один writer).
+- Вместо строки на каждую руку — строка прогресса раз в пару секунд.
+- computed_stats, daily_rollup, combo_rollup, player_stats и board_features
+  новых рук считаются одним проходом в конце импорта (HandWriter deferred):
+  до его конца новые руки в отчётах не видны.
+- --metrics: время по стадиям (чтение, нарезка, парсинг, дубли, вставка,
+  commit) с p50/p95/p99 — таблица в конце и JSON (--metrics-json файл).
 """
 
-import sys
+import argparse
+import codecs
 import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from pathlib import Path
-from bbline.parse.hand_parser import parse_file
-from bbline.database.db_utils import insert_hand
+from typing import Any, BinaryIO, Deque, Dict, Iterator, List, Optional, Tuple
 
+from bbline.parse.hand_parser import iter_raw_hands, parse_raw_hands
+from bbline.database import registry
+from bbline.database.db_utils import HandWriter
+from bbline.database.imported_files import (
+    FileState,
+    find_copy,
+    load_states,
+    prefix_hasher,
+    resume_point,
+    save_state,
+)
+from bbline.ingest.metrics import IngestMetrics, ProgressLine
 
-def batch_import(folder, ext=".txt", db_path=None):
+# Прописываем папку с раздачами на постоянку
+DEFAULT_FOLDER = r"C:\Users\GameBase\BBLine\bbline\assets\raw"
+
+CHUNK_HANDS = 500  # сколько сырых раздач отдаём воркеру за раз
+READ_BUFFER = 1 << 20
+
+# раздачи в файле GG разделены пустой строкой (в конце файла — обычно тоже)
+HAND_ENDS = (b"\n\n", b"\n\r\n")
+# файл, который столько секунд не менялся, клиент уже не пишет: конец файла — граница руки
+SETTLED_AFTER = 600
+
+# (файл, пачка раздач | None = конец файла, нераспарсенных раздач в пачке, ошибка файла | None)
+FileEvent = Tuple[Path, Optional[List[Dict[str, Any]]], int, Optional[Exception]]
+# (файл, с какого байта читать, до какого, хешер уже прочитанного — см. imported_files)
+FileSpan = Tuple[Path, int, int, Any]
+ParsedChunk = Tuple[List[Dict[str, Any]], List[str], Optional[List[float]]]
+
+
+def _read_lines(f: BinaryIO, limit: int, metrics: IngestMetrics, hasher: Any) -> Iterator[str]:
+    """
+    Строки из следующих limit байт файла. Читаем ровно limit: всё, что
+    дописано после stat, подхватит следующий импорт с сохранённого offset.
+    Каждый блок уходит и в hasher — content_hash файла без второго чтения.
+    Чтение блоками по READ_BUFFER (с декодированием) замеряется как стадия read.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    tail = ""
+    while limit > 0:
+        t0 = time.perf_counter()
+        block = f.read(min(READ_BUFFER, limit))
+        if not block:
+            break
+        limit -= len(block)
+        hasher.update(block)
+        text = decoder.decode(block, final=limit <= 0)
+        metrics.add("read", time.perf_counter() - t0, nbytes=len(block))
+        lines = (tail + text).split("\n")
+        tail = lines.pop()
+        yield from lines
+    if tail:
+        yield tail
+
+
+def _raw_chunks(span: FileSpan, chunk_hands: int, metrics: IngestMetrics) -> Iterator[List[str]]:
+    """Сырые раздачи из куска файла пачками по chunk_hands; нарезка замеряется как split."""
+    file, start, end, hasher = span
+    with open(file, "rb") as f:
+        f.seek(start)
+        raws = iter_raw_hands(_read_lines(f, end - start, metrics, hasher))
+        chunk: List[str] = []
+        while True:
+            t0, read0 = time.perf_counter(), metrics.seconds("read")
+            raw = next(raws, None)
+            if raw is None:
+                break
+            # чтение блока случается внутри next() — его время уже ушло в read
+            split = time.perf_counter() - t0 - (metrics.seconds("read") - read0)
+            metrics.add("split", split, hands=1)
+            chunk.append(raw)
+            if len(chunk) >= chunk_hands:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def _parse_chunk(raw_hands: List[str], timed: bool) -> ParsedChunk:
+    """parse_raw_hands + время на каждую раздачу (если timed) — для воркеров пула."""
+    timings: Optional[List[float]] = [] if timed else None
+    parsed, errors = parse_raw_hands(raw_hands, timings)
+    return parsed, errors, timings
+
+
+def _record_parsed(result: ParsedChunk, metrics: IngestMetrics) -> Tuple[List[Dict[str, Any]], int]:
+    """(раздачи, сколько раздач пачки не распарсилось)."""
+    hands, errors, timings = result
+    for seconds in timings or ():
+        metrics.add("parse", seconds, hands=1)
+    metrics.error("parse", len(errors))
+    for msg in errors:
+        print(msg)
+    return hands, len(errors)
+
+
+def _parse_sequential(
+    spans: List[FileSpan], chunk_hands: int, metrics: IngestMetrics
+) -> Iterator[FileEvent]:
+    """Однопроцессный режим: те же пачки, что и для пула, но парсятся на месте."""
+    for span in spans:
+        file = span[0]
+        try:
+            for chunk in _raw_chunks(span, chunk_hands, metrics):
+                yield file, *_record_parsed(_parse_chunk(chunk, metrics.enabled), metrics), None
+        except Exception as e:
+            metrics.error("read")
+            yield file, None, 0, e
+            continue
+        yield file, None, 0, None
+
+
+def _drain_one(
+    pending: Deque[Tuple[Path, Optional[Future], Optional[Exception]]], metrics: IngestMetrics
+) -> FileEvent:
+    file, fut, err = pending.popleft()
+    if fut is None:
+        return file, None, 0, err
+    t0 = time.perf_counter()
+    try:
+        result = fut.result()
+    except Exception as e:  # упал воркер — ошибка только этого файла
+        metrics.error("parse")
+        return file, None, 0, e
+    metrics.add("wait", time.perf_counter() - t0, hands=len(result[0]))
+    return file, *_record_parsed(result, metrics), None
+
+
+def _parse_parallel(
+    spans: List[FileSpan],
+    pool: ProcessPoolExecutor,
+    chunk_hands: int,
+    max_pending: int,
+    metrics: IngestMetrics,
+) -> Iterator[FileEvent]:
+    """
+    Режет файлы на пачки сырых раздач и парсит их в пуле процессов.
+    Результаты отдаются строго в порядке файлов; в полёте не больше
+    max_pending пачек, так что память ограничена.
+    """
+    pending: Deque[Tuple[Path, Optional[Future], Optional[Exception]]] = deque()
+    for span in spans:
+        file = span[0]
+        try:
+            for chunk in _raw_chunks(span, chunk_hands, metrics):
+                pending.append((file, pool.submit(_parse_chunk, chunk, metrics.enabled), None))
+                while len(pending) >= max_pending:
+                    yield _drain_one(pending, metrics)
+            pending.append((file, None, None))  # маркер конца файла
+        except Exception as e:
+            metrics.error("read")
+            pending.append((file, None, e))
+        while len(pending) >= max_pending:
+            yield _drain_one(pending, metrics)
+    while pending:
+        yield _drain_one(pending, metrics)
+
+
+def _complete_end(file: Path, start: int, end: int, final: bool = False) -> int:
+    """
+    Конец последней целой раздачи в [start, end) — как watch.read_complete_hands:
+    файл сессии GG ещё может дописываться, недописанная рука останется за offset
+    и прочитается следующим импортом. start — целых раздач нет.
+    final — файл больше не пишется: последняя рука без пустой строки после неё
+    тоже целая, читаем до end.
+    Ищем с конца блоками по READ_BUFFER — весь файл не читается.
+    """
+    if final:
+        return end
+    with open(file, "rb") as f:
+        pos = end
+        while pos > start:
+            lo = max(start, pos - READ_BUFFER)
+            f.seek(lo)
+            data = f.read(min(end, pos + 2) - lo)  # +2 байта: разделитель на стыке блоков
+            cut = max((data.rfind(sep) + len(sep) for sep in HAND_ENDS if sep in data), default=0)
+            if cut:
+                return lo + cut
+            pos = lo
+    return start
+
+
+def _plan_files(
+    cx: sqlite3.Connection, files: List[Path], final: bool = False
+) -> Tuple[List[FileSpan], Dict[Path, os.stat_result], int]:
+    """
+    Сверяет файлы с imported_files: что читать и с какого до какого байта.
+    Возвращает (куски к разбору, stat каждого такого файла, сколько пропущено).
+    Пропущенные без изменений файлы стоят один stat — содержимое не читается.
+    Кусок кончается на последней целой раздаче (_complete_end); у файлов,
+    которые не менялись SETTLED_AFTER секунд (или final=True), — на конце файла.
+    """
+    now = time.time()
+    states = load_states(cx)
+    spans: List[FileSpan] = []
+    stats: Dict[Path, os.stat_result] = {}
+    unchanged = 0
+    for file in files:
+        st = file.stat()
+        key = str(file.resolve())
+        state = states.get(key)
+        settled = final or now - st.st_mtime >= SETTLED_AFTER
+        point = resume_point(file, st, state)
+        if point is None and settled and state.offset < st.st_size:
+            # хвост без пустой строки ждал дописывания, а файл затих — дочитываем его
+            point = state.offset, prefix_hasher(file, state.offset)
+        if state is None:
+            # новый путь — может, это копия уже импортированного файла
+            copy = find_copy(cx, file, st.st_size)
+            if copy is not None:
+                state = FileState(st.st_size, st.st_mtime, st.st_size, copy.content_hash)
+                save_state(cx, key, state)
+                point = None
+        end = _complete_end(file, point[0], st.st_size, settled) if point is not None else None
+        if point is not None and end == point[0]:
+            # новых целых раздач нет (файл «потрогали» или рука ещё дописывается)
+            if state is not None:
+                save_state(cx, key, state._replace(size=st.st_size, mtime=st.st_mtime))
+            point = None
+        if point is None:
+            unchanged += 1
+            continue
+        spans.append((file, point[0], end, point[1]))
+        stats[file] = st
+    cx.commit()
+    return spans, stats, unchanged
+
+
+def _save_file_state(
+    cx: sqlite3.Connection,
+    file: Path,
+    st: os.stat_result,
+    end: int,
+    content_hash: str,
+    last_hand_id: Optional[str],
+) -> None:
+    """Файл разобран до end (последняя целая раздача) — фиксируем в imported_files."""
+    state = FileState(st.st_size, st.st_mtime, end, content_hash, last_hand_id)
+    save_state(cx, str(file.resolve()), state)
+    cx.commit()
+
+
+def batch_import(
+    folder,
+    ext=".txt",
+    db_path=None,
+    workers=1,
+    chunk_hands=CHUNK_HANDS,
+    batch_size=1000,
+    metrics=None,
+    final=False,
+):
     """
     Импортирует файлы с историей рук в базу данных.
 
@@ -26,65 +297,181 @@ def batch_import(folder, ext=".txt", db_path=None):
         folder (str): Путь к папке с файлами
         ext (str): Расширение файлов для импорта
         db_path (str): Путь к базе данных
+        workers (int): Кол-во процессов для парсинга (1 — без пула)
+        chunk_hands (int): Размер пачки раздач для одного воркера
+        batch_size (int): Сколько рук писать в БД одной транзакцией
+        metrics (IngestMetrics): Куда писать замеры по стадиям (None — не мерить)
+        final (bool): Файлы больше не дописываются — последняя рука без пустой
+            строки в конце тоже импортируется (иначе так читаются только файлы,
+            не менявшиеся SETTLED_AFTER секунд)
+
+    Returns:
+        IngestMetrics: те же замеры (пустые, если metrics не передан)
     """
+    metrics = metrics if metrics is not None else IngestMetrics(enabled=False)
     folder = Path(folder)
-    files = list(folder.glob(f"*{ext}"))
+    files = sorted(folder.glob(f"*{ext}"))
     if not files:
         print(f"[!] Нет файлов с расширением {ext} в {folder}")
-        return
+        return metrics
 
     total, skipped, imported = 0, 0, 0
     deleted_files = 0
+    per_file: Dict[Path, List[int]] = {}  # файл -> [новых, дублей]
+    failed = set()
+    progress = ProgressLine()
+    files_done = set()  # файл может прийти и с ошибкой, и с маркером конца
+    last_ids: Dict[Path, str] = {}  # файл -> hand_id последней разобранной раздачи
+    file_stats: Dict[Path, os.stat_result] = {}
+    file_ends: Dict[Path, int] = {}  # файл -> до какого байта разбираем
+    hashers: Dict[Path, Any] = {}  # файл -> хешер [0, конец прочитанного)
+    lost: Dict[Path, int] = {}  # файл -> раздач, не распарсенных или не вставленных
+    insert_failed = 0  # writer.stats["failed"] на конец прошлого файла
 
-    for file in files:
-        file_imported, file_skipped = 0, 0
-        try:
-            hands = parse_file(str(file))
+    def count(counts: List[int], results) -> None:
+        nonlocal total, skipped, imported
+        for _hand_id, res in results:
+            total += 1
+            if res:
+                imported += 1
+                counts[0] += 1
+            else:
+                skipped += 1
+                counts[1] += 1
+        progress.update(
+            рук=total, новых=imported, дублей=skipped, файлов=f"{len(files_done)}/{len(file_stats)}"
+        )
+
+    def flush_file(file: Path, counts: List[int], writer: HandWriter) -> None:
+        """Дописывает хвост файла; упавшие при вставке раздачи — в lost."""
+        nonlocal insert_failed
+        count(counts, writer.flush())
+        # буфер writer'а сбрасывается в конце каждого файла — все его раздачи уже записаны
+        failed_now = int(writer.stats["failed"])
+        lost[file] = lost.get(file, 0) + failed_now - insert_failed
+        insert_failed = failed_now
+
+    def consume(events: Iterator[FileEvent], writer: HandWriter) -> None:
+        nonlocal deleted_files
+        for file, hands, bad, err in events:
+            if hands is None:
+                files_done.add(file)
+            if err is not None:
+                print(f"[ERR] Не удалось разобрать {file}: {err}")
+                flush_file(file, per_file.pop(file, [0, 0]), writer)
+                failed.add(file)
+                continue
+            if file in failed:
+                continue
+
+            counts = per_file.setdefault(file, [0, 0])
+            lost[file] = lost.get(file, 0) + bad
+            if hands is None:
+                # конец файла: дописываем его хвост; offset в imported_files и удаление —
+                # только если все раздачи дошли до базы, иначе упавшие пропустились бы навсегда
+                flush_file(file, counts, writer)
+                per_file.pop(file, None)
+                if lost[file]:
+                    print(
+                        f"[ERR] {file.name}: не импортировано раздач — {lost[file]}, "
+                        "offset не сохраняем"
+                    )
+                    continue
+                _save_file_state(
+                    writer.cx,
+                    file,
+                    file_stats[file],
+                    file_ends[file],
+                    hashers[file].hexdigest(),  # кусок дочитан — хеш покрывает [0, конец)
+                    last_ids.get(file),
+                )
+                complete = file_ends[file] == file_stats[file].st_size  # хвост не дописан — ждём
+                if complete and counts[0] > 0 and counts[1] == 0:
+                    try:
+                        os.remove(file)
+                        deleted_files += 1
+                        print(f"✅ Файл {file.name} успешно импортирован и удален")
+                    except Exception as e:
+                        print(f"[ERR] Не удалось удалить файл {file}: {e}")
+                continue
 
             for hand in hands:
-                total += 1
-                try:
-                    res = insert_hand(hand)
-                    status = "OK" if res else "dup"
-                    print(f"  {hand['hand_id']} ... {status}")
-                    if res:
-                        imported += 1
-                        file_imported += 1
-                    else:
-                        skipped += 1
-                        file_skipped += 1
-                except Exception as e:
-                    print(f"[ERR] Не удалось вставить {hand.get('hand_id')} — {e}")
-
-            # Удаляем файл только если в этом конкретном файле не было дублей
-            if file_imported > 0 and file_skipped == 0:
-                try:
-                    os.remove(file)
-                    deleted_files += 1
-                    print(f"✅ Файл {file.name} успешно импортирован и удален")
-                except Exception as e:
-                    print(f"[ERR] Не удалось удалить файл {file}: {e}")
+                count(counts, writer.add(hand))
+            if hands:
+                last_ids[file] = hands[-1]["hand_id"]
 
-        except Exception as e:
-            print(f"[ERR] Не удалось разобрать {file}: {e}")
-            continue
+    def stage_hook(stage: str, seconds: float, hands: int) -> None:
+        metrics.add(stage, seconds, hands=hands)
+
+    hook = stage_hook if metrics.enabled else None
+    # агрегаты — одним проходом в конце импорта (HandWriter.finish), а не в каждой пачке
+    with HandWriter(db_path, batch_size=batch_size, stage_hook=hook, deferred=True) as writer:
+        spans, stats, unchanged = _plan_files(writer.cx, files, final)
+        file_stats.update(stats)
+        file_ends.update((file, end) for file, _, end, _ in spans)
+        hashers.update((file, h) for file, _, _, h in spans)
+        if workers > 1 and spans:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                events = _parse_parallel(spans, pool, chunk_hands, workers * 4, metrics)
+                consume(events, writer)
+        else:
+            consume(_parse_sequential(spans, chunk_hands, metrics), writer)
+    metrics.error("insert", int(writer.stats["failed"]))
 
     print("\n=== Batch импорт завершён ===")
     print(
         f"Итого файлов: {len(files)} | Рук всего: {total} | Новых: {imported} | "
         f"Пропущено (уже в базе): {skipped} | Удалено файлов: {deleted_files}"
     )
+    print(f"Файлов без изменений (не читались): {unchanged}")
+    print(f"Запись в БД: {writer.hands_per_sec} рук/сек")
+    return metrics
 
 
 if __name__ == "__main__":
-    # if len(sys.argv) < 2:
-    #     print("Используй: python -m bbline.ingest.batch_import <папка_с_HH> [--ext .txt]")
-    #     sys.exit(1)
-    folder = (
-        r"C:\Users\GameBase\BBLine\bbline\assets\raw"  # Прописываем папку с раздачами на постоянку
+    parser = argparse.ArgumentParser(description="Пакетный импорт HH в базу BBLine")
+    parser.add_argument("folder", nargs="?", default=DEFAULT_FOLDER, help="папка с HH")
+    parser.add_argument("--ext", default=".txt", help="расширение файлов (по умолчанию .txt)")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="кол-во процессов для парсинга (0 — по числу ядер, 1 — без пула)",
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=1000, help="рук на одну транзакцию (по умолчанию 1000)"
+    )
+    parser.add_argument(
+        "--final",
+        action="store_true",
+        help="файлы закрыты: импортировать и последнюю руку без пустой строки в конце",
+    )
+    parser.add_argument(
+        "--metrics", action="store_true", help="замеры по стадиям: таблица и JSON в конце"
+    )
+    parser.add_argument(
+        "--metrics-json", type=Path, default=None, help="куда сохранить JSON замеров"
+    )
+    registry.add_db_argument(parser)
+    args = parser.parse_args()
+    registry.configure(args.db)
+
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    metrics = IngestMetrics(enabled=args.metrics or args.metrics_json is not None)
+    # db_path=None → база для записи из реестра (--db / BBLINE_DB)
+    batch_import(
+        args.folder,
+        args.ext,
+        workers=workers,
+        batch_size=args.batch_size,
+        metrics=metrics,
+        final=args.final,
     )
-    ext = ".txt"
-    db_path = str(Path(__file__).resolve().parents[2] / "database" / "bbline.sqlite")
-    if len(sys.argv) > 2 and sys.argv[2].startswith("--ext"):
-        ext = sys.argv[2].split("=")[-1]
-    batch_import(folder, ext, db_path=db_path)
+    if metrics.enabled:
+        print("\n=== Замеры по стадиям ===")
+        print(metrics.table())
+        if args.metrics_json:
+            args.metrics_json.write_text(metrics.to_json(), encoding="utf-8")
+            print(f"JSON: {args.metrics_json}")
+        else:
+            print(metrics.to_json())
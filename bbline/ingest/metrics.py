@@ -0,0 +1,172 @@
+"""
+metrics.py — замеры импорта по стадиям (включаются флагом --metrics).
+
+Стадии (в порядке пайплайна):
+    read    — чтение файла блоками (bytes);
+    split   — нарезка на сырые раздачи (iter_raw_hands);
+    parse   — parse_hand, на раздачу (при --workers > 1 — время внутри воркеров);
+    wait    — главный процесс ждёт пачку от пула воркеров;
+    dedup   — поиск уже импортированных hand_id;
+    insert  — executemany по hands / seats / actions / …;
+    compute — computed_stats + daily_rollup новых рук;
+    commit  — COMMIT транзакции.
+
+На каждую стадию — счётчики (вызовов, рук, байт, ошибок), суммарное время
+и логарифмическая гистограмма латентности вызова (p50 / p95 / p99).
+Память не зависит от числа рук: храним только корзины гистограммы.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import sys
+import time
+from typing import Any, Dict, Optional, TextIO
+
+STAGES = ("read", "split", "parse", "wait", "dedup", "insert", "compute", "commit")
+
+
+class Histogram:
+    """Логарифмическая гистограмма: PER_OCTAVE корзин на каждое удвоение, от 1 мкс."""
+
+    PER_OCTAVE = 4  # погрешность квантиля — до ~19%
+
+    def __init__(self) -> None:
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        us = seconds * 1e6
+        b = 0 if us <= 1 else int(math.log2(us) * self.PER_OCTAVE) + 1
+        self.buckets[b] = self.buckets.get(b, 0) + 1
+        self.count += 1
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Верхняя граница корзины, в которую попал q-квантиль (секунды)."""
+        if not self.count:
+            return 0.0
+        target, acc = q * self.count, 0
+        for b in sorted(self.buckets):
+            acc += self.buckets[b]
+            if acc >= target:
+                return min(2 ** (b / self.PER_OCTAVE) / 1e6, self.max)
+        return self.max
+
+
+class _Stage:
+    __slots__ = ("calls", "hands", "bytes", "errors", "seconds", "hist")
+
+    def __init__(self) -> None:
+        self.calls = self.hands = self.bytes = self.errors = 0
+        self.seconds = 0.0
+        self.hist = Histogram()
+
+
+class IngestMetrics:
+    """
+    Счётчики и гистограммы импорта по стадиям.
+
+    enabled=False — все методы ничего не делают, так что код импорта
+    дёргает их без проверок, а без --metrics платит пару вызовов на руку.
+
+    Пример:
+        m = IngestMetrics()
+        m.add("parse", 0.0002, hands=1)
+        print(m.table())
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.stages: Dict[str, _Stage] = {}
+        self.started = time.perf_counter()
+
+    def add(self, stage: str, seconds: float, hands: int = 0, nbytes: int = 0) -> None:
+        """Один вызов стадии: сколько длился и сколько рук / байт через него прошло."""
+        if not self.enabled:
+            return
+        st = self.stages.get(stage)
+        if st is None:
+            st = self.stages[stage] = _Stage()
+        st.calls += 1
+        st.hands += hands
+        st.bytes += nbytes
+        st.seconds += seconds
+        st.hist.add(seconds)
+
+    def error(self, stage: str, n: int = 1) -> None:
+        if not self.enabled or not n:
+            return
+        st = self.stages.get(stage)
+        if st is None:
+            st = self.stages[stage] = _Stage()
+        st.errors += n
+
+    def seconds(self, stage: str) -> float:
+        st = self.stages.get(stage)
+        return st.seconds if st is not None else 0.0
+
+    # ------------------------------------------------------------ отчёт
+    def report(self) -> Dict[str, Any]:
+        wall = time.perf_counter() - self.started
+        order = [s for s in STAGES if s in self.stages] + [
+            s for s in self.stages if s not in STAGES
+        ]
+        stages = {}
+        for name in order:
+            st = self.stages[name]
+            stages[name] = {
+                "calls": st.calls,
+                "hands": st.hands,
+                "bytes": st.bytes,
+                "errors": st.errors,
+                "seconds": round(st.seconds, 4),
+                "p50_ms": round(st.hist.quantile(0.50) * 1000, 4),
+                "p95_ms": round(st.hist.quantile(0.95) * 1000, 4),
+                "p99_ms": round(st.hist.quantile(0.99) * 1000, 4),
+                "max_ms": round(st.hist.max * 1000, 4),
+            }
+        return {"wall_seconds": round(wall, 3), "stages": stages}
+
+    def to_json(self) -> str:
+        return json.dumps(self.report(), ensure_ascii=False, indent=2)
+
+    def table(self) -> str:
+        rep = self.report()
+        wall = rep["wall_seconds"] or 1.0
+        head = (
+            f"{'стадия':<8} {'вызовов':>8} {'рук':>9} {'МБ':>7} {'ошибок':>6} "
+            f"{'сек':>8} {'%':>5} {'p50 мс':>8} {'p95 мс':>8} {'p99 мс':>8}"
+        )
+        lines = [head, "-" * len(head)]
+        for name, s in rep["stages"].items():
+            lines.append(
+                f"{name:<8} {s['calls']:>8} {s['hands']:>9} {s['bytes'] / 2**20:>7.1f} "
+                f"{s['errors']:>6} {s['seconds']:>8.2f} {100 * s['seconds'] / wall:>5.1f} "
+                f"{s['p50_ms']:>8.3f} {s['p95_ms']:>8.3f} {s['p99_ms']:>8.3f}"
+            )
+        lines.append(f"всего: {rep['wall_seconds']} с")
+        return "\n".join(lines)
+
+
+class ProgressLine:
+    """
+    Строка прогресса вместо print на каждую руку: не чаще раза в every секунд.
+    На больших импортах построчный вывод сам съедал заметную часть времени.
+    """
+
+    def __init__(self, every: float = 2.0, stream: Optional[TextIO] = None) -> None:
+        self.every = every
+        self.stream = stream or sys.stdout
+        self.started = self._last = time.perf_counter()
+
+    def update(self, force: bool = False, **counters: Any) -> None:
+        now = time.perf_counter()
+        if not force and now - self._last < self.every:
+            return
+        self._last = now
+        rate = counters.get("рук", 0) / (now - self.started) if now > self.started else 0.0
+        body = " · ".join(f"{k} {v}" for k, v in counters.items())
+        print(f"  … {body} · {rate:,.0f} рук/с".replace(",", " "), file=self.stream, flush=True)
@@ -0,0 +1,223 @@
+"""
+watch.py — фоновый автоимпорт: следит за папкой HH и дописывает новые руки в базу.
+Запуск:
+    python -m bbline.ingest.watch [<папка_с_HH>] [--interval 0.5] [--backend poll|watchdog]
+
+▪ GG дописывает раздачи в открытый файл сессии — для каждого файла помним
+  байтовый offset (таблица imported_files) и читаем только хвост после него;
+▪ берём только целые раздачи: хвост режется по последней пустой строке,
+  недописанная рука подождёт следующего прохода;
+▪ пишет HandWriter — computed_stats, daily_rollup и generation обновляются
+  в той же транзакции, дашборд видит руку сразу после commit;
+▪ poll — опрос size/mtime раз в interval секунд; watchdog (если установлен) —
+  будит сразу по событию ФС, опрос остаётся страховкой;
+▪ файлы не удаляются — в них ещё пишет клиент.
+
+Падение между commit рук и commit offset безопасно: при рестарте хвост
+перечитается, а уже вставленные руки уйдут в дубли (INSERT OR IGNORE).
+По той же причине, если раздача не распарсилась или не вставилась (например,
+«database is locked»), offset файла не сохраняется — хвост повторится на следующем проходе.
+"""
+
+import argparse
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from bbline.database import registry
+from bbline.database.db_utils import HandWriter
+from bbline.database.imported_files import (
+    FileState,
+    load_states,
+    resume_point,
+    save_state,
+)
+from bbline.ingest.batch_import import DEFAULT_FOLDER
+from bbline.parse.hand_parser import iter_raw_hands, parse_raw_hands
+
+POLL_INTERVAL = 0.5  # сек — задержка «рука сыграна → рука в базе» не больше этого + парсинг
+MAX_READ = 16 << 20  # за один заход читаем не больше 16 МБ хвоста
+_HAND_ENDS = (b"\n\n", b"\n\r\n")  # раздачи в файле GG разделены пустой строкой
+
+
+def read_complete_hands(path: Path, offset: int, hasher: Any = None) -> Tuple[List[str], int]:
+    """
+    Целые раздачи, дописанные в файл после offset.
+    Возвращает (сырые раздачи, новый offset); если целых раздач нет — ([], offset).
+    hasher (см. imported_files.resume_point) дополняется взятыми байтами.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(MAX_READ)
+    cut = 0
+    for sep in _HAND_ENDS:
+        i = data.rfind(sep)
+        if i >= 0:
+            cut = max(cut, i + len(sep))
+    if not cut:
+        return [], offset
+    if hasher is not None:
+        hasher.update(data[:cut])
+    # в начале файла может стоять BOM
+    text = data[:cut].decode("utf-8-sig" if offset == 0 else "utf-8", errors="replace")
+    raws = [raw for raw in iter_raw_hands(text.splitlines()) if raw.strip()]
+    return raws, offset + cut
+
+
+class FolderWatcher:
+    """
+    Состояние автоимпорта: открытый HandWriter и offsets файлов.
+    Соединение открывается при первом проходе — в том потоке, где крутится run().
+
+    Пример:
+        w = FolderWatcher("C:/HH")
+        w.poll()        # один проход
+        w.run()         # до Ctrl+C
+    """
+
+    def __init__(self, folder, ext=".txt", db_path=None, batch_size=1000):
+        self.folder = Path(folder)
+        self.ext = ext
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.writer: Optional[HandWriter] = None
+        self.states: Dict[str, FileState] = {}
+        self.inserted = 0
+
+    def _open(self) -> HandWriter:
+        if self.writer is None:
+            self.writer = HandWriter(self.db_path, batch_size=self.batch_size)
+            self.states = load_states(self.writer.cx)
+        return self.writer
+
+    def poll(self) -> int:
+        """Один проход по папке. Возвращает, сколько новых рук вставлено."""
+        self._open()
+        inserted = 0
+        entries = sorted(os.scandir(self.folder), key=lambda e: e.name)
+        for entry in entries:
+            if not entry.is_file() or not entry.name.endswith(self.ext):
+                continue
+            st = entry.stat()
+            key = str(Path(entry.path).resolve())
+            # не менялся → None; дописан → offset; подменён или новый → 0
+            point = resume_point(Path(entry.path), st, self.states.get(key))
+            if point is None:
+                continue
+            inserted += self._tail(key, Path(entry.path), *point, st)
+        self.inserted += inserted
+        return inserted
+
+    def _tail(self, key: str, path: Path, offset: int, hasher: Any, st: os.stat_result) -> int:
+        t0 = time.perf_counter()
+        inserted = 0
+        last_hand_id = None
+        while True:
+            raws, new_offset = read_complete_hands(path, offset, hasher)
+            if new_offset == offset:
+                break
+            hands, errors = parse_raw_hands(raws)
+            for msg in errors:
+                print(msg)
+            failed = self.writer.stats["failed"]
+            results = []
+            for hand in hands:
+                results.extend(self.writer.add(hand))
+                last_hand_id = hand["hand_id"]
+            results.extend(self.writer.flush())
+            inserted += sum(1 for _, ok in results if ok)
+            lost = len(errors) + int(self.writer.stats["failed"] - failed)
+            if lost:
+                # offset не двигаем и не сохраняем: следующий проход перечитает кусок,
+                # уже вставленные руки уйдут в дубли, упавшие получат ещё попытку
+                print(f"[ERR] {path.name}: не импортировано раздач — {lost}, повторим")
+                return inserted
+            offset = new_offset
+
+        # size/mtime — те, что видели до чтения: если файл рос во время
+        # чтения, следующий проход заметит разницу и дочитает хвост
+        state = FileState(st.st_size, st.st_mtime, offset, hasher.hexdigest(), last_hand_id)
+        save_state(self.writer.cx, key, state)
+        self.writer.cx.commit()
+        self.states[key] = state
+        if inserted:
+            ms = (time.perf_counter() - t0) * 1000
+            print(f"[{datetime.now():%H:%M:%S}] +{inserted} рук из {path.name} ({ms:.0f} мс)")
+        return inserted
+
+    def run(
+        self,
+        interval: float = POLL_INTERVAL,
+        backend: str = "poll",
+        stop: Optional[threading.Event] = None,
+    ) -> None:
+        """Крутится, пока не выставят stop (или до Ctrl+C)."""
+        stop = stop or threading.Event()
+        wake = threading.Event()
+        observer = _start_observer(self.folder, wake) if backend == "watchdog" else None
+        try:
+            while not stop.is_set():
+                self.poll()
+                # с watchdog будят события ФС, опрос — редкая страховка
+                wake.wait(interval if observer is None else max(interval, 5.0))
+                wake.clear()
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+            self.close()
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+def _start_observer(folder: Path, wake: threading.Event):
+    """inotify / ReadDirectoryChangesW через watchdog; None — если пакета нет."""
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+    except ImportError:
+        print("[!] watchdog не установлен — остаюсь на опросе папки")
+        return None
+
+    class _Wake(FileSystemEventHandler):
+        def on_any_event(self, event) -> None:
+            wake.set()
+
+    observer = Observer()
+    observer.schedule(_Wake(), str(folder), recursive=False)
+    observer.start()
+    return observer
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Автоимпорт HH из папки в базу BBLine")
+    parser.add_argument("folder", nargs="?", default=DEFAULT_FOLDER, help="папка с HH")
+    parser.add_argument("--ext", default=".txt", help="расширение файлов (по умолчанию .txt)")
+    parser.add_argument(
+        "--interval", type=float, default=POLL_INTERVAL, help="период опроса папки, сек"
+    )
+    parser.add_argument("--backend", choices=["poll", "watchdog"], default="poll")
+    parser.add_argument("--batch-size", type=int, default=1000, help="рук на одну транзакцию")
+    parser.add_argument("--once", action="store_true", help="один проход и выход")
+    registry.add_db_argument(parser)
+    args = parser.parse_args()
+    registry.configure(args.db)
+
+    watcher = FolderWatcher(args.folder, args.ext, batch_size=args.batch_size)
+    if args.once:
+        try:
+            print(f"Новых рук: {watcher.poll()}")
+        finally:
+            watcher.close()
+    else:
+        print(f"👀 Слежу за {watcher.folder} (Ctrl+C — выход)")
+        try:
+            watcher.run(args.interval, args.backend)
+        except KeyboardInterrupt:
+            print(f"\nВсего за сессию: {watcher.inserted} рук")
@@ -1,17 +1,126 @@
+import argparse
 import datetime as dt
 import streamlit as st
 import pandas as pd
-import sqlite3
 import json
-from bbline.dashboard_data import get_dashboard_stats, get_profit_by_date
-from bbline.utils import DB_PATH, _pos_from_seats
-from bbline.analysis.leakfinder import run_leakfinder, get_example_hands
-from bbline.hands_table import fetch_hands_df
-from bbline.replayer.replay_one import display_hand_replay
+from bbline.dashboard_data import (
+    get_dashboard_stats,
+    get_profit_by_date,
+    get_range_grid,
+    range_grid_frame,
+)
+from bbline.utils import DB_PATH, hand_filter_sql
+from bbline.analysis.leakfinder import run_leakfinder, get_example_hands, save_leak_tags
+from bbline.hands_table import count_hands, fetch_hands_page, page_count
+from bbline.replayer.replay_one import display_hand_replay, hand_picker
 from bbline.export.json_export import get_hand_compact
+from bbline.database import registry
+from bbline.database.connection import get_connection
+from bbline.database.meta import get_generation
+from bbline.analysis import duckdb_backend
+
+# BBLINE_PARQUET=<папка parquet_export> — сканы по рукам (лик-файндер) считает DuckDB;
+# дашборд и график остаются на daily_rollup: точечное чтение rollup быстрее любого скана
+if duckdb_backend.enabled():
+    from bbline.analysis.duckdb_backend import run_leakfinder  # noqa: F811
 
 st.set_page_config(page_title="BBLine Poker", layout="wide")
 
+# streamlit run bbline/main.py -- --db shards.json   (иначе BBLINE_DB / база по умолчанию)
+_db_parser = argparse.ArgumentParser(add_help=False)
+registry.add_db_argument(_db_parser)
+registry.configure(_db_parser.parse_known_args()[0].db)
+
+# --- кеш запросов -----------------------------------------------------------
+# Ключ кеша = (функция, фильтры, generation). generation растёт при каждом
+# импорте / rebuild_computed (см. database/meta.py), поэтому перезапуск
+# скрипта без новых рук в базу не ходит. На функцию держим не больше
+# CACHE_ENTRIES результатов — самые давно использованные выкидываются.
+CACHE_ENTRIES = 32
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def cached_limits(generation: int) -> list:
+    with get_connection(DB_PATH, readonly=True) as cx:
+        return sorted({row[0] for row in cx.execute("SELECT DISTINCT limit_bb FROM hands")})
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def cached_dashboard_stats(generation: int, date_from, date_to, limits, positions) -> dict:
+    return get_dashboard_stats(
+        date_from=date_from, date_to=date_to, limits=limits, positions=positions
+    )
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def cached_profit_by_date(generation: int, date_from, date_to, limits, positions) -> tuple:
+    return get_profit_by_date(
+        date_from=date_from, date_to=date_to, limits=limits, positions=positions
+    )
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def cached_range_grid(generation: int, limits, positions) -> dict:
+    return get_range_grid(limits=limits, positions=positions)
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def cached_leaks(generation: int, date_from, date_to, limits, positions) -> list:
+    # только чтение: запись в tags внутри кеша случалась бы лишь на промахах,
+    # теги пишет кнопка примеров (save_leak_tags) — явно и под текущие фильтры
+    return run_leakfinder(
+        date_from=date_from, date_to=date_to, limits=limits, positions=positions, save_tags=False
+    )
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def cached_hands_count(generation: int, date_from, date_to, limits, positions) -> int:
+    return count_hands(date_from=date_from, date_to=date_to, limits=limits, positions=positions)
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def cached_hands_page(
+    generation: int, date_from, date_to, limits, positions, sort, descending, after, page_size
+) -> tuple:
+    return fetch_hands_page(
+        date_from=date_from,
+        date_to=date_to,
+        limits=limits,
+        positions=positions,
+        sort=sort,
+        descending=descending,
+        after=after,
+        page_size=page_size,
+    )
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def cached_last_hand_ids(generation: int, date_from, date_to, limits, positions) -> list:
+    # Последние 20 раздач под фильтры — позиция фильтруется прямо в SQL
+    where, params = hand_filter_sql(date_from, date_to, limits, positions)
+    with get_connection(DB_PATH, readonly=True) as cx:
+        return [
+            row[0]
+            for row in cx.execute(
+                f"""
+                SELECT h.hand_id
+                FROM hands h
+                WHERE {where}
+                ORDER BY h.datetime_utc DESC
+                LIMIT 20
+                """,
+                params,
+            )
+        ]
+
+
+# одно чтение db_meta на перезапуск скрипта
+with get_connection(DB_PATH, readonly=True) as cx:
+    generation = get_generation(cx)
+if duckdb_backend.enabled():
+    # Parquet меняется только новой выгрузкой — её версия тоже в ключе кеша
+    generation = (generation, *duckdb_backend.data_version())
+
 # --- sidebar фильтры --------------------------------------------------------
 st.sidebar.header("Фильтры")
 
@@ -21,8 +130,7 @@ date_from = date_col1.date_input("c", value=dt.date(2025, 1, 1))
 date_to = date_col2.date_input("по", value=dt.date.today())
 
 # 2. лимиты (подтянем distinct из БД)
-with sqlite3.connect(DB_PATH) as cx:
-    limits = sorted({row[0] for row in cx.execute("SELECT DISTINCT limit_bb FROM hands")})
+limits = cached_limits(generation)
 limit_sel = st.sidebar.multiselect("Лимиты (bb)", limits, default=limits)
 
 # 3. позиции hero
@@ -39,7 +147,8 @@ query_hand_id = st.query_params.get("hand_id", None)
 
 with tab1:
     # --- собираем стату ---------------------------------------------------------
-    stats = get_dashboard_stats(
+    stats = cached_dashboard_stats(
+        generation,
         date_from=str(date_from),
         date_to=str(date_to),
         limits=limit_sel,
@@ -66,7 +175,8 @@ with tab1:
     st.markdown("---")
     st.header("Динамика профита по датам")
 
-    dates, profit_usd = get_profit_by_date(
+    dates, profit_usd = cached_profit_by_date(
+        generation,
         date_from=str(date_from),
         date_to=str(date_to),
         limits=limit_sel,
@@ -85,6 +195,16 @@ with tab1:
         c1, c2 = st.columns(2)
         c1.line_chart(df.set_index("Дата")["Профит $"])
 
+    st.markdown("---")
+    st.header("Сетка рук 13×13")
+    # combo_rollup хранит суммы без дат — сетка за всё время по лимитам / позициям
+    grid = cached_range_grid(generation, limits=limit_sel, positions=pos_sel)
+    metric = st.radio(
+        "Метрика", ["bb/100", "VPIP", "PFR", "Hands"], horizontal=True, key="grid_metric"
+    )
+    st.caption("Одномастные — выше диагонали, разномастные — ниже; за всё время.")
+    st.dataframe(range_grid_frame(grid, metric))
+
     # =========================
     # Debug (можно убрать)
     # =========================
@@ -96,12 +216,12 @@ with tab2:
     st.header("🚨 LeakFinder Lite")
 
     # Получаем утечки с учетом фильтров
-    leaks = run_leakfinder(
+    leaks = cached_leaks(
+        generation,
         date_from=str(date_from),
         date_to=str(date_to),
         limits=limit_sel,
         positions=pos_sel,
-        save_tags=True,
     )
 
     if not leaks:
@@ -124,6 +244,8 @@ with tab2:
                     f"Показать примеры ({lk['name']})", key=f"examples_{lk['name']}"
                 )
                 if show_examples:
+                    # примеры берутся из tags — сначала помечаем руки этого лика
+                    save_leak_tags([lk], str(date_from), str(date_to), limit_sel, pos_sel)
                     examples = get_example_hands(lk["name"], n=5, order="loss")
                     if not examples:
                         st.info("Нет подходящих рук для примера.")
@@ -147,46 +269,64 @@ with tab2:
 
 with tab3:
     st.header("📋 Список всех рук")
-    hands_df = fetch_hands_df(
-        date_from=str(date_from),
-        date_to=str(date_to),
-        limits=limit_sel,
-        positions=pos_sel,
+    sort_col, order_col, size_col = st.columns([2, 2, 1])
+    sort_labels = {"date": "Дата", "profit": "Профит", "limit": "Лимит"}
+    sort = sort_col.selectbox(
+        "Сортировка", list(sort_labels), format_func=sort_labels.get, key="hands_sort"
+    )
+    descending = order_col.radio(
+        "Порядок",
+        [True, False],
+        format_func=lambda d: "↓ убыв." if d else "↑ возр.",
+        horizontal=True,
+        key="hands_desc",
+    )
+    page_size = size_col.selectbox("Рук на стр.", [25, 50, 100, 200], index=1, key="hands_size")
+
+    # Keyset-пагинация: храним ключи начала открытых страниц (None — первая).
+    # Новые фильтры / сортировка — снова с первой страницы.
+    view = (str(date_from), str(date_to), tuple(limit_sel), tuple(pos_sel), sort, descending)
+    view += (page_size,)
+    if st.session_state.get("hands_view") != view:
+        st.session_state["hands_view"] = view
+        st.session_state["hands_keys"] = [None]
+    page_keys = st.session_state["hands_keys"]
+
+    total = cached_hands_count(generation, str(date_from), str(date_to), limit_sel, pos_sel)
+    hands_df, next_key = cached_hands_page(
+        generation,
+        str(date_from),
+        str(date_to),
+        limit_sel,
+        pos_sel,
+        sort,
+        descending,
+        page_keys[-1],
+        page_size,
     )
     if not hands_df.empty:
-        # Делаем HandID кликабельным в DataFrame
-        hands_df["HandID"] = hands_df["HandID"].apply(lambda x: f"[{x}](?hand_id={x})")
+        # Делаем HandID кликабельным (на странице — не больше page_size строк)
+        hands_df = hands_df.assign(HandID=hands_df["HandID"].map(lambda x: f"[{x}](?hand_id={x})"))
         st.dataframe(hands_df, hide_index=True)
+
+        prev_col, info_col, next_col = st.columns([1, 3, 1])
+        info_col.caption(
+            f"Страница {len(page_keys)} из {page_count(total, page_size)} · рук: {total}"
+        )
+        if prev_col.button("← Назад", disabled=len(page_keys) == 1, key="hands_prev"):
+            page_keys.pop()
+            st.rerun()
+        if next_col.button("Вперёд →", disabled=next_key is None, key="hands_next"):
+            page_keys.append(next_key)
+            st.rerun()
     else:
         st.info("Нет рук для отображения по выбранным фильтрам.")
 
 with tab4:
     st.header("🂡 Реплеер раздач")
-    # Получаем список всех hand_id для селектора
-    with sqlite3.connect(DB_PATH) as cx:
-        cur = cx.cursor()
-        all_hand_ids = [
-            row[0]
-            for row in cur.execute(
-                "SELECT hand_id FROM hands ORDER BY datetime_utc DESC"
-            ).fetchall()
-        ]
-
-    # Определяем выбранный hand_id: из query_params или из селектора
-    if query_hand_id and query_hand_id in all_hand_ids:
-        # Если hand_id пришел из URL, выбираем его в селекторе
-        selected_hand_id_index = all_hand_ids.index(query_hand_id)
-        selected_hand_id = st.selectbox(
-            "Выбери раздачу", all_hand_ids, index=selected_hand_id_index, key="replayer_select_box"
-        )
-    else:
-        # Иначе используем первый или None
-        selected_hand_id = st.selectbox(
-            "Выбери раздачу",
-            all_hand_ids,
-            index=0 if all_hand_ids else None,
-            key="replayer_select_box",
-        )
+    # Поиск по началу hand_id + последние раздачи; ?hand_id= из ссылки —
+    # одна выборка по индексу, без списка всех рук
+    selected_hand_id = hand_picker(key="replayer", deep_link=query_hand_id)
 
     if selected_hand_id:
         display_hand_replay(selected_hand_id)
@@ -196,31 +336,7 @@ with tab4:
 with tab5:
     st.header("📤 Экспорт раздач в JSON")
 
-    # Получаем список последних раздач с учетом фильтров
-    with sqlite3.connect(DB_PATH) as cx:
-        # Сначала получаем все раздачи с учетом дат и лимитов
-        query = """
-            SELECT h.hand_id, h.hero_seat, h.button_seat
-            FROM hands h
-            WHERE date(h.datetime_utc) BETWEEN ? AND ?
-            AND h.limit_bb IN ({})
-            ORDER BY h.datetime_utc DESC 
-            LIMIT 100
-        """.format(
-            ",".join("?" * len(limit_sel))
-        )
-
-        params = [str(date_from), str(date_to)] + limit_sel
-        rows = cx.execute(query, params).fetchall()
-
-        # Фильтруем по позициям в Python
-        hand_ids = []
-        for row in rows:
-            pos = _pos_from_seats(row[1], row[2])  # hero_seat, button_seat
-            if pos in pos_sel:
-                hand_ids.append(row[0])
-            if len(hand_ids) >= 20:  # Ограничиваем количество раздач
-                break
+    hand_ids = cached_last_hand_ids(generation, str(date_from), str(date_to), limit_sel, pos_sel)
 
     if not hand_ids:
         st.info("Нет раздач для отображения по выбранным фильтрам.")
@@ -6,16 +6,22 @@ GGPoker HH → dict по схемам BBLine.
 ▪ для скорости и простоты — чистые regex + state-machine
 
 ⚠️  MVP: hero_net считается по строкам «collected / won / lost» в SUMMARY
-    • EV-diff, Uncalled bet, All-in не трекаются (ещё не реализовано)
+    • стеки мест ведутся от seats.chips по ходу руки: олл-ин — «and is all-in»
+      или ставка на весь остаток; Uncalled bet возвращается в стек владельца
+    • руки с олл-ином получают side_pots: основной и побочные банки с претендентами
+    • hero_ev_diff пишет analysis/allin_ev.py
 """
 
 import re
+import time
 from datetime import datetime, timezone
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Iterable, Iterator, Optional
 from collections import defaultdict
-from pathlib import Path
 import sqlite3
 
+from bbline.database import registry
+from bbline.database.connection import connect
+
 
 # ---------- компилируем часто используемые regex'ы ----------
 RE_HAND_START = re.compile(
@@ -47,6 +53,7 @@ RE_ACTION = re.compile(
     r"|(?P<calls>calls) \$?(?P<call_amt>\d+\.\d+)"
     r"|(?P<folds>folds)"
     r"|(?P<checks>checks))"
+    r"(?P<allin> and is all-in)?"
 )
 RE_SUMMARY_SHOW = re.compile(
     r"^Seat\s+(?P<seat>\d+):\s+(?P<player>.+?)\s+.*?showed\s+\[(?P<card1>\w{2})\s+(?P<card2>\w{2})\]"
@@ -64,6 +71,12 @@ RE_SEAT_COLLECTED = re.compile(
     r"^Seat\s+(?P<seat>\d+):\s+(?P<player>[^(]+?)\s*(\([^)]+\))?\s*collected\s+\(\$(?P<amt>\d+\.\d+)\)"
 )
 RE_SEAT_WON = re.compile(r"^Seat\s+\d+:\s+(?P<player>.+?)\s+won\s+\(\$(?P<amt>\d+\.\d+)\)")
+# «p: shows [Ah Kd]» и «Seat 2: p showed [Ah Kd] and won …»
+RE_SHOWDOWN_LINE = re.compile(
+    r"(?:Seat\s+(?P<seat>\d+):\s+)?(?P<player>\S+).*?show(?:ed|s)\s+\[(?P<card1>\w{2})\s+(?P<card2>\w{2})\]"
+)
+
+CHIP_EPS = 0.005  # полцента: суммы в HH — до центов, остаток стека меньше — это ноль
 
 
 # ------------------------------------------------------------
@@ -75,18 +88,26 @@ def normalize_player_name(name: str) -> str:
     return name
 
 
-def split_raw_hands(text: str) -> List[str]:
-    """Разделяет текст с историями раздач на отдельные раздачи."""
-    out, buf = [], []
-    for line in text.splitlines():
+def iter_raw_hands(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Потоково режет строки HH на отдельные раздачи по границе «Poker Hand #».
+    В памяти держит только текущую раздачу — подходит для файлов в несколько ГБ.
+    """
+    buf: List[str] = []
+    for line in lines:
+        line = line.rstrip("\r\n")
         if line.startswith("Poker Hand #") and buf:
-            out.append("\n".join(buf))
+            yield "\n".join(buf)
             buf = [line]
         else:
             buf.append(line)
     if buf:
-        out.append("\n".join(buf))
-    return out
+        yield "\n".join(buf)
+
+
+def split_raw_hands(text: str) -> List[str]:
+    """Разделяет текст с историями раздач на отдельные раздачи."""
+    return list(iter_raw_hands(text.splitlines()))
 
 
 def parse_seat_block(
@@ -109,65 +130,184 @@ def parse_seat_block(
     return seat_map_name_to_num, seats, seat_map_num_to_name
 
 
+def position_from_seats(seat_no: int, button_seat: int, seat_nos: Iterable[int]) -> Optional[str]:
+    """
+    Позиция места seat_no (BTN / SB / BB / EP / MP / CO) по реальному числу
+    игроков за столом, а не по 6-max.
+
+    Места идут по часовой от баттона: BTN, SB, BB, дальше EP…, MP…, CO.
+    Между BB и CO поровну EP и MP (при нечётном — на один EP больше):
+    6-max → EP, MP, CO;  9-max → EP, EP, EP, MP, MP, CO.
+    Хедз-ап: баттон — SB, второй — BB.
+    None — если место/баттон неизвестны (-1) или баттона нет среди игроков.
+    """
+    seats = set(seat_nos)
+    if seat_no not in seats or button_seat not in seats:
+        return None
+    # по часовой, начиная с баттона
+    wrap = max(seats) + 1
+    ordered = sorted(seats, key=lambda s: (s - button_seat) % wrap)
+    i = ordered.index(seat_no)
+    if len(ordered) == 2:
+        return "SB" if i == 0 else "BB"
+    if i < 3:
+        return ("BTN", "SB", "BB")[i]
+    middle = len(ordered) - 4  # места между BB и CO
+    if i == len(ordered) - 1:
+        return "CO"
+    return "EP" if i - 3 < (middle + 1) // 2 else "MP"
+
+
+COMBO_RANKS = "AKQJT98765432"  # старшие первыми — порядок строк/столбцов сетки 13×13
+
+
+def hero_combo(cards: Optional[str]) -> Optional[str]:
+    """
+    Клетка сетки 13×13 для карманных карт: '5s9s' → '95s', 'KdAh' → 'AKo', 'AhAd' → 'AA'.
+    None — карт нет или строка не из двух карт.
+    """
+    if not cards or len(cards) != 4:
+        return None
+    r1, s1, r2, s2 = cards[0].upper(), cards[1], cards[2].upper(), cards[3]
+    if r1 not in COMBO_RANKS or r2 not in COMBO_RANKS:
+        return None
+    if COMBO_RANKS.index(r1) > COMBO_RANKS.index(r2):
+        r1, r2 = r2, r1
+    if r1 == r2:
+        return r1 + r2
+    return r1 + r2 + ("s" if s1.lower() == s2.lower() else "o")
+
+
 def utc_iso(date_str: str, time_str: str) -> str:
     """Преобразует дату и время из истории раздачи в формат ISO 8601 UTC."""
     dt = datetime.strptime(f"{date_str} {time_str}", "%Y/%m/%d %H:%M:%S")
     return dt.replace(tzinfo=timezone.utc).isoformat(timespec="seconds")
 
 
+def _parse_action_line(
+    ln: str,
+    seat_map: Dict[str, int],
+    street: str,
+    order_no: int,
+    street_commit: Dict[str, float],
+    stacks: Optional[Dict[int, float]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Одно действие из строки (None — не действие); street_commit — ставки на улице.
+    stacks — остаток стека по местам: ставка из него вычитается, олл-ин —
+    суффикс «and is all-in» или ставка, после которой стек пуст.
+    """
+    m = RE_ACTION.match(ln)
+    if not m:
+        return None
+    player = normalize_player_name(m.group("player"))
+    act: str | None = None
+    amount: float | None = None
+
+    if m.group("posts"):
+        act = "POST_" + m.group("blind_type").upper() + "_BLIND"
+        amount = float(m.group("post_amt"))
+        street_commit[player] += amount
+    elif m.group("bets"):
+        act = "BET"
+        amount = float(m.group("bet_amt"))
+        street_commit[player] += amount
+    elif m.group("raises"):
+        act = "RAISE"
+        raise_to = float(m.group("raise_to"))
+        amount = raise_to - street_commit[player]
+        street_commit[player] = raise_to
+    elif m.group("calls"):
+        act = "CALL"
+        amount = float(m.group("call_amt"))
+        street_commit[player] += amount
+    elif m.group("folds"):
+        act = "FOLD"
+    elif m.group("checks"):
+        act = "CHECK"
+
+    if not act:
+        return None
+    seat_no = seat_map.get(player, -1)
+    allin = m.group("allin") is not None
+    if stacks is not None and amount and seat_no in stacks:
+        stacks[seat_no] -= amount
+        allin = allin or stacks[seat_no] < CHIP_EPS
+    return {
+        "street": street,
+        "order_no": order_no,
+        "seat_no": seat_no,
+        "act": act,
+        "amount": amount,
+        "allin": int(allin),
+    }
+
+
 def parse_actions(
-    action_lines: List[str], seat_map: Dict[str, int], street: str, order_start: int
+    action_lines: List[str],
+    seat_map: Dict[str, int],
+    street: str,
+    order_start: int,
+    stacks: Optional[Dict[int, float]] = None,
 ) -> Tuple[List[Dict[str, Any]], int]:
-    """Парсит строки действий игроков на определенной улице."""
+    """
+    Парсит строки действий игроков на определенной улице.
+    stacks — остатки стеков с прошлых улиц (меняются на месте), см. _parse_action_line.
+    """
     actions: List[Dict[str, Any]] = []
     order_no = order_start
-    street_commit = defaultdict(float)
+    street_commit: Dict[str, float] = defaultdict(float)
 
     for ln in action_lines:
-        m = RE_ACTION.match(ln)
-        if not m:
-            continue
-        player = normalize_player_name(m.group("player"))
-        act: str | None = None
-        amount: float | None = None
-
-        if m.group("posts"):
-            act = "POST_" + m.group("blind_type").upper() + "_BLIND"
-            amount = float(m.group("post_amt"))
-            street_commit[player] += amount
-        elif m.group("bets"):
-            act = "BET"
-            amount = float(m.group("bet_amt"))
-            street_commit[player] += amount
-        elif m.group("raises"):
-            act = "RAISE"
-            raise_to = float(m.group("raise_to"))
-            amount = raise_to - street_commit[player]
-            street_commit[player] = raise_to
-        elif m.group("calls"):
-            act = "CALL"
-            amount = float(m.group("call_amt"))
-            street_commit[player] += amount
-        elif m.group("folds"):
-            act = "FOLD"
-        elif m.group("checks"):
-            act = "CHECK"
-
-        if act:
-            actions.append(
-                {
-                    "street": street,
-                    "order_no": order_no,
-                    "seat_no": seat_map.get(player, -1),
-                    "act": act,
-                    "amount": amount,
-                    "allin": 0,
-                }
-            )
+        action = _parse_action_line(ln, seat_map, street, order_no, street_commit, stacks)
+        if action:
+            actions.append(action)
             order_no += 1
     return actions, order_no
 
 
+def side_pots(
+    invested: Dict[int, float], live: Iterable[int]
+) -> List[Tuple[float, Tuple[int, ...]]]:
+    """
+    Основной и побочные банки: [(сумма, места-претенденты), …] от основного.
+    invested — вложено за руку (несколлированное уже вычтено), live — места,
+    не сбросившие карты; деньги сбросивших уходят в банки своего уровня.
+    """
+    live = [s for s in live if s in invested]
+    levels = sorted({invested[s] for s in live})
+    pots: List[Tuple[float, Tuple[int, ...]]] = []
+    prev = 0.0
+    for level in levels:
+        amount = sum(min(c, level) - min(c, prev) for c in invested.values())
+        eligible = tuple(s for s in live if invested[s] >= level - CHIP_EPS)
+        if amount > CHIP_EPS:
+            pots.append((round(amount, 2), eligible))
+        prev = level
+    # сбросивший вложил больше любого из оставшихся — его остаток в последний банк
+    dead = sum(max(0.0, c - prev) for c in invested.values())
+    if dead > CHIP_EPS and pots:
+        amount, eligible = pots[-1]
+        pots[-1] = (round(amount + dead, 2), eligible)
+    return pots
+
+
+def _hand_side_pots(
+    seats: List[Dict[str, Any]], stacks: Dict[int, float], actions: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """Банки руки с олл-ином (иначе банк один — не храним): вложено = стек на старте − остаток."""
+    if not any(a["allin"] for a in actions):
+        return []
+    invested = {s["seat_no"]: s["chips"] - stacks[s["seat_no"]] for s in seats}
+    invested = {seat: amt for seat, amt in invested.items() if amt > CHIP_EPS}
+    folded = {a["seat_no"] for a in actions if a["act"] == "FOLD"}
+    live = sorted(seat for seat in invested if seat not in folded)
+    return [
+        {"pot_no": i, "amount": amount, "seats": list(eligible)}
+        for i, (amount, eligible) in enumerate(side_pots(invested, live))
+    ]
+
+
 def calculate_invested_voluntarily(actions: list[dict], hero_seat: int) -> float:
     """
     Считает добровольно вложенные Hero деньги (CALL, BET, RAISE).
@@ -212,6 +352,10 @@ def parse_hand(raw: str) -> dict:
     Парсит одну HH в словарь.
     hero_invested — добровольные вложения (без блайндов).
     hero_net — полный профит Hero (с учётом блайндов, для bb/100).
+
+    Один проход по строкам: дешёвая проверка префикса / подстроки решает,
+    какой regex вообще запускать. Сами regex'ы и порядок их проверки — те же,
+    что при полном переборе, так что результат не зависит от классификатора.
     """
     hero_uncalled = 0.0
     hero_collected = 0.0
@@ -228,56 +372,63 @@ def parse_hand(raw: str) -> dict:
     bb = float(m_header.group("bb"))
     date_iso = utc_iso(m_header.group("date"), m_header.group("time"))
 
-    m_btn_info = next((RE_TABLE_BUTTON.match(ln) for ln in lines if "button" in ln.lower()), None)
-    button_seat = int(m_btn_info.group("button")) if m_btn_info else -1
-
-    first_action_or_cards_idx = next(
-        (i for i, ln in enumerate(lines) if RE_POST_BLIND.match(ln) or "*** HOLE CARDS ***" in ln),
-        len(lines),
-    )
-    seat_block_lines = lines[2:first_action_or_cards_idx]
-    seat_map_name_to_num, seats_info, seat_map_num_to_name = parse_seat_block(seat_block_lines)
-
-    hero_player_key: str | None = None
+    hero_player_key = "Hero"
     hero_seat = -1
-    for s_entry in seats_info:
-        if s_entry["player_id"] == "Hero":
-            hero_player_key = "Hero"
-            hero_seat = s_entry["seat_no"]
-            break
-    if hero_player_key is None:
-        hero_player_key = "Hero"
-
+    button_seat: int | None = None  # None — строки с «button» ещё не было
     hero_cards_str: str | None = None
-    for ln in lines:
-        m_hero_cards = RE_DEALT_HERO.match(ln)
-        if m_hero_cards:
-            hero_cards_str = m_hero_cards.group("card1") + m_hero_cards.group("card2")
+    total_pot_val, rake_val, jackpot_val = None, 0.0, 0.0
+    pot_found = False
+
+    # места — строки с 3-й до первого блайнда / *** HOLE CARDS ***; это шапка
+    # из нескольких строк, а карта мест нужна целиком до разбора остального
+    seat_map_name_to_num: Dict[str, int] = {}
+    seats_info: List[Dict[str, Any]] = []
+    for line_idx, ln in enumerate(lines):
+        if "*** HOLE CARDS ***" in ln or (": posts " in ln and RE_POST_BLIND.match(ln)):
             break
+        if line_idx >= 2 and ln.startswith("Seat "):
+            m_seat = RE_SEAT.match(ln)
+            if m_seat:
+                seat_no = int(m_seat.group("seat"))
+                player = normalize_player_name(m_seat.group("player"))
+                seat_map_name_to_num[player] = seat_no
+                seats_info.append(
+                    {"seat_no": seat_no, "player_id": player, "chips": float(m_seat.group("stack"))}
+                )
+                if player == hero_player_key and hero_seat == -1:
+                    hero_seat = seat_no
 
     all_actions: List[Dict[str, Any]] = []
     showdown_entries: List[Dict[str, Any]] = []
     board_cards_by_street: Dict[str, List[str]] = {"FLOP": [], "TURN": [], "RIVER": []}
     current_street_state = "PREFLOP"
     action_order_no = 0
-    current_street_lines: List[str] = []
-
-    RE_SHOWDOWN_LINE = re.compile(
-        r"(?:Seat\s+(?P<seat>\d+):\s+)?(?P<player>\S+).*?show(?:ed|s)\s+\[(?P<card1>\w{2})\s+(?P<card2>\w{2})\]"
-    )
+    street_commit: Dict[str, float] = defaultdict(float)
+    stacks = {s_entry["seat_no"]: s_entry["chips"] for s_entry in seats_info}
 
-    for line_idx, ln in enumerate(lines):
+    for ln in lines:
+        # ---- баттон, карты Hero, итог банка: первая подходящая строка ----
+        if button_seat is None and "button" in ln.lower():
+            m_btn_info = RE_TABLE_BUTTON.match(ln)
+            button_seat = int(m_btn_info.group("button")) if m_btn_info else -1
+
+        if hero_cards_str is None and ln.startswith("Dealt to Hero ["):
+            m_hero_cards = RE_DEALT_HERO.match(ln)
+            if m_hero_cards:
+                hero_cards_str = m_hero_cards.group("card1") + m_hero_cards.group("card2")
+
+        if not pot_found and "Total pot" in ln:
+            m_total_pot_info = RE_TOTAL_POT.search(ln)
+            if m_total_pot_info:
+                pot_found = True
+                total_pot_val = float(m_total_pot_info.group("total"))
+                rake_val = float(m_total_pot_info.group("rake"))
+                if m_total_pot_info.group("jackpot"):
+                    jackpot_val = float(m_total_pot_info.group("jackpot"))
+
+        # ---- улицы: *** FLOP *** / TURN / RIVER (и SHOWDOWN / SUMMARY) ----
         if ln.startswith("***") and "HOLE CARDS" not in ln:
-            if current_street_lines:
-                acts, action_order_no = parse_actions(
-                    current_street_lines,
-                    seat_map_name_to_num,
-                    current_street_state,
-                    action_order_no,
-                )
-                all_actions.extend(acts)
-                current_street_lines = []
-
+            street_commit = defaultdict(float)  # ставки на новой улице считаем с нуля
             m_board_line = RE_STREET_BOARD.match(ln)
             if m_board_line:
                 current_street_state = m_board_line.group("street")
@@ -289,89 +440,84 @@ def parse_hand(raw: str) -> dict:
                     )
                 continue
 
-        current_street_lines.append(ln)
-
-        m_uncalled_bet = RE_UNCALLED.match(ln)
-        if (
-            m_uncalled_bet
-            and normalize_player_name(m_uncalled_bet.group("player")) == hero_player_key
-        ):
-            hero_uncalled += float(m_uncalled_bet.group("amt"))
-
-        m_showdown = RE_SHOWDOWN_LINE.search(ln)
-        if m_showdown:
-            player_name = normalize_player_name(m_showdown.group("player"))
-            shown_cards = m_showdown.group("card1") + m_showdown.group("card2")
-            player_seat = seat_map_name_to_num.get(player_name, -1)
-            if player_seat == -1 and m_showdown.group("seat"):
-                try:
-                    player_seat = int(m_showdown.group("seat"))
-                except ValueError:
-                    player_seat = -1
-            if player_seat != -1 and not any(
-                s_entry["seat_no"] == player_seat for s_entry in showdown_entries
-            ):
-                showdown_entries.append({"seat_no": player_seat, "cards": shown_cards, "won": None})
-            elif player_seat == -1:
-                print(
-                    f"[ПРЕДУПРЕЖДЕНИЕ] Шоудаун: не найден seat_no для игрока '{player_name}' (исходное: '{m_showdown.group('player')}') в раздаче {hand_id}."
-                )
+        # ---- «игрок: действие» ----
+        if ": " in ln:
+            action = _parse_action_line(
+                ln,
+                seat_map_name_to_num,
+                current_street_state,
+                action_order_no,
+                street_commit,
+                stacks,
+            )
+            if action:
+                all_actions.append(action)
+                action_order_no += 1
+
+        if ln.startswith("Uncalled bet ("):
+            m_uncalled_bet = RE_UNCALLED.match(ln)
+            if m_uncalled_bet:
+                uncalled_player = normalize_player_name(m_uncalled_bet.group("player"))
+                uncalled_seat = seat_map_name_to_num.get(uncalled_player, -1)
+                if uncalled_seat in stacks:
+                    stacks[uncalled_seat] += float(m_uncalled_bet.group("amt"))
+                if uncalled_player == hero_player_key:
+                    hero_uncalled += float(m_uncalled_bet.group("amt"))
+
+        if "show" in ln:
+            m_showdown = RE_SHOWDOWN_LINE.search(ln)
+            if m_showdown:
+                player_name = normalize_player_name(m_showdown.group("player"))
+                shown_cards = m_showdown.group("card1") + m_showdown.group("card2")
+                player_seat = seat_map_name_to_num.get(player_name, -1)
+                if player_seat == -1 and m_showdown.group("seat"):
+                    try:
+                        player_seat = int(m_showdown.group("seat"))
+                    except ValueError:
+                        player_seat = -1
+                if player_seat != -1 and not any(
+                    s_entry["seat_no"] == player_seat for s_entry in showdown_entries
+                ):
+                    showdown_entries.append(
+                        {"seat_no": player_seat, "cards": shown_cards, "won": None}
+                    )
+                elif player_seat == -1:
+                    print(
+                        f"[ПРЕДУПРЕЖДЕНИЕ] Шоудаун: не найден seat_no для игрока '{player_name}' (исходное: '{m_showdown.group('player')}') в раздаче {hand_id}."
+                    )
 
-        m_collected_pot = RE_COLLECTED.match(ln)
-        m_won_pot = RE_WON.match(ln)
-        m_shows_collected = RE_SHOWS_COLLECTED.match(ln)
-        m_seat_collected = RE_SEAT_COLLECTED.match(ln)
-        m_seat_won = RE_SEAT_WON.match(ln)
-        collected_amount = None
-        winner_name = None
-
-        if m_collected_pot:
-            winner_name = normalize_player_name(m_collected_pot.group("player"))
-            collected_amount = float(m_collected_pot.group("amt"))
-        elif m_won_pot:
-            winner_name = normalize_player_name(m_won_pot.group("player"))
-            collected_amount = float(m_won_pot.group("amt"))
-        elif m_shows_collected:
-            winner_name = hero_player_key
-            collected_amount = float(m_shows_collected.group("amt"))
-        elif m_seat_collected:
-            winner_name = normalize_player_name(m_seat_collected.group("player"))
-            collected_amount = float(m_seat_collected.group("amt"))
-        elif m_seat_won:
-            winner_name = normalize_player_name(m_seat_won.group("player"))
-            collected_amount = float(m_seat_won.group("amt"))
+        # ---- выигрыши: «collected» / «won» — порядок regex'ов важен ----
+        if "collected" not in ln and "won" not in ln:
+            continue
+        m_win = RE_COLLECTED.match(ln) or RE_WON.match(ln)
+        if m_win:
+            winner_name = normalize_player_name(m_win.group("player"))
         else:
-            collected_amount = None
+            m_win = RE_SHOWS_COLLECTED.match(ln)
+            if m_win:
+                winner_name = hero_player_key
+            else:
+                m_win = RE_SEAT_COLLECTED.match(ln) or RE_SEAT_WON.match(ln)
+                if not m_win:
+                    continue
+                winner_name = normalize_player_name(m_win.group("player"))
+        collected_amount = float(m_win.group("amt"))
+
+        key = (winner_name, collected_amount)
+        if key in collected_set_total:
+            continue
+        collected_set_total.add(key)
+        winners_total += collected_amount
+        seat_no = seat_map_name_to_num.get(winner_name, -1)
+        if seat_no != -1:
+            winners_rows.append((hand_id, seat_no, collected_amount))
 
-        if collected_amount is not None:
-            key = (winner_name, collected_amount)
-            if key in collected_set_total:
-                continue
-            collected_set_total.add(key)
-            winners_total += collected_amount
-            seat_no = seat_map_name_to_num.get(winner_name, -1)
-            if seat_no != -1:
-                winners_rows.append((hand_id, seat_no, collected_amount))
-
-            if winner_name == hero_player_key and key not in collected_set_hero:
-                hero_collected += collected_amount
-                collected_set_hero.add(key)
-
-    if current_street_lines:
-        acts, _ = parse_actions(
-            current_street_lines, seat_map_name_to_num, current_street_state, action_order_no
-        )
-        all_actions.extend(acts)
+        if winner_name == hero_player_key and key not in collected_set_hero:
+            hero_collected += collected_amount
+            collected_set_hero.add(key)
 
-    total_pot_val, rake_val, jackpot_val = None, 0.0, 0.0
-    for ln in lines:
-        m_total_pot_info = RE_TOTAL_POT.search(ln)
-        if m_total_pot_info:
-            total_pot_val = float(m_total_pot_info.group("total"))
-            rake_val = float(m_total_pot_info.group("rake"))
-            if m_total_pot_info.group("jackpot"):
-                jackpot_val = float(m_total_pot_info.group("jackpot"))
-            break
+    if button_seat is None:
+        button_seat = -1
 
     flop_str = "".join(board_cards_by_street["FLOP"])
     turn_cards = board_cards_by_street["TURN"]
@@ -411,8 +557,12 @@ def parse_hand(raw: str) -> dict:
         "datetime_utc": date_iso,
         "button_seat": button_seat,
         "hero_seat": hero_seat,
+        "hero_position": position_from_seats(
+            hero_seat, button_seat, (s_entry["seat_no"] for s_entry in seats_info)
+        ),
         "hero_name": hero_player_key,
         "hero_cards": hero_cards_str,
+        "hero_combo": hero_combo(hero_cards_str),
         "board": board_string_representation,
         "hero_invested": hero_invested_display_value,
         "hero_collected": hero_collected,
@@ -426,15 +576,61 @@ def parse_hand(raw: str) -> dict:
         "actions": all_actions,
         "showdowns": showdown_entries,
         "collected_rows": winners_rows,
+        "side_pots": _hand_side_pots(seats_info, stacks, all_actions),
     }
     return hand_data_dict
 
 
+def _parse_error_message(h_text: str, idx: int, err: Exception) -> str:
+    first_line = h_text.splitlines()[0] if h_text.splitlines() else ""
+    hand_id_match = RE_HAND_START.match(first_line)
+    hand_id_str = (
+        hand_id_match.group("hand_id") if hand_id_match else f"Неизвестный ID, раздача #{idx+1}"
+    )
+    return f"Ошибка при парсинге раздачи {hand_id_str}: {err}"
+
+
+def parse_raw_hands(
+    raw_hands: List[str], timings: Optional[List[float]] = None
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Парсит пачку сырых раздач. Ошибки не бросает, а возвращает текстом —
+    так функцию можно гонять в воркерах пула процессов.
+    timings — если передан список, в него дописывается время parse_hand на каждую раздачу.
+    """
+    parsed: List[Dict[str, Any]] = []
+    errors: List[str] = []
+    for i, h_text in enumerate(raw_hands):
+        t0 = time.perf_counter() if timings is not None else 0.0
+        try:
+            parsed.append(parse_hand(h_text))
+        except Exception as e:
+            errors.append(_parse_error_message(h_text, i, e))
+        if timings is not None:
+            timings.append(time.perf_counter() - t0)
+    return parsed, errors
+
+
+def iter_hands(path: str, chunk_size: int = 1 << 20) -> Iterator[Dict[str, Any]]:
+    """
+    Генератор: читает файл кусками по chunk_size байт и отдаёт распарсенные
+    раздачи по одной. Память не растёт с размером файла.
+    Битые раздачи пропускаются с сообщением, как в parse_file.
+    """
+    with open(path, "r", encoding="utf-8", buffering=chunk_size) as f:
+        for i, h_text in enumerate(iter_raw_hands(f)):
+            try:
+                hand = parse_hand(h_text)
+            except Exception as e:
+                print(_parse_error_message(h_text, i, e))
+                continue
+            yield hand
+
+
 def parse_file(path: str) -> List[Dict[str, Any]]:
     """Парсит все раздачи из файла."""
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            raw_text_content = f.read()
+        return list(iter_hands(path))
     except FileNotFoundError:
         print(f"Ошибка: Файл не найден по пути: {path}")
         return []
@@ -442,23 +638,6 @@ def parse_file(path: str) -> List[Dict[str, Any]]:
         print(f"Ошибка при чтении файла {path}: {e}")
         return []
 
-    raw_hand_histories = split_raw_hands(raw_text_content)
-    parsed_hands = []
-    for i, h_text in enumerate(raw_hand_histories):
-        try:
-            parsed_hands.append(parse_hand(h_text))
-        except Exception as e:
-            hand_id_match = RE_HAND_START.match(
-                h_text.splitlines()[0] if h_text.splitlines() else ""
-            )
-            hand_id_str = (
-                hand_id_match.group("hand_id")
-                if hand_id_match
-                else f"Неизвестный ID, раздача #{i+1}"
-            )
-            print(f"Ошибка при парсинге раздачи {hand_id_str}: {e}")
-    return parsed_hands
-
 
 def insert_hands_and_collected(parsed_hands, db_path):
     """
@@ -475,7 +654,7 @@ def insert_hands_and_collected(parsed_hands, db_path):
     print(f"Пишу в БД: {db_path}")
     cx = None
     try:
-        cx = sqlite3.connect(db_path, timeout=30.0)  # Увеличиваем таймаут
+        cx = connect(db_path)
         cur = cx.cursor()
 
         for h in parsed_hands:
@@ -534,9 +713,8 @@ if __name__ == "__main__":
     else:
         FILE_PATH = "bbline/assets/test_session.txt"
         print(f"Путь к файлу не передан как аргумент, используется тестовый путь: {FILE_PATH}")
-    DB_PATH = Path(__file__).resolve().parents[1] / "database" / "bbline.sqlite"
     parsed_hands_list = parse_file(FILE_PATH)
-    insert_hands_and_collected(parsed_hands_list, str(DB_PATH))
+    insert_hands_and_collected(parsed_hands_list, str(registry.write_path()))
     print("✅  winners_rows записаны в collected")
     if parsed_hands_list:
         for hand_dict_result in parsed_hands_list:
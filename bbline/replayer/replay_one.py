@@ -6,7 +6,7 @@ replayer/replay_one.py
     python -m replayer.replay_one HD2268701058  # где HD… – hand_id
 
 Запуск (Streamlit):
-    streamlit run replayer/replay_one.py   # появится селектор hand_id
+    streamlit run replayer/replay_one.py   # появится поиск + селектор hand_id
 
 Требования: streamlit (для UI‑режима) + база bbline.sqlite.
 """
@@ -15,10 +15,15 @@ from __future__ import annotations
 
 import sqlite3
 import sys
-from typing import List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
+from bbline.analysis.player_stats import hud_stats, player_counters
+from bbline.database.connection import get_connection
 from bbline.utils import DB_PATH  # Импортируем DB_PATH из utils
 
+# сколько раздач показывать в селекторе (последние / найденные по префиксу)
+RECENT_N = 200
+
 # ----------------------------------------------------------------------------
 # helpers
 # ----------------------------------------------------------------------------
@@ -46,6 +51,73 @@ def _fetch_actions(cur: sqlite3.Cursor, hand_id: str) -> List[Tuple]:
     ).fetchall()
 
 
+def seat_profiles(cur: sqlite3.Cursor, hand_id: str) -> List[Dict[str, Any]]:
+    """Игроки руки и их HUD по всей базе (player_stats, выборка по PRIMARY KEY)."""
+    seats = cur.execute(
+        "SELECT seat_no, player_id, chips FROM seats WHERE hand_id = ? ORDER BY seat_no",
+        (hand_id,),
+    ).fetchall()
+    counters = player_counters(cur, [s[1] for s in seats])
+    return [
+        {
+            "Seat": seat_no,
+            "Player": player_id,
+            "Stack $": chips,
+            **(hud_stats(counters[player_id]) if player_id in counters else {}),
+        }
+        for seat_no, player_id, chips in seats
+    ]
+
+
+def hand_exists(cur: sqlite3.Cursor, hand_id: str) -> bool:
+    """Одна выборка по PRIMARY KEY — для ?hand_id= из ссылки."""
+    return cur.execute("SELECT 1 FROM hands WHERE hand_id = ?", (hand_id,)).fetchone() is not None
+
+
+def recent_hand_ids(cur: sqlite3.Cursor, n: int = RECENT_N) -> List[str]:
+    """Последние n раздач — с конца idx_hands_datetime, без сортировки всей таблицы."""
+    return [
+        r[0]
+        for r in cur.execute(
+            "SELECT hand_id FROM hands ORDER BY datetime_utc DESC LIMIT ?", (n,)
+        ).fetchall()
+    ]
+
+
+def search_hand_ids(cur: sqlite3.Cursor, prefix: str, n: int = RECENT_N) -> List[str]:
+    """
+    Раздачи, чей hand_id начинается с prefix (не больше n, старшие id первыми).
+    Диапазон [prefix, prefix с +1 к последнему символу) идёт по индексу PRIMARY KEY;
+    LIKE 'prefix%' индекс бы не взял (LIKE по умолчанию без учёта регистра).
+    """
+    prefix = prefix.strip().upper()  # id у GG — заглавные буквы + цифры
+    if not prefix:
+        return recent_hand_ids(cur, n)
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return [
+        r[0]
+        for r in cur.execute(
+            "SELECT hand_id FROM hands WHERE hand_id >= ? AND hand_id < ? "
+            "ORDER BY hand_id DESC LIMIT ?",
+            (prefix, upper, n),
+        ).fetchall()
+    ]
+
+
+def hand_choices(
+    cur: sqlite3.Cursor, prefix: str = "", pinned: Optional[str] = None, n: int = RECENT_N
+) -> List[str]:
+    """
+    Варианты для селектора: найденные по префиксу (или последние n),
+    плюс pinned (hand_id из ссылки) первым, если такая раздача есть в базе.
+    """
+    ids = search_hand_ids(cur, prefix, n)
+    if pinned and pinned not in ids and pinned.startswith(prefix.strip().upper()):
+        if hand_exists(cur, pinned):
+            ids.insert(0, pinned)
+    return ids
+
+
 def _street_color(street: str) -> str:
     return {
         "PREFLOP": "#cccccc",
@@ -60,7 +132,7 @@ def _street_color(street: str) -> str:
 # ----------------------------------------------------------------------------
 
 
-def print_hand(hand, actions):
+def print_hand(hand, actions, seats=()):
     print("-" * 60)
     print(f"HandID    : {hand['hand_id']}   ({hand['datetime_utc']})")
     print(f"Limit     : NL${hand['limit_bb']*50:.0f}/{hand['limit_bb']*100:.0f}")
@@ -68,6 +140,11 @@ def print_hand(hand, actions):
     print(f"Board     : {hand['board'] or '--'}")
     print(f"Final pot : {hand['final_pot'] or 0:.2f}   Profit: {hand['hero_net'] or 0:.2f}$")
     print("-" * 60)
+    for p in seats:
+        hud = " / ".join(f"{k} {v if v is not None else '—'}" for k, v in list(p.items())[3:])
+        print(f"  Seat {p['Seat']}: {p['Player']:<10} {p['Stack $']:.2f}$  {hud}")
+    if seats:
+        print("-" * 60)
 
     last_street = None
     for street, order_no, seat_no, act, amount, allin in actions:
@@ -85,23 +162,42 @@ def print_hand(hand, actions):
 # ----------------------------------------------------------------------------
 
 
+def hand_picker(key: str = "replayer", deep_link: Optional[str] = None) -> Optional[str]:
+    """
+    Поиск по началу hand_id + селектор из не больше RECENT_N раздач.
+    deep_link (?hand_id=) выбирается сразу, если раздача есть в базе.
+    """
+    import streamlit as st
+
+    prefix = st.text_input("Поиск по Hand ID (начало)", key=f"{key}_search")
+    with get_connection(DB_PATH, readonly=True) as cx:
+        ids = hand_choices(cx.cursor(), prefix, pinned=deep_link)
+    if not ids:
+        st.info("Раздачи с таким Hand ID не найдены.")
+        return None
+    index = ids.index(deep_link) if deep_link in ids else 0  # список — максимум RECENT_N + 1
+    return st.selectbox("Выбери раздачу", ids, index=index, key=f"{key}_select_box")
+
+
 def display_hand_replay(hand_id: str):
     import streamlit as st  # Импортируем Streamlit здесь, если он нужен
 
-    with sqlite3.connect(DB_PATH) as cx:
-        cx.row_factory = sqlite3.Row
+    with get_connection(DB_PATH, readonly=True) as cx:
         cur = cx.cursor()
+        cur.row_factory = sqlite3.Row
         try:
             hand = _fetch_hand(cur, hand_id)
             actions = _fetch_actions(cur, hand_id)
         except ValueError as e:
             st.error(f"Ошибка: {e}")
             return
+        seats = seat_profiles(cur, hand_id)
 
     st.subheader(
         f"{hand['hand_id']} | {hand['datetime_utc']} | {hand['hero_cards']} -> {hand['board'] or '--'}"
     )
     st.write(f"Профит: **{hand['hero_net'] or 0:.2f}$** | Пот: {hand['final_pot'] or 0:.2f}$")
+    st.dataframe(seats, hide_index=True)  # HUD: статы игроков по всей базе
 
     for street in ("PREFLOP", "FLOP", "TURN", "RIVER"):
         st.markdown(f"**{street}**", unsafe_allow_html=True)
@@ -123,13 +219,13 @@ if __name__ == "__main__":
     if len(sys.argv) >= 2:
         # CLI режим
         hand_id = sys.argv[1]
-        with sqlite3.connect(DB_PATH) as cx:
-            cx.row_factory = sqlite3.Row
+        with get_connection(DB_PATH, readonly=True) as cx:
             cur = cx.cursor()
+            cur.row_factory = sqlite3.Row
             try:
                 hand = _fetch_hand(cur, hand_id)
                 actions = _fetch_actions(cur, hand_id)
-                print_hand(hand, actions)
+                print_hand(hand, actions, seat_profiles(cur, hand_id))
             except ValueError as e:
                 print(f"Ошибка: {e}", file=sys.stderr)
                 sys.exit(1)
@@ -140,16 +236,7 @@ if __name__ == "__main__":
 
             st.set_page_config(page_title="Hand Replayer", layout="wide")
             st.title("🂡 Hand Replayer (BBLine)")
-            with sqlite3.connect(DB_PATH) as cx:
-                cx.row_factory = sqlite3.Row
-                cur = cx.cursor()
-                ids = [
-                    r[0]
-                    for r in cur.execute(
-                        "SELECT hand_id FROM hands ORDER BY datetime_utc DESC"
-                    ).fetchall()
-                ]
-            selected_hand_id = st.selectbox("Выбери раздачу", ids)
+            selected_hand_id = hand_picker(deep_link=st.query_params.get("hand_id"))
             if selected_hand_id:
                 display_hand_replay(selected_hand_id)
             else:
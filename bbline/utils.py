@@ -5,13 +5,14 @@
 from __future__ import annotations
 
 import sqlite3
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, List, Optional, Tuple
 import pandas as pd
 
-# Путь к БД (относительно текущего файла)
-DB_PATH = Path(__file__).parent / "database" / "bbline.sqlite"
+# База для отчётов: None — все базы реестра (database/registry.py: --db / BBLINE_DB),
+# путь — только этот файл (бенчмарки, разовые проверки)
+DB_PATH: Optional[Path] = None
 
 # Константы для позиций
 POSITIONS = ["BB", "SB", "BTN", "CO", "MP", "EP"]
@@ -39,51 +40,82 @@ def _validate_positions(positions: List[str]) -> bool:
     return all(pos in POSITIONS for pos in positions)
 
 
-def _pos_from_seats(hero_seat: int, button_seat: int) -> str:
-    """Возвращает позицию героя по номерам мест (6-max)."""
-    offset = (hero_seat - button_seat) % 6
-    return POSITIONS[offset]
+def _next_day(date_str: str) -> str:
+    return (datetime.strptime(date_str, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
 
 
-def get_hand_ids(
-    cur: sqlite3.Cursor,
+def hand_filter_sql(
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
     limits: Optional[List[float]] = None,
     positions: Optional[List[str]] = None,
-) -> List[str]:
-    """Возвращает список hand_id с учетом фильтров (позиция фильтруется в Python)."""
+    alias: str = "h",
+    by_day: bool = False,
+) -> Tuple[str, List[Any]]:
+    """
+    Компилирует фильтры дата → лимит → позиция в одно WHERE-условие
+    (без слова WHERE) по таблице hands с алиасом alias.
+    by_day=True — то же условие для daily_rollup (дата в колонке day).
+    Возвращает (условие, параметры); без фильтров условие — "1=1".
+
+    Пример:
+        where, params = hand_filter_sql(date_from="2025-01-01", positions=["BTN"])
+        cur.execute(f"SELECT COUNT(*) FROM hands h WHERE {where}", params)
+    """
     conditions = []
-    params = []
+    params: List[Any] = []
 
+    # datetime_utc — ISO-строка в UTC, поэтому сравниваем саму колонку
+    # (без date(...)), чтобы работал индекс (hero_position, limit_bb, datetime_utc)
     if date_from and _validate_date(date_from):
-        conditions.append("date(datetime_utc) >= date(?)")
+        conditions.append(f"{alias}.day >= ?" if by_day else f"{alias}.datetime_utc >= ?")
         params.append(date_from)
 
     if date_to and _validate_date(date_to):
-        conditions.append("date(datetime_utc) <= date(?)")
-        params.append(date_to)
+        if by_day:
+            conditions.append(f"{alias}.day <= ?")
+            params.append(date_to)
+        else:
+            # следующий день считаем здесь, а не date(?, '+1 day') — условие без
+            # функций SQLite подходит и для DuckDB (analysis/duckdb_backend.py)
+            conditions.append(f"{alias}.datetime_utc < ?")
+            params.append(_next_day(date_to))
 
     if limits and _validate_limits(limits):
         placeholders = ",".join(["?"] * len(limits))
-        conditions.append(f"limit_bb IN ({placeholders})")
+        conditions.append(f"{alias}.limit_bb IN ({placeholders})")
         params.extend(limits)
 
+    # все позиции сразу = без фильтра (заодно не теряем руки с hero_position NULL)
+    if positions and not set(POSITIONS) <= set(positions):
+        placeholders = ",".join(["?"] * len(positions))
+        conditions.append(f"{alias}.hero_position IN ({placeholders})")
+        params.extend(positions)
+
     where_clause = " AND ".join(conditions) if conditions else "1=1"
+    return where_clause, params
+
+
+def get_hand_ids(
+    cur: sqlite3.Cursor,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    limits: Optional[List[float]] = None,
+    positions: Optional[List[str]] = None,
+) -> List[str]:
+    """
+    Возвращает список hand_id с учетом фильтров.
+    Для агрегатов не нужен — подставляй hand_filter_sql прямо в запрос.
+    """
+    where_clause, params = hand_filter_sql(date_from, date_to, limits, positions)
 
     query = f"""
-    SELECT hand_id, hero_seat, button_seat
-    FROM hands
+    SELECT h.hand_id
+    FROM hands h
     WHERE {where_clause}
-    ORDER BY datetime_utc DESC, hand_id DESC;
+    ORDER BY h.datetime_utc DESC, h.hand_id DESC;
     """
-
-    hand_ids = []
-    for hand_id, hero_seat, button_seat in cur.execute(query, params):
-        pos = _pos_from_seats(hero_seat, button_seat)
-        if not positions or pos in positions:
-            hand_ids.append(hand_id)
-    return hand_ids
+    return [row[0] for row in cur.execute(query, params)]
 
 
 def get_profit_by_date(cur: sqlite3.Cursor, hand_id: str) -> List[List[str]]:
@@ -1,6 +1,6 @@
-import sqlite3
+from bbline.database.connection import get_connection
 
-cx = sqlite3.connect("bbline/database/bbline.sqlite")
+cx = get_connection(readonly=True)  # база(ы) из BBLINE_DB
 cur = cx.cursor()
 
 print("Таблица hands:")
@@ -1,5 +1,5 @@
 from bbline.analysis.leakfinder import run_leakfinder
-import sqlite3
+from bbline.database.connection import get_connection
 
 # Проверяем утечки
 leaks = run_leakfinder()
@@ -8,8 +8,7 @@ for leak in leaks:
     print(f"- {leak['name']}: {leak['value']}% (порог: {leak['threshold']}%)")
 
 # Проверяем теги
-cx = sqlite3.connect("bbline/database/bbline.sqlite")
+cx = get_connection(readonly=True)  # база(ы) из BBLINE_DB
 cur = cx.cursor()
 print("\nКоличество тегов:", cur.execute("SELECT COUNT(*) FROM tags").fetchone()[0])
 print("Примеры тегов:", cur.execute("SELECT * FROM tags LIMIT 5").fetchall())
-cx.close()
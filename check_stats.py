@@ -1,6 +1,6 @@
-import sqlite3
+from bbline.database.connection import get_connection
 
-cx = sqlite3.connect("bbline/database/bbline.sqlite")
+cx = get_connection(readonly=True)  # база(ы) из BBLINE_DB
 cur = cx.cursor()
 
 # Проверяем средние значения метрик
@@ -20,5 +20,3 @@ print(f"Всего рук: {stats[3]}")
 print(f"Fold to 3-bet: {stats[0]}%")
 print(f"3-bet frequency: {stats[1]}%")
 print(f"C-bet flop: {stats[2]}%")
-
-cx.close()
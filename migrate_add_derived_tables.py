@@ -0,0 +1,26 @@
+import argparse
+import sqlite3
+
+from bbline.database import registry
+from bbline.database.connection import connect
+from bbline.database.create_schema import DERIVED_TABLES, build_derived_tables
+from bbline.database.meta import bump_generation
+
+
+def migrate(cx: sqlite3.Connection) -> None:
+    # daily_rollup / combo_rollup / board_features / player_stats — по всем рукам базы
+    built = build_derived_tables(cx)
+    for table in DERIVED_TABLES:
+        print(f"{table} построена." if table in built else f"{table} уже существует.")
+    if built:
+        bump_generation(cx)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Таблицы-агрегаты (все базы реестра)")
+    registry.add_db_argument(parser)
+    registry.configure(parser.parse_args().db)
+    for path in registry.read_paths():
+        print(f"— {path}")
+        with connect(path) as cx:
+            migrate(cx)
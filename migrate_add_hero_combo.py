@@ -0,0 +1,49 @@
+import argparse
+import sqlite3
+
+from bbline.analysis import combo_rollup
+from bbline.database import registry
+from bbline.database.connection import connect
+from bbline.database.meta import bump_generation
+from bbline.parse.hand_parser import hero_combo
+
+BATCH = 10_000
+
+
+def migrate(cx: sqlite3.Connection) -> None:
+    cur = cx.cursor()
+    try:
+        cur.execute("ALTER TABLE hands ADD COLUMN hero_combo TEXT")
+        print("Поле hero_combo добавлено.")
+    except sqlite3.OperationalError as e:
+        if "duplicate column name" in str(e) or "already exists" in str(e):
+            print("Поле hero_combo уже существует.")
+        else:
+            raise
+
+    # backfill: клетка сетки 13×13 по hero_cards
+    rows = cur.execute(
+        "SELECT hand_id, hero_cards FROM hands WHERE hero_combo IS NULL AND hero_cards IS NOT NULL"
+    ).fetchall()
+    updates = []
+    for hand_id, cards in rows:
+        combo = hero_combo(cards)
+        if combo is not None:
+            updates.append((combo, hand_id))
+    for i in range(0, len(updates), BATCH):
+        cur.executemany("UPDATE hands SET hero_combo = ? WHERE hand_id = ?", updates[i : i + BATCH])
+    print(f"hero_combo заполнено для {len(updates)} из {len(rows)} рук.")
+    if updates:
+        # combo_rollup сгруппирован по hero_combo — пересобираем: чтение его не строит
+        combo_rollup.rebuild_all(cx)
+        bump_generation(cx)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="hero_combo в hands (все базы реестра)")
+    registry.add_db_argument(parser)
+    registry.configure(parser.parse_args().db)
+    for path in registry.read_paths():
+        print(f"— {path}")
+        with connect(path) as cx:
+            migrate(cx)
@@ -0,0 +1,64 @@
+import argparse
+import sqlite3
+
+from bbline.analysis import rollup
+from bbline.database import registry
+from bbline.database.connection import connect
+from bbline.database.meta import bump_generation
+from bbline.parse.hand_parser import position_from_seats
+
+BATCH = 10_000
+
+
+def migrate(cx: sqlite3.Connection) -> None:
+    cur = cx.cursor()
+    try:
+        cur.execute("ALTER TABLE hands ADD COLUMN hero_position TEXT")
+        print("Поле hero_position добавлено.")
+    except sqlite3.OperationalError as e:
+        if "duplicate column name" in str(e) or "already exists" in str(e):
+            print("Поле hero_position уже существует.")
+        else:
+            raise
+
+    # backfill: позиция по реальному списку мест из seats
+    rows = cur.execute(
+        """
+        SELECT h.hand_id, h.hero_seat, h.button_seat, group_concat(s.seat_no)
+        FROM hands h
+        LEFT JOIN seats s ON s.hand_id = h.hand_id
+        WHERE h.hero_position IS NULL
+        GROUP BY h.hand_id
+        """
+    ).fetchall()
+    updates = []
+    for hand_id, hero_seat, button_seat, seat_list in rows:
+        seat_nos = [int(x) for x in seat_list.split(",")] if seat_list else []
+        position = position_from_seats(hero_seat, button_seat, seat_nos)
+        if position is not None:
+            updates.append((position, hand_id))
+    for i in range(0, len(updates), BATCH):
+        cur.executemany(
+            "UPDATE hands SET hero_position = ? WHERE hand_id = ?", updates[i : i + BATCH]
+        )
+    print(f"hero_position заполнено для {len(updates)} из {len(rows)} рук.")
+    if updates:
+        # daily_rollup сгруппирован по позиции — пересобираем: чтение его не строит
+        rollup.rebuild_all(cx)
+        bump_generation(cx)
+
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_hands_pos_limit_dt "
+        "ON hands(hero_position, limit_bb, datetime_utc)"
+    )
+    print("Индекс для hero_position создан.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="hero_position в hands (все базы реестра)")
+    registry.add_db_argument(parser)
+    registry.configure(parser.parse_args().db)
+    for path in registry.read_paths():
+        print(f"— {path}")
+        with connect(path) as cx:
+            migrate(cx)
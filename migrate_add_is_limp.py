@@ -1,8 +1,11 @@
+import argparse
 import sqlite3
 
-DB_PATH = "bbline/database/bbline.sqlite"
+from bbline.database import registry
+from bbline.database.connection import connect
 
-with sqlite3.connect(DB_PATH) as cx:
+
+def migrate(cx: sqlite3.Connection) -> None:
     cur = cx.cursor()
     try:
         cur.execute("ALTER TABLE computed_stats ADD COLUMN is_limp INTEGER DEFAULT 0")
@@ -14,3 +17,13 @@ with sqlite3.connect(DB_PATH) as cx:
             raise
     cur.execute("CREATE INDEX IF NOT EXISTS idx_stats_limp ON computed_stats(is_limp)")
     print("Индекс для is_limp создан.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="is_limp в computed_stats (все базы реестра)")
+    registry.add_db_argument(parser)
+    registry.configure(parser.parse_args().db)
+    for path in registry.read_paths():
+        print(f"— {path}")
+        with connect(path) as cx:
+            migrate(cx)
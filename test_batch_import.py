@@ -0,0 +1,48 @@
+import sqlite3
+import time
+
+from bbline.bench.hh_generator import generate_hands
+from bbline.database.create_schema import create_schema
+from bbline.ingest.batch_import import SETTLED_AFTER, batch_import
+
+
+def _session(tmp_path, n=5):
+    """База и файл сессии из n рук, последняя — без пустой строки после неё."""
+    db = create_schema(tmp_path / "hh.sqlite")
+    folder = tmp_path / "raw"
+    folder.mkdir()
+    raws = list(generate_hands(n, seed=11))
+    path = folder / "session.txt"
+    path.write_text("\n\n\n".join(raws) + "\n", encoding="utf-8")
+    return db, path
+
+
+def _hands(db):
+    with sqlite3.connect(db) as cx:
+        return cx.execute("SELECT COUNT(*) FROM hands;").fetchone()[0]
+
+
+def test_last_hand_without_blank_line_waits_for_final(tmp_path):
+    db, path = _session(tmp_path)
+
+    batch_import(path.parent, db_path=db)
+    assert _hands(db) == 4  # файл свежий — хвост может дописываться
+    assert path.exists()
+
+    batch_import(path.parent, db_path=db, final=True)
+    assert _hands(db) == 5
+    assert not path.exists()  # дочитан до конца — удалён
+
+
+def test_settled_file_is_read_to_eof(tmp_path, monkeypatch):
+    db, path = _session(tmp_path)
+    batch_import(path.parent, db_path=db)
+    batch_import(path.parent, db_path=db)  # size/mtime те же — файл пропущен
+    assert _hands(db) == 4
+
+    # файл так и не дописали: через SETTLED_AFTER секунд хвост больше не ждём
+    later = time.time() + SETTLED_AFTER + 1
+    monkeypatch.setattr(time, "time", lambda: later)
+    batch_import(path.parent, db_path=db)
+    assert _hands(db) == 5
+    assert not path.exists()